@@ -1,8 +1,9 @@
 from pathlib import Path
-from .app import App
 
 
 def run():
+    from .app import App
+
     game = App(Path.cwd())
     game.run()
 
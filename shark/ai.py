@@ -12,27 +12,46 @@ import numpy as np
 
 
 class Lemming:
-    def __init__(self, current_level):
-        self.hero = current_level.hero
-        self.goal = current_level.goal
-        current_level.update(self.hero, self.get_random_cell())
+    """Sends every goodie to a random cell, then on to the goal once it stops.
+
+    Random choices come from rng, a random.Random, or the random module if None.
+    """
+
+    def __init__(self, current_level, rng=None):
+        self.rng = random if rng is None else rng
+        self.goal = sorted(current_level.goal)
+        self.rows, self.cols = current_level.shape
+        for goodie in current_level.goodies:
+            current_level.update(goodie, self.get_random_cell())
 
     def get_random_cell(self):
-        row = random.choice([i for i in range(20)])
-        col = random.choice([i for i in range(20)])
+        row = self.rng.randrange(self.rows)
+        col = self.rng.randrange(self.cols)
         return Cell(col, row)
 
+    def get_idle_goodies(self, level):
+        return [
+            goodie
+            for goodie in level.goodies
+            if goodie.is_alive and not goodie.is_active and goodie.cell not in level.goal
+        ]
+
+    def is_waiting(self, level):
+        return bool(self.get_idle_goodies(level))
+
     def update(self, level):
-        if not self.hero.is_active:
-            level.update(self.hero, self.goal)
+        for goodie in self.get_idle_goodies(level):
+            level.update(goodie, self.rng.choice(self.goal))
 
 
 class SharkBaseline:
-    def __init__(self):
+    def __init__(self, rng=None):
+        self.rng = random if rng is None else rng
         self.water_idx = 0
         self.food_idx = 1
         self.sharks_idx = 2
         self.histories = None
+        self.water_distances = None
         self.actions = {
             (0, 1): 0,
             (0, -1): 1,
@@ -44,8 +63,10 @@ class SharkBaseline:
             (-1, 1): 7,
         }
 
-    def reset(self, state):
+    def reset(self, state, water_distances=None):
+        """Starts a level; given the level's WaterDistances, sharks chase by swimming distance."""
         state, info = state
+        self.water_distances = water_distances
         n_sharks = info.shape[0] // 3
         self.histories = [deque(maxlen=5) for i in range(n_sharks)]
         self.current_cells = [(-1, -1)] * n_sharks
@@ -77,6 +98,8 @@ class SharkBaseline:
         return cells
 
     def chase(self, idx, shark_cell, human_cells, water_layer):
+        if self.water_distances is not None:
+            return self.chase_by_water(idx, shark_cell, human_cells, water_layer)
         distances = [
             (self.get_distance(shark_cell, cell), i)
             for i, cell in enumerate(human_cells)
@@ -86,10 +109,30 @@ class SharkBaseline:
         x, y = shark_cell
         key = (convert_to_ones(hx - x), convert_to_ones(hy - y))
         if key == (0, 0):
-            key = random.choice(list(displacement_preferences.keys()))
+            key = self.rng.choice(list(displacement_preferences.keys()))
         actions = displacement_preferences[key]
         return self.get_action(idx, shark_cell, actions, water_layer)
 
+    def chase_by_water(self, idx, shark_cell, human_cells, water_layer):
+        """Heads for the nearest goodie by swimming distance, ignoring ones in other pools."""
+        water_distances = self.water_distances
+        reachable = [
+            cell for cell in human_cells if water_distances.is_reachable(shark_cell, cell)
+        ]
+        if not reachable:
+            return self.patrol(idx, shark_cell, water_layer)
+        from_shark = water_distances.field(shark_cell)
+        target = min(reachable, key=lambda cell: from_shark[cell[1], cell[0]])
+        to_target = water_distances.field(target)
+        x, y = shark_cell
+        moves = [
+            (to_target[y + dy, x + dx], (dx, dy))
+            for dx, dy in self.actions
+            if self.is_on_map(y + dy, x + dx) and to_target[y + dy, x + dx] >= 0
+        ]
+        actions = [move for distance, move in sorted(moves, key=lambda move: move[0])]
+        return self.get_action(idx, shark_cell, actions, water_layer)
+
     def get_distance(self, shark_cell, cell):
         sx, sy = shark_cell
         x, y = cell
@@ -97,7 +140,7 @@ class SharkBaseline:
 
     def patrol(self, idx, shark_cell, water_layer):
         actions = list(self.actions.keys())
-        random.shuffle(actions)
+        self.rng.shuffle(actions)
         return self.get_action(idx, shark_cell, actions, water_layer)
 
     def get_action(self, idx, shark_cell, actions, water_layer):
@@ -136,3 +179,161 @@ class SharkBaseline:
         row_cond = row >= 0 and row < self.max_y
         return col_cond and row_cond
 
+
+class BatchSharkBaseline:
+    """SharkBaseline for stacked observations of many environments at once.
+
+    Takes (layout, shark_info) with layout (n_envs, layers, rows, cols) and
+    returns (n_envs, n_sharks) actions, with the chase, patrol and no-revisit
+    rules of SharkBaseline applied to every shark in every environment with
+    array operations. Sharks are read from shark_info, so actions come in the
+    order SharkEnvPlay.step and BatchLevel.update_sharks apply them. Random
+    choices are drawn from a numpy Generator seeded with seed.
+    """
+
+    history_length = 5
+
+    def __init__(self, seed=None):
+        self.water_idx = 0
+        self.food_idx = 1
+        self.rng = np.random.default_rng(seed)
+        actions = SharkBaseline().actions
+        moves = list(actions.keys())
+        self.moves = np.array(moves, dtype="int64")
+        self.codes = np.array(list(actions.values()), dtype="int64")
+        pref_keys = list(displacement_preferences.keys())
+        self.prefs = np.array(
+            [[moves.index(move) for move in displacement_preferences[key]] for key in pref_keys],
+            dtype="int64",
+        )
+        self.key_idx = np.full((3, 3), -1, dtype="int64")
+        for i, (dx, dy) in enumerate(pref_keys):
+            self.key_idx[dx + 1, dy + 1] = i
+        self.histories = None
+
+    def reset(self, state, envs=None):
+        """Clears the histories of the given environments (a mask or indices), or of all of them."""
+        layout, info = state
+        n_envs, _, self.rows, self.cols = layout.shape
+        n_sharks = info.shape[1] // 3
+        if envs is None or self.histories is None:
+            shape = (n_envs, n_sharks)
+            self.histories = np.full(shape + (self.history_length, 2), -1, dtype="int64")
+            self.n_history = np.zeros(shape, dtype="int64")
+            self.current_cells = np.full(shape + (2,), -1, dtype="int64")
+        else:
+            self.histories[envs] = -1
+            self.n_history[envs] = 0
+            self.current_cells[envs] = -1
+
+    def get_shark_cells(self, info):
+        x = np.rint(info[:, 1:-1:3] * self.cols).astype("int64")
+        y = np.rint(info[:, 2:-1:3] * self.rows).astype("int64")
+        return np.stack([x, y], axis=-1)
+
+    def step(self, state, envs=None):
+        """Returns actions for the stacked state, whose rows are the given env indices or all envs."""
+        layout, info = state
+        n_envs = layout.shape[0]
+        envs = np.arange(n_envs) if envs is None else np.asarray(envs)
+        cells = self.get_shark_cells(info)
+        self.remember(cells, envs)
+        humans = layout[:, self.food_idx]
+        has_humans = humans.reshape(n_envs, -1).any(axis=1)
+        n_moves = len(self.moves)
+        chase_moves = np.full(cells.shape[:2] + (n_moves,), -1, dtype="int64")
+        chase_moves[..., : self.prefs.shape[1]] = self.get_chase_moves(cells, humans)
+        patrol_moves = self.rng.random(chase_moves.shape).argsort(axis=-1)
+        first_moves = np.where(has_humans[:, None, None], chase_moves, patrol_moves)
+        fallback = np.broadcast_to(np.arange(n_moves), first_moves.shape)
+        candidates = np.concatenate([first_moves, fallback], axis=-1)
+        water = layout[:, self.water_idx]
+        is_valid = self.is_valid_move(water, cells, candidates, self.histories[envs])
+        first_valid = is_valid.argmax(axis=-1)
+        chosen = np.take_along_axis(candidates, first_valid[..., None], axis=-1)[..., 0]
+        return np.where(is_valid.any(axis=-1), self.codes[chosen], 0)
+
+    def remember(self, cells, envs):
+        """Pushes the previous cell of every shark that moved onto its history ring."""
+        moved = (cells != self.current_cells[envs]).any(axis=-1)
+        rows, sharks = np.nonzero(moved)
+        envs = envs[rows]
+        slots = self.n_history[envs, sharks] % self.history_length
+        self.histories[envs, sharks, slots] = self.current_cells[envs, sharks]
+        self.n_history[envs, sharks] += 1
+        self.current_cells[envs, sharks] = cells[rows, sharks]
+
+    def get_chase_moves(self, cells, humans):
+        """(n_envs, n_sharks, 3) move indices heading for each shark's nearest goodie.
+
+        Goodies are gathered per environment in np.where order, so ties go to
+        the first one as in SharkBaseline.chase.
+        """
+        n_envs = humans.shape[0]
+        envs, xs, ys = np.nonzero(humans)
+        counts = np.bincount(envs, minlength=n_envs)
+        slots = np.arange(len(envs)) - np.repeat(np.cumsum(counts) - counts, counts)
+        shape = (n_envs, max(1, counts.max(initial=0)))
+        hx = np.zeros(shape, dtype="int64")
+        hy = np.zeros(shape, dtype="int64")
+        present = np.zeros(shape, dtype="bool")
+        hx[envs, slots] = xs
+        hy[envs, slots] = ys
+        present[envs, slots] = True
+        sx = cells[..., 0, None]
+        sy = cells[..., 1, None]
+        distances = (hx[:, None] - sx) ** 2 + (hy[:, None] - sy) ** 2
+        distances = np.where(present[:, None], distances, np.iinfo("int64").max)
+        nearest = distances.argmin(axis=-1)
+        tx = np.take_along_axis(hx, nearest, axis=1)
+        ty = np.take_along_axis(hy, nearest, axis=1)
+        key = self.key_idx[np.sign(tx - cells[..., 0]) + 1, np.sign(ty - cells[..., 1]) + 1]
+        random_key = self.rng.integers(len(self.prefs), size=key.shape)
+        key = np.where(key < 0, random_key, key)
+        return self.prefs[key]
+
+    def is_valid_move(self, water, cells, candidates, histories):
+        """SharkBaseline.is_valid_cell for every candidate move, -1 moves being invalid."""
+        moves = self.moves[candidates]
+        x = cells[..., 0, None] + moves[..., 0]
+        y = cells[..., 1, None] + moves[..., 1]
+        on_map = (candidates >= 0) & (x >= 0) & (x < self.cols) & (y >= 0) & (y < self.rows)
+        envs = np.arange(water.shape[0])[:, None, None]
+        is_water = on_map & water[envs, np.clip(y, 0, self.rows - 1), np.clip(x, 0, self.cols - 1)]
+        target = np.stack([x, y], axis=-1)[..., None, :]
+        visited = (target == histories[:, :, None]).all(axis=-1).any(axis=-1)
+        return is_water & ~visited
+
+
+class BatchGoodieBaseline:
+    """Sends every goodie to its nearest goal cell, for stacked HumanEnvPlay observations.
+
+    Returns (n_envs, n_players, 2) target cells, (-1, -1) for dead goodies and
+    empty player slots. With probability explore a goodie heads for a random
+    goal cell instead, drawn from a numpy Generator seeded with seed.
+    """
+
+    def __init__(self, goal, seed=None, explore=0.0):
+        self.goal = np.array(sorted(goal), dtype="int64").reshape(-1, 2)
+        self.rng = np.random.default_rng(seed)
+        self.explore = explore
+
+    def reset(self, state, envs=None):
+        pass
+
+    def step(self, state, envs=None):
+        layout, info = state
+        rows, cols = layout.shape[-2:]
+        health = info[:, 0:-1:3]
+        x = np.rint(info[:, 1:-1:3] * cols).astype("int64")
+        y = np.rint(info[:, 2:-1:3] * rows).astype("int64")
+        goal_x, goal_y = self.goal.T
+        distances = np.maximum(
+            np.abs(x[..., None] - goal_x), np.abs(y[..., None] - goal_y)
+        )
+        choice = distances.argmin(axis=-1)
+        random_choice = self.rng.integers(len(self.goal), size=choice.shape)
+        explores = self.rng.random(choice.shape) < self.explore
+        targets = self.goal[np.where(explores, random_choice, choice)]
+        targets[health <= 0] = -1
+        return targets
@@ -2,9 +2,10 @@ import pyglet
 import math
 from .level import LevelLoader
 from .render import Renderer
-from .base import Cell
+from .base import Cell, FixedTimestep, TICK_LENGTH
 from .ai import SharkBaseline
 from .env import SharkEnvPlay
+from .replaylog import ReplayWriter, REPLAY_SUFFIX
 from pathlib import Path
 import time
 
@@ -26,16 +27,22 @@ class App(pyglet.window.Window):
         self.level_running = False
         self.clicked = None
         self.objects_to_draw = []
+        self.timestep = FixedTimestep(TICK_LENGTH)
         self.start_game()
 
     def start_game(self):
-        self.current_level = self.level_loader[self.current_level_idx]
+        template = self.level_loader.get_template(self.current_level_idx)
+        self.current_level = template.build(pathfinding=True)
+        replay_path = "replay_" + str(int(time.time())) + REPLAY_SUFFIX
+        self.current_level.record(
+            ReplayWriter(replay_path, template.name, pathfinding=True, dt=TICK_LENGTH)
+        )
         obs = self.env.reset(self.current_level)
-        self.ai.reset(obs)
+        self.ai.reset(obs, self.env.water_distances)
         self.renderer.start_level(self.current_level)
         self.level_running = True
         self.time_remaining = self.current_level.time_limit
-        pyglet.clock.schedule_interval(self.update_game, 1 / 60.0)
+        pyglet.clock.schedule_interval(self.update_game, TICK_LENGTH)
 
     def on_mouse_press(self, x, y, button, modifiers):
         if button == pyglet.window.mouse.LEFT:
@@ -57,16 +64,22 @@ class App(pyglet.window.Window):
         self.renderer.draw(self.objects_to_draw, self.time_remaining)
 
     def on_close(self):
+        if self.current_level.is_recording:
+            self.current_level.stop_recording()
         self.close()
 
     def update_game(self, dt):
-        obs = self.env.get_obs()
-        if obs:
-            action = self.ai.step(obs)
-            self.env.step(action)
-        game_status = self.current_level.step(dt)
-        if game_status.game_over:
-            self.end_level(game_status)
+        """Steps the level by whole ticks of TICK_LENGTH, however long the frame took."""
+        game_status = self.current_level.result
+        for i in range(self.timestep(dt)):
+            obs = self.env.get_obs()
+            if obs:
+                action = self.ai.step(obs)
+                self.env.step(action)
+            game_status = self.current_level.step(TICK_LENGTH)
+            if game_status.game_over:
+                self.end_level(game_status)
+                break
         if self.show_all:
             visible_baddies = game_status.baddies
         else:
@@ -84,7 +97,7 @@ class App(pyglet.window.Window):
             self.current_level_idx += 1
         else:
             print("you lost!")
-        self.current_level.save_log("replay_" + str(int(time.time())) + ".json")
+        self.current_level.stop_recording()
         self.close()
 
     def run(self):
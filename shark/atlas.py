@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import pyglet
+
+ATLAS_VERSION = 1
+ATLAS_FOLDER = "atlas"
+MAX_ATLAS_SIZE = 1024
+PADDING = 1
+
+
+def get_image_array(img):
+    """Returns an image's pixels as a (height, width, 4) uint8 RGBA array, bottom row first."""
+    data = img.get_image_data()
+    pixels = data.get_bytes("RGBA", data.width * 4)
+    return np.frombuffer(pixels, dtype="uint8").reshape(data.height, data.width, 4)
+
+
+def pack_shelves(sizes, max_size=MAX_ATLAS_SIZE, padding=PADDING):
+    """Places (width, height) rectangles on shelves of max_size square pages.
+
+    Tallest first, each shelf is filled left to right and a new shelf is
+    opened above it, then a new page, when a rectangle doesn't fit. Returns
+    the (page, x, y) of every rectangle, in the order given, and the page count.
+    """
+    places = [None] * len(sizes)
+    page, x, y, shelf_height = 0, 0, 0, 0
+    for idx in sorted(range(len(sizes)), key=lambda idx: (-sizes[idx][1], -sizes[idx][0])):
+        width, height = sizes[idx]
+        if width > max_size or height > max_size:
+            raise ValueError(f"a {width}x{height} image doesn't fit in a {max_size} atlas")
+        if x + width > max_size:
+            x, y, shelf_height = 0, y + shelf_height + padding, 0
+        if y + height > max_size:
+            page, x, y, shelf_height = page + 1, 0, 0, 0
+        places[idx] = (page, x, y)
+        x += width + padding
+        shelf_height = max(shelf_height, height)
+    return places, page + 1 if sizes else 0
+
+
+def get_atlas_key(paths, max_size=MAX_ATLAS_SIZE):
+    """Hash of the sheets' names, sizes and modification times, naming the cached atlas."""
+    key = hashlib.sha1(f"{ATLAS_VERSION}:{max_size}:{PADDING}".encode("utf8"))
+    for path in sorted(paths):
+        stat = path.stat()
+        key.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf8"))
+    return key.hexdigest()[:16]
+
+
+class TextureAtlas:
+    """Sprite sheets packed into a few RGBA pages, with the rectangle each sheet went to.
+
+    Pages are kept as pixel arrays and only become textures when a region
+    of them is first asked for, so every sheet on a page shares one texture.
+    """
+
+    def __init__(self, pages, table):
+        self.pages = pages
+        self.table = table
+        self.textures = [None] * len(pages)
+
+    def __repr__(self):
+        return f"TextureAtlas(pages: {len(self.pages)}, sheets: {len(self.table)})"
+
+    def __contains__(self, filename):
+        return filename in self.table
+
+    @classmethod
+    def build(cls, paths, max_size=MAX_ATLAS_SIZE):
+        sheets = [get_image_array(pyglet.image.load(path)) for path in paths]
+        places, n_pages = pack_shelves([(s.shape[1], s.shape[0]) for s in sheets], max_size)
+        heights = [0] * n_pages
+        widths = [0] * n_pages
+        for sheet, (page, x, y) in zip(sheets, places):
+            heights[page] = max(heights[page], y + sheet.shape[0])
+            widths[page] = max(widths[page], x + sheet.shape[1])
+        pages = [np.zeros((h, w, 4), dtype="uint8") for h, w in zip(heights, widths)]
+        table = {}
+        for path, sheet, (page, x, y) in zip(paths, sheets, places):
+            height, width, _ = sheet.shape
+            pages[page][y : y + height, x : x + width] = sheet
+            table[path.name] = (page, x, y, width, height)
+        return cls(pages, table)
+
+    @classmethod
+    def load(cls, folder, key):
+        with open(folder / (key + ".json"), "r") as table_file:
+            table = {name: tuple(place) for name, place in json.load(table_file).items()}
+        n_pages = max((place[0] for place in table.values()), default=-1) + 1
+        pages = [np.load(folder / f"{key}-{page}.npy") for page in range(n_pages)]
+        return cls(pages, table)
+
+    def save(self, folder, key):
+        """Writes the pages, then the table, each through a temp file of its own."""
+        folder.mkdir(parents=True, exist_ok=True)
+        for page, pixels in enumerate(self.pages):
+            with tempfile.NamedTemporaryFile(
+                dir=folder, prefix=key, suffix=".tmp", delete=False
+            ) as page_file:
+                np.save(page_file, pixels)
+            os.replace(page_file.name, folder / f"{key}-{page}.npy")
+        with tempfile.NamedTemporaryFile(
+            "w", dir=folder, prefix=key, suffix=".tmp", delete=False
+        ) as table_file:
+            json.dump(self.table, table_file)
+        os.replace(table_file.name, folder / (key + ".json"))
+
+    def get_texture(self, page):
+        if self.textures[page] is None:
+            height, width, _ = self.pages[page].shape
+            data = self.pages[page].tobytes()
+            image = pyglet.image.ImageData(width, height, "RGBA", data, pitch=width * 4)
+            self.textures[page] = image.get_texture()
+        return self.textures[page]
+
+    def get_region(self, filename):
+        """Returns the texture region a sheet was packed into."""
+        page, x, y, width, height = self.table[filename]
+        return self.get_texture(page).get_region(x, y, width, height)
+
+    def get_pixels(self, filename, x=0, y=0, width=None, height=None):
+        """Returns a sheet's pixels, or those of a rectangle inside it, bottom row first."""
+        page, sheet_x, sheet_y, sheet_width, sheet_height = self.table[filename]
+        width = sheet_width if width is None else width
+        height = sheet_height if height is None else height
+        x, y = sheet_x + x, sheet_y + y
+        return self.pages[page][y : y + height, x : x + width]
+
+
+def load_atlas(folder, paths, max_size=MAX_ATLAS_SIZE):
+    """Returns the atlas of the sheets at paths, packing and caching it in folder when stale.
+
+    If folder can't be written, the atlas is packed without caching it.
+    """
+    key = get_atlas_key(paths, max_size)
+    try:
+        return TextureAtlas.load(folder, key)
+    except (OSError, ValueError, KeyError):
+        atlas = TextureAtlas.build(paths, max_size)
+    try:
+        atlas.save(folder, key)
+    except OSError:
+        pass
+    return atlas
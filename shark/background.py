@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+import tempfile
+import numpy as np
+import pyglet
+from .base import Direction
+from .terrain import terrain_names
+
+TERRAIN_ART_VERSION = 1
+BAKED_FOLDER = "baked"
+BAKED_SUFFIX = ".npy"
+
+
+def composite_terrain(codes, tiles, cell_size):
+    """Lays tiles out by terrain code into one (rows * cell_size, cols * cell_size, 4) image.
+
+    tiles maps codes to (cell_size, cell_size, 4) arrays; other codes stay
+    transparent. Row 0 of codes and of the image is the bottom.
+    """
+    rows, cols = codes.shape
+    table = np.zeros((256, cell_size, cell_size, 4), dtype="uint8")
+    for code, tile in tiles.items():
+        height, width = min(tile.shape[0], cell_size), min(tile.shape[1], cell_size)
+        table[code, :height, :width] = tile[:height, :width]
+    cells = table[codes]
+    return cells.transpose(0, 2, 1, 3, 4).reshape(rows * cell_size, cols * cell_size, 4)
+
+
+class TerrainBaker:
+    """Composites a level's terrain tiles into one texture, cached on disk.
+
+    Baked backgrounds are saved as .npy pixel arrays in graphics/baked, named
+    by level, a hash of its terrain codes and a hash of the terrain art, so
+    changing either the map or a tile bakes a new one.
+    """
+
+    def __init__(self, imgs, cell_size):
+        self.imgs = imgs
+        self.cell_size = cell_size
+        self.folder = imgs.folder / BAKED_FOLDER
+        self.art_version = self.get_art_version()
+
+    def __repr__(self):
+        return f"TerrainBaker(art: {self.art_version})"
+
+    def get_key(self, name):
+        return name + "_" + Direction.south.name
+
+    def get_art_version(self):
+        art = hashlib.sha1(f"{TERRAIN_ART_VERSION}:{self.cell_size}".encode("utf8"))
+        for code, name in sorted(terrain_names.items()):
+            for suffix in (".json", ".png"):
+                path = self.imgs.folder / (name + suffix)
+                if path.exists():
+                    art.update(path.read_bytes())
+        return art.hexdigest()[:12]
+
+    def get_cache_path(self, level):
+        terrain = hashlib.sha1(np.ascontiguousarray(level.terrain.codes).tobytes())
+        terrain.update(str(level.terrain.shape).encode("utf8"))
+        name = re.sub(r"[^A-Za-z0-9]+", "_", str(level.name)).strip("_")
+        stem = f"{name}-{terrain.hexdigest()[:12]}-{self.art_version}"
+        return self.folder / (stem + BAKED_SUFFIX)
+
+    def get_pixels(self, level):
+        """Returns the baked background's pixels, from the cache if it's been baked before.
+
+        If the cache can't be written, the background is baked without caching it.
+        """
+        path = self.get_cache_path(level)
+        if path.exists():
+            try:
+                return np.load(path)
+            except (OSError, ValueError):
+                pass
+        pixels = self.bake(level)
+        try:
+            self.save(path, pixels)
+        except OSError:
+            pass
+        return pixels
+
+    def save(self, path, pixels):
+        self.folder.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.folder, prefix=path.stem, suffix=".tmp", delete=False
+        ) as temp_file:
+            np.save(temp_file, pixels)
+        os.replace(temp_file.name, path)
+
+    def bake(self, level):
+        tiles = {
+            code: self.imgs.get_pixels(self.get_key(name))
+            for code, name in terrain_names.items()
+        }
+        return composite_terrain(np.asarray(level.terrain.codes), tiles, self.cell_size)
+
+    def get_image(self, level):
+        pixels = self.get_pixels(level)
+        height, width, _ = pixels.shape
+        return pyglet.image.ImageData(width, height, "RGBA", pixels.tobytes(), pitch=width * 4)
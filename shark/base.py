@@ -1,6 +1,6 @@
 from itertools import product
 from collections import namedtuple
-from enum import Enum
+from enum import IntEnum
 
 Cell = namedtuple("Cell", "x, y")
 
@@ -55,7 +55,14 @@ displacement_preferences = {
 }
 
 
-class Direction(Enum):
+class IntCode(IntEnum):
+    """Enum whose members are plain int codes but, like Enum members, always truthy."""
+
+    def __bool__(self):
+        return True
+
+
+class Direction(IntCode):
     north = 0
     south = 1
     east = 2
@@ -66,7 +73,7 @@ class Direction(Enum):
     southwest = 7
 
 
-class Action(Enum):
+class Action(IntCode):
     stand = 0
     tread_water = 1
     walk = 2
@@ -97,6 +104,33 @@ Compass_diag = {
 Compass_eight = {**Compass_four, **Compass_diag}
 
 
+TICK_LENGTH = 1 / 60.0
+
+
+class FixedTimestep:
+    """Splits uneven frame times into whole ticks of tick_length, carrying the remainder.
+
+    Stepping a level by the same dt every tick is what lets a replay
+    reproduce the game. A frame late by more than max_ticks drops the
+    excess rather than stalling to catch up.
+    """
+
+    def __init__(self, tick_length=TICK_LENGTH, max_ticks=8):
+        self.tick_length = tick_length
+        self.max_ticks = max_ticks
+        self.leftover = 0.0
+
+    def __call__(self, dt):
+        """Returns how many ticks the frame time dt completes."""
+        self.leftover += dt
+        n_ticks = int(self.leftover // self.tick_length)
+        if n_ticks > self.max_ticks:
+            n_ticks, self.leftover = self.max_ticks, 0.0
+        else:
+            self.leftover -= n_ticks * self.tick_length
+        return n_ticks
+
+
 class Timer:
     def __init__(self, interval):
         self.interval = interval
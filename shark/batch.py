@@ -0,0 +1,479 @@
+from collections import namedtuple
+import numpy as np
+from .base import Action, Direction, Compass_four, displacement_preferences
+from .objects import Goodie, Shark
+from .terrain import NO_TERRAIN, WATER, LAND
+from .env import Movements
+
+NO_DIRECTION = -1
+HISTORY_LENGTH = 5
+SHARK_STARVATION = 40
+
+
+def get_preference_table():
+    """Returns displacement_preferences as a (3, 3, 3, 2) array indexed by sign(dx) + 1, sign(dy) + 1."""
+    table = np.zeros((3, 3, 3, 2), dtype="int64")
+    for (dx, dy), prefs in displacement_preferences.items():
+        table[dx + 1, dy + 1] = prefs
+    return table
+
+
+def get_direction_table():
+    """Returns Compass_four as a (3, 3) array of Direction values, -1 where undefined."""
+    table = np.full((3, 3), NO_DIRECTION, dtype="int64")
+    for (dx, dy), direction in Compass_four.items():
+        table[dx + 1, dy + 1] = direction.value
+    return table
+
+
+class BatchLevel:
+    """Lockstep copies of one level with character state held as (n_games, n_characters) arrays.
+
+    Each tick loops over characters in Level.characters order and applies the
+    MoveableObject, Goodie and Shark rules to that character in every game at
+    once, so results match stepping n_games separate Level instances.
+    Games stop stepping once over until they are reset.
+    """
+
+    preferences = get_preference_table()
+    directions = get_direction_table()
+
+    def __init__(self, level, n_games):
+        if level.pathfinding:
+            raise ValueError("BatchLevel can't follow flow fields, build the level without pathfinding")
+        self.name = level.name
+        self.shape = tuple(level.shape)
+        self.rows, self.cols = self.shape
+        self.time_limit = level.time_limit
+        self.n_games = n_games
+        self.terrain = level.terrain.codes.copy()
+        self.water = self.terrain == WATER
+        self.goal = np.zeros(self.shape, dtype="bool")
+        for x, y in level.goal:
+            self.goal[y, x] = True
+        self.build_characters(level)
+        self.build_initial_state(level)
+        self.reset()
+
+    def __repr__(self):
+        return f"BatchLevel(name: {self.name}, shape: {self.shape}, games: {self.n_games})"
+
+    def build_characters(self, level):
+        characters = level.characters
+        for character in characters:
+            if not isinstance(character, (Goodie, Shark)):
+                raise ValueError(f"BatchLevel can't simulate {character}")
+            if tuple(character.shape) != (1, 1):
+                raise ValueError(f"BatchLevel only supports single cell characters")
+        self.n_characters = len(characters)
+        self.goodie_idx = np.array(
+            [i for i, c in enumerate(characters) if isinstance(c, Goodie)], dtype="int64"
+        )
+        self.shark_idx = np.array(
+            [i for i, c in enumerate(characters) if isinstance(c, Shark)], dtype="int64"
+        )
+        self.is_shark = np.array([isinstance(c, Shark) for c in characters])
+        self.land_speed = np.array([c.land_speed for c in characters], dtype="float64")
+        self.water_speed = np.array([c.water_speed for c in characters], dtype="float64")
+        self.max_health = np.array([c.max_health for c in characters], dtype="float64")
+        self.visible_distance = np.array([c.visible_distance for c in characters])
+        self.damage = np.array([getattr(c, "damage", 0) for c in characters], dtype="float64")
+        self.default_action = np.array([c.default_action.value for c in characters])
+
+    def build_initial_state(self, level):
+        self.initial = {}
+        characters = level.characters
+        for name, default in self.state_fields().items():
+            values = [self.get_initial_value(c, name, default) for c in characters]
+            self.initial[name] = np.array(values, dtype=np.asarray(default).dtype)
+        history = np.zeros((self.n_characters, HISTORY_LENGTH, 2), dtype="int64")
+        history_len = np.zeros(self.n_characters, dtype="int64")
+        for i, character in enumerate(characters):
+            if isinstance(character, Shark):
+                for j, cell in enumerate(character.previous_cells):
+                    history[i, j] = cell
+                history_len[i] = len(character.previous_cells)
+        self.initial["history"] = history
+        self.initial["history_len"] = history_len
+        self.initial["history_pos"] = history_len % HISTORY_LENGTH
+
+    def state_fields(self):
+        return {
+            "x": 0.0,
+            "y": 0.0,
+            "health": 0.0,
+            "goal_x": 0,
+            "goal_y": 0,
+            "has_goal": False,
+            "next_x": 0,
+            "next_y": 0,
+            "has_next": False,
+            "step_x": 0,
+            "step_y": 0,
+            "has_step": False,
+            "direction": 0,
+            "action": 0,
+            "on_land": False,
+            "visible": False,
+        }
+
+    def get_initial_value(self, character, name, default):
+        getters = {
+            "x": lambda c: c.x,
+            "y": lambda c: c.y,
+            "health": lambda c: c.current_health,
+            "goal_x": lambda c: c.goal_cell.x if c.goal_cell else 0,
+            "goal_y": lambda c: c.goal_cell.y if c.goal_cell else 0,
+            "has_goal": lambda c: bool(c.goal_cell),
+            "next_x": lambda c: c.next_cell.x if c.next_cell else 0,
+            "next_y": lambda c: c.next_cell.y if c.next_cell else 0,
+            "has_next": lambda c: bool(c.next_cell),
+            "step_x": lambda c: c.dx_dy[0] if c.dx_dy else 0,
+            "step_y": lambda c: c.dx_dy[1] if c.dx_dy else 0,
+            "has_step": lambda c: bool(c.dx_dy),
+            "direction": lambda c: c.direction.value if c.direction else NO_DIRECTION,
+            "action": lambda c: c.action.value,
+            "on_land": lambda c: c.is_on_land,
+            "visible": lambda c: c.is_visible,
+        }
+        return getters[name](character)
+
+    def reset(self, games=None):
+        """Restores the starting state of the given games, or all of them."""
+        if games is None:
+            games = np.ones(self.n_games, dtype="bool")
+            for name, value in self.initial.items():
+                setattr(self, name, np.repeat(value[None], self.n_games, axis=0))
+            self.time_elapsed = np.zeros(self.n_games, dtype="float64")
+            self.n_updates = np.zeros(self.n_games, dtype="int64")
+            self.game_over = np.zeros(self.n_games, dtype="bool")
+            self.won = np.zeros(self.n_games, dtype="bool")
+            self.goodie_cells = np.full((self.n_games,) + self.shape, -1, dtype="int16")
+            self.baddie_cells = np.full((self.n_games,) + self.shape, -1, dtype="int16")
+            self.cell_x = np.zeros((self.n_games, self.n_characters), dtype="int64")
+            self.cell_y = np.zeros((self.n_games, self.n_characters), dtype="int64")
+        else:
+            for name, value in self.initial.items():
+                getattr(self, name)[games] = value
+            self.time_elapsed[games] = 0.0
+            self.n_updates[games] = 0
+            self.game_over[games] = False
+            self.won[games] = False
+            self.goodie_cells[games] = -1
+            self.baddie_cells[games] = -1
+        self.rebuild_occupancy(games)
+
+    @property
+    def cells(self):
+        """Returns the rounded (x, y) cells of every character as two int arrays."""
+        return np.rint(self.x).astype("int64"), np.rint(self.y).astype("int64")
+
+    @property
+    def is_alive(self):
+        return self.health > 0
+
+    @property
+    def is_active(self):
+        return self.has_goal
+
+    @property
+    def goodies_in_goal(self):
+        in_goal = self.goal[self.cell_y[:, self.goodie_idx], self.cell_x[:, self.goodie_idx]]
+        return in_goal.all(axis=1)
+
+    @property
+    def times_up(self):
+        return self.time_elapsed > self.time_limit
+
+    def sharks_active(self):
+        return self.has_goal[:, self.shark_idx].any(axis=1)
+
+    def rebuild_occupancy(self, games):
+        cell_x, cell_y = self.cells
+        self.cell_x[games] = cell_x[games]
+        self.cell_y[games] = cell_y[games]
+        games = np.nonzero(games)[0]
+        self.goodie_cells[games] = -1
+        self.baddie_cells[games] = -1
+        self.write_occupancy(games)
+
+    def update_occupancy(self, games):
+        """Moves characters that changed cell in the given games, later characters winning shared cells."""
+        games = np.nonzero(games)[0]
+        if not len(games):
+            return
+        old_x = self.cell_x[games]
+        old_y = self.cell_y[games]
+        for group, grid in ((self.goodie_idx, self.goodie_cells), (self.baddie_idx, self.baddie_cells)):
+            for c in group:
+                x, y, _ = self.clip(old_x[:, c], old_y[:, c])
+                grid[games, y, x] = -1
+        cell_x, cell_y = self.cells
+        self.cell_x[games] = cell_x[games]
+        self.cell_y[games] = cell_y[games]
+        self.write_occupancy(games)
+
+    def write_occupancy(self, games):
+        for group, grid in ((self.goodie_idx, self.goodie_cells), (self.baddie_idx, self.baddie_cells)):
+            for c in group:
+                x, y, on_map = self.clip(self.cell_x[games, c], self.cell_y[games, c])
+                grid[games[on_map], y[on_map], x[on_map]] = c
+
+    @property
+    def baddie_idx(self):
+        return self.shark_idx
+
+    def clip(self, x, y):
+        """Returns x and y clipped to the map and a mask of which were on it."""
+        on_map = (x >= 0) & (x < self.cols) & (y >= 0) & (y < self.rows)
+        return np.clip(x, 0, self.cols - 1), np.clip(y, 0, self.rows - 1), on_map
+
+    def terrain_at(self, x, y):
+        cx, cy, on_map = self.clip(x, y)
+        return np.where(on_map, self.terrain[cy, cx], NO_TERRAIN)
+
+    def occupant_at(self, grid, games, x, y):
+        cx, cy, on_map = self.clip(x, y)
+        return np.where(on_map, grid[games, cy, cx], -1)
+
+    def move_to(self, c, cell_x, cell_y, games=None):
+        """Sets the goal cell of character c in the given games, as MoveableObject.move_to."""
+        if games is None:
+            games = np.arange(self.n_games)
+        elif games.dtype == bool:
+            games = np.nonzero(games)[0]
+        cell_x = np.broadcast_to(cell_x, self.n_games)[games]
+        cell_y = np.broadcast_to(cell_y, self.n_games)[games]
+        x = np.rint(self.x[games, c]).astype("int64")
+        y = np.rint(self.y[games, c]).astype("int64")
+        moved = (cell_x != x) | (cell_y != y)
+        games, cell_x, cell_y, x, y = games[moved], cell_x[moved], cell_y[moved], x[moved], y[moved]
+        idle = ~self.has_goal[games, c]
+        self.next_x[games[idle], c] = x[idle]
+        self.next_y[games[idle], c] = y[idle]
+        self.has_next[games[idle], c] = True
+        self.goal_x[games, c] = cell_x
+        self.goal_y[games, c] = cell_y
+        self.has_goal[games, c] = True
+
+    def update_sharks(self, actions, games=None):
+        """Applies SharkEnvPlay.step movements, actions being (n_games, n_sharks)."""
+        actions = np.asarray(actions)
+        movements = np.array([Movements[a] for a in range(len(Movements))])
+        for i, c in enumerate(self.shark_idx):
+            x, y = self.cells
+            dx, dy = movements[actions[:, i]].T
+            self.move_to(c, x[:, c] + dx, y[:, c] + dy, games)
+
+    def step(self, dt):
+        """Advances every game that isn't over by dt, as Level.step."""
+        live = ~self.game_over
+        self.n_updates[live] += 1
+        self.time_elapsed[live] += dt
+        won = live & self.goodies_in_goal
+        over = live & ~won & self.times_up
+        running = live & ~won & ~over
+        self.won |= won
+        self.game_over |= won | over
+        if running.any():
+            for c in range(self.n_characters):
+                self.step_character(c, dt, running)
+            self.check_visibilities(running)
+            self.update_occupancy(running)
+        return BatchResult(self.game_over.copy(), self.won.copy())
+
+    def step_character(self, c, dt, running):
+        games = np.nonzero(running & self.has_goal[:, c] & (self.health[:, c] > 0))[0]
+        if not len(games):
+            return
+        start_x = self.x[games, c].copy()
+        start_y = self.y[games, c].copy()
+        block_x = np.rint(start_x).astype("int64")
+        block_y = np.rint(start_y).astype("int64")
+        on_land = self.terrain_at(block_x, block_y) >= LAND
+        self.on_land[games, c] = on_land
+        self.action[games, c] = np.where(on_land, Action.walk.value, Action.swim.value)
+        speed = np.where(on_land, self.land_speed[c], self.water_speed[c])
+        self.move(c, games, speed * dt, block_x, block_y)
+        if self.is_shark[c]:
+            self.step_shark(c, games, dt, start_x, start_y, block_x, block_y)
+
+    def move(self, c, games, distance, block_x, block_y):
+        todo = distance > 0
+        while todo.any():
+            lanes = np.nonzero(todo)[0]
+            g = games[lanes]
+            self.confirm_next_cell(c, g, block_x[lanes], block_y[lanes])
+            has_next = self.has_next[g, c]
+            self.clear(c, g[~has_next])
+            moved = self.take_step(c, g[has_next], distance[lanes[has_next]])
+            distance[lanes[has_next]] -= moved
+            todo[lanes[~has_next]] = False
+            stuck = lanes[has_next][moved == 0]
+            todo[stuck] = False
+            todo &= distance > 0
+
+    def confirm_next_cell(self, c, g, block_x, block_y):
+        x = self.x[g, c]
+        y = self.y[g, c]
+        at_next = ~self.has_next[g, c] | (
+            (x == self.next_x[g, c]) & (y == self.next_y[g, c])
+        )
+        self.choose_next_cell(c, g[at_next], block_x[at_next], block_y[at_next])
+        g, block_x, block_y = g[~at_next], block_x[~at_next], block_y[~at_next]
+        next_x = self.next_x[g, c]
+        next_y = self.next_y[g, c]
+        blocked = ~self.is_free_cell(c, g, next_x, next_y, block_x, block_y)
+        g = g[blocked]
+        cell_x = np.rint(self.x[g, c]).astype("int64")
+        cell_y = np.rint(self.y[g, c]).astype("int64")
+        at_goal = (next_x[blocked] == self.goal_x[g, c]) & (next_y[blocked] == self.goal_y[g, c])
+        self.goal_x[g[at_goal], c] = cell_x[at_goal]
+        self.goal_y[g[at_goal], c] = cell_y[at_goal]
+        self.next_x[g, c] = cell_x
+        self.next_y[g, c] = cell_y
+
+    def choose_next_cell(self, c, g, block_x, block_y):
+        self.has_next[g, c] = False
+        self.has_step[g, c] = False
+        self.direction[g, c] = NO_DIRECTION
+        cell_x = np.rint(self.x[g, c]).astype("int64")
+        cell_y = np.rint(self.y[g, c]).astype("int64")
+        sign_x = np.sign(self.goal_x[g, c] - cell_x)
+        sign_y = np.sign(self.goal_y[g, c] - cell_y)
+        searching = (sign_x != 0) | (sign_y != 0)
+        prefs = self.preferences[sign_x + 1, sign_y + 1]
+        for k in range(prefs.shape[1]):
+            dx, dy = prefs[:, k, 0], prefs[:, k, 1]
+            free = searching & self.is_free_cell(
+                c, g, cell_x + dx, cell_y + dy, block_x, block_y
+            )
+            found = g[free]
+            self.next_x[found, c] = cell_x[free] + dx[free]
+            self.next_y[found, c] = cell_y[free] + dy[free]
+            self.has_next[found, c] = True
+            self.step_x[found, c] = dx[free]
+            self.step_y[found, c] = dy[free]
+            self.has_step[found, c] = True
+            self.direction[found, c] = self.directions[dx[free] + 1, dy[free] + 1]
+            searching &= ~free
+
+    def is_free_cell(self, c, g, x, y, block_x, block_y):
+        """Goodie.is_free_cell or Shark.is_free_cell, seen from the block around (block_x, block_y)."""
+        in_block = (np.abs(x - block_x) <= 1) & (np.abs(y - block_y) <= 1)
+        terrain = self.terrain_at(x, y)
+        if self.is_shark[c]:
+            occupant = self.occupant_at(self.baddie_cells, g, x, y)
+            history = self.history[g, c]
+            used = np.arange(HISTORY_LENGTH) < self.history_len[g, c][:, None]
+            visited = (
+                (history[:, :, 0] == x[:, None]) & (history[:, :, 1] == y[:, None]) & used
+            ).any(axis=1)
+            return in_block & (terrain == WATER) & ~visited & (occupant < 0)
+        occupant = self.occupant_at(self.goodie_cells, g, x, y)
+        occupant_alive = self.health[g, np.maximum(occupant, 0)] > 0
+        is_occupied = (occupant >= 0) & occupant_alive
+        return in_block & (terrain >= WATER) & (terrain <= LAND) & ~is_occupied
+
+    def clear(self, c, g):
+        self.has_goal[g, c] = False
+        self.has_next[g, c] = False
+        self.has_step[g, c] = False
+        self.direction[g, c] = Direction.south.value
+        self.action[g, c] = np.where(
+            self.on_land[g, c], Action.stand.value, self.default_action[c]
+        )
+
+    def take_step(self, c, g, distance):
+        """MoveableObject.take_step, returning the distance covered."""
+        sx = np.where(self.has_step[g, c], self.step_x[g, c], 0) * distance
+        sy = np.where(self.has_step[g, c], self.step_y[g, c], 0) * distance
+        next_x = self.next_x[g, c].astype("float64")
+        next_y = self.next_y[g, c].astype("float64")
+        x = self.x[g, c]
+        y = self.y[g, c]
+        dx = next_x - x
+        dy = next_y - y
+        short_x = np.abs(sx) < np.abs(dx)
+        short_y = np.abs(sy) < np.abs(dy)
+        moved_x = np.where(short_x, sx, dx)
+        moved_y = np.where(short_y, sy, dy)
+        self.x[g, c] = np.where(short_x, x + sx, next_x)
+        self.y[g, c] = np.where(short_y, y + sy, next_y)
+        return np.abs(moved_x) + np.abs(moved_y)
+
+    def step_shark(self, c, g, dt, start_x, start_y, block_x, block_y):
+        alive = self.health[g, c] > 0
+        g, start_x, start_y = g[alive], start_x[alive], start_y[alive]
+        block_x, block_y = block_x[alive], block_y[alive]
+        still = (self.x[g, c] == start_x) & (self.y[g, c] == start_y)
+        self.health[g[still], c] -= SHARK_STARVATION
+        g, block_x, block_y = g[~still], block_x[~still], block_y[~still]
+        self.health[g, c] = self.max_health[c]
+        cell_x = np.rint(self.x[g, c]).astype("int64")
+        cell_y = np.rint(self.y[g, c]).astype("int64")
+        new_cell = (cell_x != block_x) | (cell_y != block_y)
+        self.remember_cell(c, g[new_cell], cell_x[new_cell], cell_y[new_cell])
+        in_block = (np.abs(cell_x - block_x) <= 1) & (np.abs(cell_y - block_y) <= 1)
+        goodie = np.where(in_block, self.occupant_at(self.goodie_cells, g, cell_x, cell_y), -1)
+        attacking = goodie >= 0
+        self.attack(c, g[attacking], goodie[attacking], dt)
+
+    def remember_cell(self, c, g, cell_x, cell_y):
+        pos = self.history_pos[g, c]
+        self.history[g, c, pos, 0] = cell_x
+        self.history[g, c, pos, 1] = cell_y
+        self.history_pos[g, c] = (pos + 1) % HISTORY_LENGTH
+        self.history_len[g, c] = np.minimum(self.history_len[g, c] + 1, HISTORY_LENGTH)
+
+    def attack(self, c, g, goodies, dt):
+        self.action[g, c] = Action.attack.value
+        alive = self.health[g, goodies] > 0
+        g, goodies = g[alive], goodies[alive]
+        self.health[g, goodies] -= self.damage[c] * dt
+        died = self.health[g, goodies] <= 0
+        self.action[g[died], goodies[died]] = Action.die.value
+        self.direction[g[died], goodies[died]] = Direction.south.value
+
+    def check_visibilities(self, games):
+        """Level.check_visibilies for the given games."""
+        games = np.nonzero(games)[0]
+        cell_x, cell_y = self.cells
+        cell_x, cell_y = cell_x[games], cell_y[games]
+        alive = self.health[games] > 0
+        for targets, spotters in (
+            (self.goodie_idx, self.baddie_idx),
+            (self.baddie_idx, self.goodie_idx),
+        ):
+            if not len(spotters):
+                self.visible[games[:, None], targets] = False
+                continue
+            dx = np.abs(cell_x[:, targets, None] - cell_x[:, None, spotters])
+            dy = np.abs(cell_y[:, targets, None] - cell_y[:, None, spotters])
+            reach = self.visible_distance[spotters]
+            seen = (dx <= reach) & (dy <= reach) & alive[:, None, spotters]
+            self.visible[games[:, None], targets] = seen.any(axis=2)
+
+    def format_shark_state(self):
+        """Returns SharkEnvPlay.format_state for every game as stacked (layout, shark_info) arrays."""
+        n_sharks = len(self.shark_idx)
+        layout = np.zeros((self.n_games, 3, self.rows, self.cols), dtype="bool")
+        shark_info = np.zeros((self.n_games, (3 * n_sharks) + 1), dtype="float32")
+        layout[:, 0] = self.water
+        cell_x, cell_y = self.cells
+        games = np.arange(self.n_games)
+        for c in self.goodie_idx:
+            x, y = cell_x[:, c], cell_y[:, c]
+            show = (self.terrain_at(x, y) == WATER) & (self.health[:, c] > 0)
+            layout[games[show], 1, x[show], y[show]] = True
+        for i, c in enumerate(self.shark_idx):
+            x, y = cell_x[:, c], cell_y[:, c]
+            layout[games, 2, x, y] = True
+            shark_info[:, 3 * i] = self.health[:, c] / self.max_health[c]
+            shark_info[:, 3 * i + 1] = x / self.cols
+            shark_info[:, 3 * i + 2] = y / self.rows
+        shark_info[:, -1] = self.time_elapsed / self.time_limit
+        return [layout, shark_info]
+
+
+BatchResult = namedtuple("BatchResult", "game_over won")
@@ -0,0 +1,319 @@
+"""Benchmarks of the simulation, observation, AI, replay and rendering hot paths.
+
+Run with python -m shark.benchmark; results are written as JSON and can be
+compared against a stored baseline to catch regressions:
+
+    python -m shark.benchmark --output baseline.json
+    python -m shark.benchmark --output current.json --compare baseline.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+from .base import Cell, get_surrounding_cells
+from .level import LevelLoader, LevelTemplate, load_log
+from .terrain import WATER, LAND
+from .env import SharkEnvPlay
+from .ai import SharkBaseline
+from .replaylog import ReplayReader, convert_log
+
+Benchmark = namedtuple("Benchmark", "name setup number")
+
+benchmarks = []
+
+character_counts = [(1, 1), (4, 1), (4, 4), (8, 4)]
+
+
+def benchmark(name, number=1):
+    """Registers setup(context) as a benchmark timing number calls of the callable it returns.
+
+    setup runs before every repeat, outside the timings, so each repeat
+    starts from a fresh state.
+    """
+
+    def register(setup):
+        benchmarks.append(Benchmark(name, setup, number))
+        return setup
+
+    return register
+
+
+class BenchmarkContext:
+    """Loads the level data and renderer once for all the benchmarks."""
+
+    def __init__(self, app_path, replay_path=None):
+        self.app_path = Path(app_path)
+        self.replay_path = replay_path or self.app_path / "replay_first_win.json"
+        self.loader = LevelLoader(self.app_path)
+        self.template = self.loader.get_template(0)
+        self.templates = {}
+        self._renderer = None
+        self._binary_replay_path = None
+
+    def get_template(self, n_goodies, n_sharks):
+        """Returns level 0 with n_goodies goodies and n_sharks sharks, extras placed near the first."""
+        key = (n_goodies, n_sharks)
+        if key not in self.templates:
+            template = self.template
+            goodies = [spec for spec in template.game_objects if spec[0] == "Goodie"]
+            sharks = [spec for spec in template.game_objects if spec[0] == "Shark"]
+            others = [spec for spec in template.game_objects if spec[0] not in ("Goodie", "Shark")]
+            taken = {(kwargs["x"], kwargs["y"]) for _, kwargs in template.game_objects}
+            goodies = self.extend(goodies, n_goodies, LAND, taken)
+            sharks = self.extend(sharks, n_sharks, WATER, taken)
+            self.templates[key] = LevelTemplate(
+                template.name,
+                template.shape,
+                template.time_limit,
+                template.terrain,
+                others + goodies + sharks,
+            )
+        return self.templates[key]
+
+    def extend(self, specs, n, code, taken):
+        specs = specs[:n]
+        x0, y0 = specs[0][1]["x"], specs[0][1]["y"]
+        cells = sorted(
+            (cell for cell in self.template.terrain.cells_of(code) if tuple(cell) not in taken),
+            key=lambda cell: ((cell[0] - x0) ** 2 + (cell[1] - y0) ** 2, tuple(cell)),
+        )
+        for i in range(n - len(specs)):
+            object_name, kwargs = specs[i % len(specs)]
+            x, y = (int(v) for v in cells[i])
+            taken.add((x, y))
+            specs.append((object_name, dict(kwargs, x=x, y=y)))
+        return specs
+
+    @property
+    def binary_replay_path(self):
+        """The replay converted to a binary replay in a temporary folder."""
+        if self._binary_replay_path is None:
+            self.temp_dir = tempfile.TemporaryDirectory()
+            self._binary_replay_path = convert_log(
+                self.replay_path, Path(self.temp_dir.name) / "replay.replay"
+            )
+        return self._binary_replay_path
+
+    @property
+    def renderer(self):
+        if self._renderer is None:
+            import pyglet
+
+            pyglet.options["headless"] = True
+            from .render import Renderer
+
+            self._renderer = Renderer(self.app_path, 128, 768, 6)
+        return self._renderer
+
+
+def start_moving(level):
+    """Sends every goodie to the goal and every shark across the water."""
+    goal = sorted(level.goal)
+    rows, cols = level.shape
+    for goodie in level.goodies:
+        level.update(goodie, Cell(*goal[0]))
+    for shark in level.baddies:
+        level.update(shark, Cell(cols - 1 - shark.cell.x, rows - 1 - shark.cell.y))
+
+
+def register_level_steps():
+    for n_goodies, n_sharks in character_counts:
+
+        def setup(context, n_goodies=n_goodies, n_sharks=n_sharks):
+            level = context.get_template(n_goodies, n_sharks).build()
+            start_moving(level)
+            return lambda: level.step(0.01)
+
+        benchmark(f"level_step[goodies={n_goodies},sharks={n_sharks}]", number=200)(setup)
+
+
+register_level_steps()
+
+
+@benchmark("get_surrounding_cells", number=1000)
+def setup_surrounding_cells(context):
+    bounds = context.template.shape
+    return lambda: get_surrounding_cells(Cell(10, 10), bounds=bounds, thickness=2)
+
+
+@benchmark("level_loader_load", number=5)
+def setup_loader(context):
+    return lambda: LevelLoader(context.app_path)
+
+
+@benchmark("level_loader_build_template", number=5)
+def setup_build_template(context):
+    return lambda: LevelLoader(context.app_path).get_template(0)
+
+
+@benchmark("level_template_build", number=100)
+def setup_template_build(context):
+    return context.template.build
+
+
+@benchmark("shark_env_format_state", number=1000)
+def setup_format_state(context):
+    level = context.template.build()
+    env = SharkEnvPlay()
+    env.reset(level)
+    return env.format_state
+
+
+@benchmark("shark_baseline_step", number=200)
+def setup_shark_baseline(context):
+    level = context.get_template(4, 4).build()
+    env = SharkEnvPlay()
+    ai = SharkBaseline(random.Random(0))
+    state = env.reset(level)
+    ai.reset(state, level.water_distances)
+    return lambda: ai.step(state)
+
+
+@benchmark("replay_parse", number=5)
+def setup_replay_parse(context):
+    return lambda: load_log(context.replay_path)
+
+
+@benchmark("replay_parse_binary", number=5)
+def setup_replay_parse_binary(context):
+    path = context.binary_replay_path
+    return lambda: list(ReplayReader(path))
+
+
+def register_prepare_frames():
+    for n_goodies, n_sharks in [(4, 1), (48, 208)]:
+
+        def setup(context, n_goodies=n_goodies, n_sharks=n_sharks):
+            renderer = context.renderer
+            level = context.get_template(n_goodies, n_sharks).build()
+            renderer.start_level(level)
+            start_moving(level)
+            level.step(0.01)
+            characters = level.goodies + level.baddies
+            return lambda: renderer.prepare_frame(characters, 100)
+
+        name = f"renderer_prepare_frame[characters={n_goodies + n_sharks}]"
+        benchmark(name, number=200)(setup)
+
+
+register_prepare_frames()
+
+
+def get_stats(times):
+    """Summary of per call times in seconds, over the repeats."""
+    times = np.array(times)
+    return {
+        "mean": float(times.mean()),
+        "min": float(times.min()),
+        "median": float(np.percentile(times, 50)),
+        "p90": float(np.percentile(times, 90)),
+        "p99": float(np.percentile(times, 99)),
+    }
+
+
+def time_benchmark(bench, context, repeats=20, warmup=3):
+    """Times bench and returns its stats; warm-up repeats are run but not recorded."""
+    times = []
+    for i in range(warmup + repeats):
+        call = bench.setup(context)
+        start = time.perf_counter()
+        for j in range(bench.number):
+            call()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed / bench.number)
+    stats = get_stats(times)
+    stats.update(number=bench.number, repeats=repeats)
+    return stats
+
+
+def run_benchmarks(context, names=None, repeats=20, warmup=3, report=None):
+    """Runs the benchmarks, or those whose name starts with one of names, returning their stats.
+
+    A benchmark that can't run here, like the renderer without pyglet, is
+    recorded with its error instead.
+    """
+    results = {}
+    for bench in benchmarks:
+        if names and not any(bench.name.startswith(name) for name in names):
+            continue
+        try:
+            results[bench.name] = time_benchmark(bench, context, repeats, warmup)
+        except ImportError as error:
+            results[bench.name] = {"error": str(error)}
+        if report:
+            report(bench.name, results[bench.name])
+    return results
+
+
+def get_metadata():
+    return {
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, tolerance=0.2, stat="median"):
+    """Returns (name, baseline time, time, ratio) for every benchmark slower than the baseline by more than tolerance."""
+    regressions = []
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None or stat not in stats or stat not in old:
+            continue
+        ratio = stats[stat] / old[stat]
+        if ratio > 1 + tolerance:
+            regressions.append((name, old[stat], stats[stat], ratio))
+    return regressions
+
+
+def format_stats(name, stats):
+    if "error" in stats:
+        return f"{name:<40} skipped: {stats['error']}"
+    us = {key: stats[key] * 1e6 for key in ("median", "p90", "p99")}
+    return (
+        f"{name:<40} median {us['median']:10.2f}us  p90 {us['p90']:10.2f}us  p99 {us['p99']:10.2f}us"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Times the game's hot paths.")
+    parser.add_argument("names", nargs="*", help="only run benchmarks starting with these")
+    parser.add_argument("--repeats", type=int, default=20, help="timed repeats per benchmark")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed repeats first")
+    parser.add_argument("--output", type=Path, default=None, help="JSON file for the results")
+    parser.add_argument("--compare", type=Path, default=None, help="baseline JSON to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed median slowdown")
+    args = parser.parse_args()
+    context = BenchmarkContext(Path.cwd())
+    results = run_benchmarks(
+        context,
+        args.names,
+        args.repeats,
+        args.warmup,
+        report=lambda name, stats: print(format_stats(name, stats), flush=True),
+    )
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"metadata": get_metadata(), "results": results}, output_file, indent=2)
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for name, old, new, ratio in regressions:
+            print(f"regression: {name} {old * 1e6:.2f}us -> {new * 1e6:.2f}us ({ratio:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
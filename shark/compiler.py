@@ -0,0 +1,136 @@
+import json
+import os
+import struct
+import tempfile
+from pathlib import Path
+import numpy as np
+from .terrain import TerrainMap
+
+MAGIC = b"SHARKLVL"
+VERSION = 1
+PREFIX = struct.Struct("<8sII")
+ALIGNMENT = 16
+COMPILED_FOLDER = "compiled"
+COMPILED_SUFFIX = ".lvl"
+
+
+class LevelFormatError(ValueError):
+    """Raised when a compiled level file can't be read."""
+
+
+def get_compiled_path(source_path):
+    source_path = Path(source_path)
+    return source_path.parent / COMPILED_FOLDER / (source_path.stem + COMPILED_SUFFIX)
+
+
+def get_source_stamp(source_path):
+    stat = Path(source_path).stat()
+    return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+
+
+def compile_level(source_path, compiled_path=None):
+    """Compiles a JSON level spec into the binary format, returning the compiled path.
+
+    The file is a fixed prefix (magic, version, header length), a JSON header
+    holding the name, shape, time limit, object table and source stamp, then
+    the terrain codes as a (rows, cols) uint8 block aligned to 16 bytes.
+    """
+    source_path = Path(source_path)
+    compiled_path = get_compiled_path(source_path) if compiled_path is None else Path(compiled_path)
+    with open(source_path, "r") as level_file:
+        level_spec = json.load(level_file)
+    terrain = TerrainMap.from_spec(level_spec["shape"], level_spec["terrain"])
+    header = {
+        "name": level_spec["name"],
+        "shape": list(terrain.shape),
+        "time_limit": level_spec["time_limit"],
+        "game_objects": level_spec["game_objects"],
+        "source": get_source_stamp(source_path),
+    }
+    header_bytes = json.dumps(header).encode("utf8")
+    header_end = PREFIX.size + len(header_bytes)
+    padding = -header_end % ALIGNMENT
+    compiled_path.parent.mkdir(parents=True, exist_ok=True)
+    compiled_file = tempfile.NamedTemporaryFile(
+        dir=compiled_path.parent, prefix=compiled_path.name, suffix=".tmp", delete=False
+    )
+    try:
+        with compiled_file:
+            compiled_file.write(PREFIX.pack(MAGIC, VERSION, len(header_bytes)))
+            compiled_file.write(header_bytes)
+            compiled_file.write(b"\0" * padding)
+            compiled_file.write(terrain.codes.tobytes())
+        os.replace(compiled_file.name, compiled_path)
+    except BaseException:
+        os.unlink(compiled_file.name)
+        raise
+    return compiled_path
+
+
+def read_header(compiled_path):
+    """Returns the header of a compiled level and the offset of its terrain block."""
+    with open(compiled_path, "rb") as compiled_file:
+        prefix = compiled_file.read(PREFIX.size)
+        if len(prefix) != PREFIX.size:
+            raise LevelFormatError(f"{compiled_path} is too short")
+        magic, version, header_length = PREFIX.unpack(prefix)
+        if magic != MAGIC or version != VERSION:
+            raise LevelFormatError(f"{compiled_path} isn't a version {VERSION} level")
+        header = json.loads(compiled_file.read(header_length).decode("utf8"))
+    header_end = PREFIX.size + header_length
+    return header, header_end + (-header_end % ALIGNMENT)
+
+
+def read_compiled_level(compiled_path):
+    """Returns a level spec whose terrain is a TerrainMap memory-mapped from the file."""
+    header, offset = read_header(compiled_path)
+    shape = tuple(header["shape"])
+    codes = np.memmap(compiled_path, dtype="uint8", mode="r", offset=offset, shape=shape)
+    return {
+        "name": header["name"],
+        "shape": list(shape),
+        "time_limit": header["time_limit"],
+        "terrain": TerrainMap(shape, codes),
+        "game_objects": header["game_objects"],
+    }
+
+
+def is_stale(source_path, compiled_path):
+    """True if the compiled level is missing, unreadable or older than its JSON source."""
+    try:
+        header, offset = read_header(compiled_path)
+    except (OSError, ValueError):
+        return True
+    return header.get("source") != get_source_stamp(source_path)
+
+
+def load_level(source_path):
+    """Loads a JSON level through its compiled form, recompiling it when the JSON changed.
+
+    Falls back to parsing the JSON if the compiled file can't be written or read.
+    """
+    compiled_path = get_compiled_path(source_path)
+    try:
+        if is_stale(source_path, compiled_path):
+            compile_level(source_path, compiled_path)
+        return read_compiled_level(compiled_path)
+    except (OSError, ValueError):
+        with open(source_path, "r") as level_file:
+            return json.load(level_file)
+
+
+def compile_levels(level_folder):
+    """Recompiles every stale JSON level in a folder, returning the compiled paths."""
+    compiled_paths = []
+    for source_path in sorted(Path(level_folder).iterdir()):
+        if source_path.suffix == ".json":
+            compiled_path = get_compiled_path(source_path)
+            if is_stale(source_path, compiled_path):
+                compile_level(source_path, compiled_path)
+            compiled_paths.append(compiled_path)
+    return compiled_paths
+
+
+if __name__ == "__main__":
+    for compiled_path in compile_levels(Path.cwd() / "shark" / "levels"):
+        print(compiled_path)
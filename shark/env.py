@@ -1,5 +1,5 @@
 from .level import LevelLoader
-from .objects import Water, Land, UnPassableTerrain
+from .terrain import WATER, UNPASSABLE
 from .base import Cell
 import gym
 import numpy as np
@@ -16,22 +16,121 @@ Movements = {
 }
 
 
-class SharkEnvPlay:
-    def __init__(self):
+def is_waiting(characters):
+    """True when a side has living characters and none of them is moving."""
+    alive = [character for character in characters if character.is_alive]
+    return bool(alive) and not any(character.is_active for character in alive)
+
+
+def update_goodie_targets(level, targets):
+    """Sends each idle living goodie to its (x, y) target; negative targets are skipped."""
+    for goodie, (x, y) in zip(level.goodies, targets):
+        if x >= 0 and y >= 0 and goodie.is_alive and not goodie.is_active:
+            level.update(goodie, Cell(int(x), int(y)))
+
+
+def get_final_rewards(level, won):
+    """Returns the (human, shark) rewards for a finished level."""
+    n_goodies = len(level.goodies)
+    human_reward = -n_goodies
+    shark_reward = n_goodies
+    shark_speed = level.goodies[0].land_speed
+    time_remaining = level.time_limit - level.time_elapsed
+    total_points = shark_speed * level.time_limit * n_goodies
+    reward_remaining = shark_speed * time_remaining * n_goodies
+    if won:
+        human_reward += total_points
+        shark_reward -= total_points
+    else:
+        human_reward -= reward_remaining
+        shark_reward += reward_remaining
+    return human_reward, shark_reward
+
+
+class MarkedLayer:
+    """A bool layer of an observation buffer whose cells are marked by characters.
+
+    Each character marks at most one cell. A count per marked cell lets a
+    character that moved clear its old cell and set its new one without
+    touching the rest of the layer, even when characters share cells.
+    """
+
+    def __init__(self, layer, n_characters):
+        self.layer = layer
+        self.marks = [None] * n_characters
+        self.counts = {}
+
+    def mark(self, idx, cell):
+        """Moves character idx's mark to cell, a (row, col) index, or removes it for None."""
+        old_cell = self.marks[idx]
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            count = self.counts[old_cell] - 1
+            if count:
+                self.counts[old_cell] = count
+            else:
+                del self.counts[old_cell]
+                self.layer[old_cell] = False
+        if cell is not None:
+            cell = tuple(cell)
+            count = self.counts.get(cell, 0)
+            self.counts[cell] = count + 1
+            if not count:
+                self.layer[cell] = True
+        self.marks[idx] = cell
+
+
+class ObservationBuffer:
+    """Persistent (layout, info) observation arrays, written in place every step.
+
+    format_state returns copies unless views is set, in which case it returns
+    read-only views of the buffers that the next step overwrites. buffers can
+    give a (layout, info) pair of existing arrays, such as slices of shared
+    memory, to write into instead of allocating.
+    """
+
+    def __init__(self, views=False, buffers=None):
+        self.views = views
+        self.buffers = buffers
+
+    def build_buffers(self, info_size):
+        rows, cols = self.current_level.shape
+        layout_shape = (self.n_layers, rows, cols)
+        if self.buffers is None:
+            self.layout = np.zeros(layout_shape, dtype="bool")
+            self.info = np.zeros(info_size, dtype="float32")
+        else:
+            self.layout, self.info = self.buffers
+            if self.layout.shape != layout_shape or self.info.shape != (info_size,):
+                raise ValueError(f"buffers don't fit a {layout_shape} observation")
+            self.layout[...] = False
+            self.info[...] = 0
+        self.layout_view = self.layout.view()
+        self.layout_view.flags.writeable = False
+        self.info_view = self.info.view()
+        self.info_view.flags.writeable = False
+
+    def get_observation(self):
+        if self.views:
+            return [self.layout_view, self.info_view]
+        return [self.layout.copy(), self.info.copy()]
+
+
+class SharkEnvPlay(ObservationBuffer):
+    def __init__(self, views=False, buffers=None):
+        super().__init__(views, buffers)
         self.n_layers = 3
 
     def reset(self, level):
         self.current_level = level
         self.n_sharks = len(self.current_level.baddies)
-        self.water = np.zeros(self.current_level.shape, dtype="bool")
-        water_cells = [
-            terrain
-            for terrain in self.current_level.terrain
-            if isinstance(terrain, Water)
-        ]
-        for water_cell in water_cells:
-            col, row = water_cell.cell
-            self.water[row, col] = True
+        self.water = self.current_level.terrain.mask(WATER)
+        self.water_distances = self.current_level.water_distances
+        self.build_buffers((3 * self.n_sharks) + 1)
+        self.layout[0] = self.water
+        self.goodie_layer = MarkedLayer(self.layout[1], len(self.current_level.goodies))
+        self.shark_layer = MarkedLayer(self.layout[2], self.n_sharks)
         return self.format_state()
 
     def get_obs(self):
@@ -41,27 +140,21 @@ class SharkEnvPlay:
 
     def format_state(self):
         rows, cols = self.current_level.shape
-        layout = np.zeros((self.n_layers, rows, cols), dtype="bool")
-        shark_info = np.zeros(((3 * self.n_sharks) + 1), dtype="float32")
-        layout[0] = self.water
-        for goodie in self.current_level.goodies:
-            if self.is_water(goodie.cell) and goodie.is_alive:
-                row, col = goodie.cell
-                layout[1, row, col] = True
-        idx = 0
-        for baddie in self.current_level.baddies:
-            row, col = baddie.cell
-            layout[2, row, col] = True
-            shark_info[idx] = baddie.current_health / baddie.max_health
-            shark_info[idx + 1] = baddie.cell.x / cols
-            shark_info[idx + 2] = baddie.cell.y / rows
-            idx += 3
-        shark_info[-1] = self.current_level.time_elapsed / self.current_level.time_limit
-        return [layout, shark_info]
+        is_water = self.current_level.terrain.is_water
+        for idx, goodie in enumerate(self.current_level.goodies):
+            cell = goodie.cell
+            self.goodie_layer.mark(idx, cell if is_water(cell) and goodie.is_alive else None)
+        shark_info = []
+        for idx, baddie in enumerate(self.current_level.baddies):
+            cell = baddie.cell
+            self.shark_layer.mark(idx, cell)
+            shark_info += (baddie.current_health / baddie.max_health, cell.x / cols, cell.y / rows)
+        shark_info.append(self.current_level.time_elapsed / self.current_level.time_limit)
+        self.info[:] = shark_info
+        return self.get_observation()
 
     def is_water(self, cell):
-        terrain = self.current_level.terrain_cells[cell]
-        return isinstance(terrain, Water)
+        return self.current_level.terrain.is_water(cell)
 
     def step(self, action):
         """Updates character goals but doesn't step the current level forward."""
@@ -76,8 +169,8 @@ class SharkEnvPlay:
 
 
 class SharkEnvTrain(SharkEnvPlay):
-    def __init__(self, app_path, level_idx=0, dt=0.01):
-        super().__init__()
+    def __init__(self, app_path, level_idx=0, dt=0.01, views=False, buffers=None):
+        super().__init__(views, buffers)
         self.levels = LevelLoader(app_path)
         self.level_idx = level_idx
         self.dt = dt
@@ -89,62 +182,51 @@ class SharkEnvTrain(SharkEnvPlay):
     def step(self, action):
         """Updates character goals and steps the current level forward until a shark is has reached next goal."""
         super().step(action)
-        game_over = False
         reward = 1
         info = {}
-        while self.sharks_active() or not game_over:
-            game_over, won, goodies, baddies = level.step(self.dt)
+        game_over, won, goodies, baddies = self.current_level.advance_until(
+            self.dt, self.current_level.baddies
+        )
         if game_over and not won:  # won implies goodies won
             reward += int(
                 self.current_level.time_limit - self.current_level.time_elapsed
             )
-        return self.format_state, reward, game_over, info
+        return self.format_state(), reward, game_over, info
 
 
-class HumanEnvPlay:
-    def _init__(self):
+class HumanEnvPlay(ObservationBuffer):
+    def __init__(self, views=False, buffers=None):
+        super().__init__(views, buffers)
         self.n_players = 4
         self.n_layers = 4
 
     def reset(self, level):
         self.current_level = level
-        self.water = self.get_map_of_type(Water)
-        self.unpassable = self.get_map_of_type(UnPassableTerrain)
+        self.water = self.get_map_of_type(WATER)
+        self.water_distances = self.current_level.water_distances
+        self.unpassable = self.get_map_of_type(UNPASSABLE)
+        self.build_buffers((3 * self.n_players) + 1)
+        self.layout[0] = self.water
+        self.layout[1] = self.unpassable
+        self.goodie_layer = MarkedLayer(self.layout[2], len(self.current_level.goodies))
+        self.baddie_layer = MarkedLayer(self.layout[3], len(self.current_level.baddies))
         return self.format_state()
 
-    def get_map_of_type(self, cell_type):
-        a = np.zeros(self.current_level.shape, dtype="bool")
-        cells = [
-            terrain.cell
-            for terrain in self.current_level.terrain
-            if isinstance(terrain, cell_type)
-        ]
-        for cell in cells:
-            col, row = cell
-            a[row, col] = True
-        return a
+    def get_map_of_type(self, terrain_code):
+        return self.current_level.terrain.mask(terrain_code)
 
     def format_state(self):
         rows, cols = self.current_level.shape
-        layout = np.zeros((self.n_layers, rows, cols), dtype="bool")
-        goodie_info = np.zeros(((3 * self.n_players) + 1), dtype="float32")
-        layout[0] = self.water
-        layout[1] = self.unpassable
-        idx = 0
-        for goodie in self.current_level.goodies:
-            row, col = goodie.cell
-            layout[2, row, col] = True
-            goodie_info[idx] = goodie.current_health / goodie.max_health
-            goodie_info[idx + 1] = goodie.cell.x / cols
-            goodie_info[idx + 2] = goodie.cell.y / rows
-            idx += 3
-        goodie_info[-1] = (
-            self.current_level.time_elapsed / self.current_level.time_limit
-        )
-        for baddie in self.current_level.baddies:
-            row, col = baddie.cell
-            layout[3, row, col] = True
-        return [layout, goodie_info]
+        goodie_info = []
+        for idx, goodie in enumerate(self.current_level.goodies):
+            cell = goodie.cell
+            self.goodie_layer.mark(idx, cell)
+            goodie_info += (goodie.current_health / goodie.max_health, cell.x / cols, cell.y / rows)
+        self.info[: len(goodie_info)] = goodie_info
+        self.info[-1] = self.current_level.time_elapsed / self.current_level.time_limit
+        for idx, baddie in enumerate(self.current_level.baddies):
+            self.baddie_layer.mark(idx, baddie.cell)
+        return self.get_observation()
 
 
 class TrainingEnv:
@@ -155,9 +237,13 @@ class TrainingEnv:
         self.levels = LevelLoader(app_path)
         self.level_idx = level_idx
         self.dt = dt
+        self.human_env = HumanEnvPlay()
+        self.shark_env = SharkEnvPlay()
 
     def run(self):
         self.current_level = self.levels[self.level_idx]
+        self.human_env.reset(self.current_level)
+        self.shark_env.reset(self.current_level)
         self.n_goodies = len(self.current_level.goodies)
         game_over = False
         human_reward = None
@@ -181,36 +267,22 @@ class TrainingEnv:
         self.human_ai.step(self.format_state_for_humans(), human_reward, game_over)
 
     def ready_for_action(self, characters):
-        return any((not character.is_active for character in characters))
+        return is_waiting(characters)
 
     def format_state_for_humans(self):
-        pass
+        return self.human_env.format_state()
 
     def format_state_for_sharks(self):
-        pass
+        return self.shark_env.format_state()
 
     def update_level_for_humans(self, action):
-        # translate actions
-        # self.current_level.update(character, cell)
-        pass
+        """Sends idle goodies to the (x, y) cells in action, one per goodie."""
+        update_goodie_targets(self.current_level, action)
 
     def update_level_for_sharks(self, action):
-        # translate actions
-        # self.current_level.update(character, cell)
-        pass
+        """Moves each shark one cell in its Movements direction."""
+        self.shark_env.step(action)
 
     def get_final_rewards(self, won):
-        human_reward = -self.n_goodies
-        shark_reward = self.n_goodies
-        shark_speed = self.current_level.goodies[0].land_speed
-        time_remaining = self.current_level.time_limit - self.current_level.time_elapsed
-        total_points = shark_speed * self.current_level.time_limit * self.n_goodies
-        reward_remaining = shark_speed * time_remaining * self.n_goodies
-        if won:
-            human_reward += total_points
-            shark_reward -= total_points
-        else:
-            human_reward -= reward_remaining
-            shark_reward += reward_remaining
-        return human_reward, shark_reward
+        return get_final_rewards(self.current_level, won)
 
@@ -0,0 +1,176 @@
+import heapq
+from collections import deque
+import numpy as np
+from .base import Cell
+
+UNREACHABLE = 1 << 30
+
+# Straight moves first so ties prefer them over diagonals.
+moves = [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]
+
+
+class FlowField:
+    """Walking distance from every cell to the nearest of a set of target cells.
+
+    Distances come from a breadth first search over the 8-connected passable
+    terrain, with cells marked occupied treated as blocked. Blocking or opening
+    a cell repairs only the distances that depend on it. A character follows
+    the field by stepping to the neighbour with the smallest distance, which
+    costs one lookup per neighbour.
+    """
+
+    def __init__(self, terrain, targets):
+        self.terrain = terrain
+        self.rows, self.cols = terrain.shape
+        self.targets = frozenset(cell for cell in targets if terrain.is_on_map(cell))
+        self.neighbours = [
+            tuple(
+                (y + dy) * self.cols + x + dx
+                for dx, dy in moves
+                if 0 <= x + dx < self.cols and 0 <= y + dy < self.rows
+            )
+            for y in range(self.rows)
+            for x in range(self.cols)
+        ]
+        self.is_target = [False] * (self.rows * self.cols)
+        for x, y in self.targets:
+            self.is_target[y * self.cols + x] = True
+        self.occupied = set()
+        self.closed = [
+            not terrain.is_passable(Cell(x, y))
+            for y in range(self.rows)
+            for x in range(self.cols)
+        ]
+        self.build()
+
+    def __repr__(self):
+        return f"FlowField(shape: {(self.rows, self.cols)}, targets: {len(self.targets)})"
+
+    def copy(self):
+        """Returns a field with the same distances, sharing the neighbour table."""
+        field = FlowField.__new__(FlowField)
+        field.__dict__.update(self.__dict__)
+        field.occupied = set(self.occupied)
+        field.closed = list(self.closed)
+        field.distances = list(self.distances)
+        return field
+
+    def build(self):
+        """Recomputes every distance from scratch."""
+        self.distances = [UNREACHABLE] * (self.rows * self.cols)
+        queue = deque()
+        for x, y in self.targets:
+            idx = y * self.cols + x
+            if not self.closed[idx]:
+                self.distances[idx] = 0
+                queue.append(idx)
+        self.spread(queue)
+
+    def spread(self, queue):
+        distances, closed, neighbours = self.distances, self.closed, self.neighbours
+        while queue:
+            idx = queue.popleft()
+            distance = distances[idx] + 1
+            for neighbour in neighbours[idx]:
+                if distance < distances[neighbour] and not closed[neighbour]:
+                    distances[neighbour] = distance
+                    queue.append(neighbour)
+
+    def __getitem__(self, cell):
+        x, y = cell
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.distances[y * self.cols + x]
+        return UNREACHABLE
+
+    def as_array(self):
+        """(rows, cols) int array of the distances, UNREACHABLE where there's no path."""
+        return np.array(self.distances, dtype="int64").reshape(self.rows, self.cols)
+
+    def get_moves(self, cell):
+        """Returns the displacements from cell to its neighbours nearest the targets.
+
+        Empty if cell is a target or no neighbour can reach one.
+        """
+        x, y = cell
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return []
+        idx = y * self.cols + x
+        if self.is_target[idx]:
+            return []
+        distances = self.distances
+        best = UNREACHABLE
+        best_moves = []
+        for dx, dy in moves:
+            if 0 <= x + dx < self.cols and 0 <= y + dy < self.rows:
+                distance = distances[idx + dy * self.cols + dx]
+                if distance < best:
+                    best = distance
+                    best_moves = [(dx, dy)]
+                elif distance == best and distance < UNREACHABLE:
+                    best_moves.append((dx, dy))
+        return best_moves
+
+    def set_occupied(self, cells):
+        """Blocks exactly the given cells for occupancy, repairing the changed ones."""
+        cells = set(cells)
+        changed = cells.symmetric_difference(self.occupied)
+        self.occupied = cells
+        for cell in changed:
+            self.update_cell(cell)
+
+    def update_cell(self, cell):
+        """Re-reads whether cell is open from the terrain and occupancy and repairs the field."""
+        x, y = cell
+        if not (0 <= x < self.cols and 0 <= y < self.rows):
+            return
+        idx = y * self.cols + x
+        is_closed = cell in self.occupied or not self.terrain.is_passable(cell)
+        if is_closed != self.closed[idx]:
+            self.closed[idx] = is_closed
+            if is_closed:
+                self.close(idx)
+            else:
+                self.open(idx)
+
+    def open(self, idx):
+        distances = self.distances
+        if self.is_target[idx]:
+            distances[idx] = 0
+        else:
+            distance = min((distances[n] for n in self.neighbours[idx]), default=UNREACHABLE)
+            distances[idx] = min(distance + 1, UNREACHABLE)
+        if distances[idx] < UNREACHABLE:
+            self.spread(deque([idx]))
+
+    def close(self, idx):
+        """Drops every distance that could have depended on idx and recomputes them."""
+        distances, closed, neighbours = self.distances, self.closed, self.neighbours
+        if distances[idx] == UNREACHABLE:
+            return
+        invalid = {idx}
+        stack = [idx]
+        while stack:
+            current = stack.pop()
+            next_distance = distances[current] + 1
+            for neighbour in neighbours[current]:
+                if distances[neighbour] == next_distance and neighbour not in invalid:
+                    invalid.add(neighbour)
+                    stack.append(neighbour)
+        for current in invalid:
+            distances[current] = UNREACHABLE
+        heap = []
+        for current in invalid:
+            if not closed[current]:
+                distance = min(distances[n] for n in neighbours[current]) + 1
+                if distance < UNREACHABLE:
+                    distances[current] = distance
+                    heap.append((distance, current))
+        heapq.heapify(heap)
+        while heap:
+            distance, current = heapq.heappop(heap)
+            if distance > distances[current]:
+                continue
+            for neighbour in neighbours[current]:
+                if distance + 1 < distances[neighbour] and not closed[neighbour]:
+                    distances[neighbour] = distance + 1
+                    heapq.heappush(heap, (distance + 1, neighbour))
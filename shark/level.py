@@ -1,21 +1,30 @@
+import hashlib
 import math
 import time
 import inspect
 import json
-from collections import namedtuple, defaultdict, OrderedDict
+import numpy as np
+from collections import namedtuple, OrderedDict
 from .objects import (
     Hero,
     Goal,
     Goodie,
     Baddie,
-    Terrain,
-    Water,
     Character,
+    Shark,
     all_objects,
-    GameObject,
     Surrounds,
+    add_repeatedly,
 )
-from .base import get_surrounding_cells, get_cells_in_block, Cell
+from .base import Cell
+from .terrain import TerrainMap, NO_TERRAIN
+from .compiler import load_level
+from .occupancy import Occupancy, empty_cell
+from .visibility import Visibility
+from .neighbourhood import Neighbourhood, NeighbourhoodTable, TerrainNeighbourhood
+from .flowfield import FlowField
+from .waterdistance import WaterDistances
+from .profiling import StepStats
 
 
 class LevelLoader:
@@ -25,16 +34,20 @@ class LevelLoader:
     def __init__(self, app_path):
         level_paths = self.get_level_files(app_path)
         self.level_specs = self.load_levels(level_paths)
+        self.templates = {}
 
     def __len__(self):
         return len(self.level_specs)
 
     def __getitem__(self, idx):
-        if isinstance(idx, int):
-            level_spec = self.level_specs[self.get_key(idx)]
-        elif isinstance(idx, str):
-            level_spec = self.level_specs[idx]
-        return self.build_level(level_spec)
+        return self.get_template(idx).build()
+
+    def get_template(self, idx):
+        """Returns the compiled template of a level, by index or name, building it once."""
+        key = self.get_key(idx) if isinstance(idx, int) else idx
+        if key not in self.templates:
+            self.templates[key] = self.build_template(self.level_specs[key])
+        return self.templates[key]
 
     def get_key(self, idx):
         return list(self.level_specs.keys())[idx]
@@ -52,47 +65,171 @@ class LevelLoader:
         return level_paths
 
     def load_levels(self, level_paths):
+        """Loads each level through its compiled binary, recompiling stale ones."""
         level_specs = OrderedDict()
         for level_path in level_paths:
-            with open(level_path, "r") as level_file:
-                level = json.load(level_file)
-                level_specs[level["name"]] = level
+            level = load_level(level_path)
+            level_specs[level["name"]] = level
         return level_specs
 
     def build_level(self, level_spec):
         args = [level_spec[key] for key in self.fields]
         return Level(*args)
 
+    def build_template(self, level_spec):
+        args = [level_spec[key] for key in self.fields]
+        return LevelTemplate(*args)
+
+
+class LevelTemplate:
+    """A level spec compiled once, handing out fresh Levels.
+
+    The terrain and neighbourhood tables are built once, frozen and shared by
+    every Level the template builds, which only spawn their own characters.
+    """
 
-class Level:
     def __init__(self, name, shape, time_limit, terrain, game_objects):
         self.name = name
         self.shape = shape
         self.time_limit = time_limit
+        if not isinstance(terrain, TerrainMap):
+            terrain = TerrainMap.from_spec(shape, terrain)
+        self.terrain = terrain.freeze()
+        self.game_objects = [
+            (object_name, kwargs)
+            for object_name, kwargs in game_objects
+            if object_name in all_objects
+        ]
+        self.neighbourhood_tables = {}
+        self.flow_fields = {}
+        self.water_distances = WaterDistances(self.terrain)
+
+    def __repr__(self):
+        return f"LevelTemplate(name: {self.name}, shape: {self.shape})"
+
+    def __call__(self, pathfinding=False):
+        return self.build(pathfinding)
+
+    def build(self, pathfinding=False):
+        return Level(
+            self.name,
+            self.shape,
+            self.time_limit,
+            self.terrain,
+            self.game_objects,
+            neighbourhood_tables=self.neighbourhood_tables,
+            flow_fields=self.flow_fields,
+            water_distances=self.water_distances,
+            pathfinding=pathfinding,
+        )
+
+
+class Level:
+    def __init__(
+        self,
+        name,
+        shape,
+        time_limit,
+        terrain,
+        game_objects,
+        neighbourhood_tables=None,
+        flow_fields=None,
+        water_distances=None,
+        pathfinding=False,
+    ):
+        self.name = name
+        self.shape = shape
+        self.time_limit = time_limit
+        self.terrain = self.build_terrain(terrain)
+        self.terrain_cells = self.terrain
+        self.game_objects = game_objects
+        if neighbourhood_tables is None:
+            neighbourhood_tables = {}
+        self.neighbourhood_tables = neighbourhood_tables
+        if flow_fields is None:
+            flow_fields = {}
+        self.flow_fields = flow_fields
+        if water_distances is None:
+            water_distances = WaterDistances(self.terrain)
+        self.water_distances = water_distances
+        self.pathfinding = pathfinding
+        self.stats = None
+        self.reset()
+
+    def reset(self):
+        """Respawns every character from the spec and restarts the clock and log."""
         self.time_elapsed = 0.0
         self.n_updates = 0
-        self.terrain = self.build_terrain(terrain)
-        self.terrain_cells = self.get_cell_dict(self.terrain)
         self.goal = set()
         self.goodies = []
         self.baddies = []
-        self.build_game_objects(game_objects)
-        self.goodie_cells = self.get_cell_dict(self.goodies)
-        self.baddie_cells = self.get_cell_dict(self.baddies)
+        self.build_game_objects(self.game_objects)
+        self.goodie_cells = Occupancy(self.goodies, self.goal)
+        self.baddie_cells = Occupancy(self.baddies)
         self.characters = self.goodies + self.baddies
-        self.log = {"name": name, "events": [], "total_time": 0.0, "n_updates": 0}
+        for idx, character in enumerate(self.characters):
+            character.index = idx
+        self.flow_field = self.build_flow_field() if self.pathfinding else None
+        self.surrounds = self.build_surrounds()
+        self.level_surrounds = Surrounds(self.terrain, self.goodie_cells, self.baddie_cells)
+        self.visibility = Visibility(self.goodies, self.baddies, self.shape)
+        self.result = Result(False, False, self.goodies, self.baddies)
+        self.log = {
+            "name": self.name,
+            "events": [],
+            "total_time": 0.0,
+            "n_updates": 0,
+            "pathfinding": self.pathfinding,
+        }
 
     def __repr__(self):
         return f"Level(name: {self.name}, shape: {self.shape}, time: {self.time_elapsed:.1f} / {self.time_limit})"
 
     def build_terrain(self, terrain):
-        terrain_objects = self.spawn_objects(terrain)
-        all_cells = get_cells_in_block(0, self.shape[1], 0, self.shape[0])
-        taken_cells = set(terrain_object.cell for terrain_object in terrain_objects)
-        free_cells = all_cells.difference(taken_cells)
-        for free_cell in free_cells:
-            terrain_objects.append(Water(name="Water", x=free_cell.x, y=free_cell.y))
-        return terrain_objects
+        if isinstance(terrain, TerrainMap):
+            return terrain
+        return TerrainMap.from_spec(self.shape, terrain)
+
+    def build_surrounds(self):
+        return Surrounds(
+            TerrainNeighbourhood(self.terrain, NO_TERRAIN, self.flow_field),
+            Neighbourhood(self.goodie_cells, empty_cell),
+            Neighbourhood(self.baddie_cells, empty_cell),
+        )
+
+    def build_flow_field(self):
+        """Returns a goal flow field blocked by the living goodies.
+
+        The terrain-only field is searched once per goal and shared through
+        flow_fields, so each level only copies it and applies occupancy.
+        """
+        key = frozenset(self.goal)
+        if key not in self.flow_fields:
+            self.flow_fields[key] = FlowField(self.terrain, self.goal)
+        flow_field = self.flow_fields[key].copy()
+        flow_field.set_occupied(self.get_goodie_blocks())
+        return flow_field
+
+    def get_goodie_blocks(self):
+        return [
+            cell
+            for goodie in self.goodies
+            if goodie.is_alive
+            for cell in goodie.cells
+        ]
+
+    def centre_surrounds(self, character):
+        bounds = self.get_neighbourhood_table(character.shape)[character.cell]
+        for view in self.surrounds:
+            view.centre(bounds)
+        return self.surrounds
+
+    centre_character = centre_surrounds
+
+    def get_neighbourhood_table(self, shape):
+        if shape not in self.neighbourhood_tables:
+            self.neighbourhood_tables[shape] = NeighbourhoodTable(self.shape, shape)
+        return self.neighbourhood_tables[shape]
 
     def build_game_objects(self, game_objects):
         spawned_objects = self.spawn_objects(game_objects)
@@ -107,13 +244,6 @@ class Level:
                 spawned_objects.append(object_class(**kwargs))
         return spawned_objects
 
-    def get_cell_dict(self, game_objects):
-        cell_dict = defaultdict(GameObject)
-        for game_object in game_objects:
-            for cell in game_object.cells:
-                cell_dict[cell] = game_object
-        return cell_dict
-
     def classify_object(self, game_object):
         if isinstance(game_object, Goal):
             self.goal.add(game_object.cell)
@@ -128,7 +258,7 @@ class Level:
 
     @property
     def someones_dead(self):
-        return any(not goodie.is_alive for goodie in self.goodies)
+        return self.goodie_cells.any_dead
 
     @property
     def is_completed(self):
@@ -136,60 +266,278 @@ class Level:
 
     @property
     def goodies_in_goal(self):
-        return all((goodie.cell in self.goal) for goodie in self.goodies)
+        return self.goodie_cells.all_in_goal
 
     def update(self, character, cell):
-        idx = self.characters.index(character)
+        idx = character.index
+        if idx is None or self.characters[idx] is not character:
+            idx = self.characters.index(character)
         self.log["events"].append(Event(idx, self.time_elapsed, cell.x, cell.y))
         character.move_to(cell)
 
     def step(self, dt):
+        run_phase = self.run_phase
         self.n_updates += 1
         self.time_elapsed += dt
-        game_over = False
-        won = False
+        game_over, won = run_phase("checks", self.check_game_over)
+        if not game_over:
+            run_phase("character_step", self.step_characters, dt)
+            run_phase("visibility", self.check_visibilies)
+            run_phase("occupancy", self.update_occupancy)
+            if self.flow_field is not None:
+                run_phase("flow_field", self.update_flow_field)
+        return self.finish_step(game_over, won)
+
+    @staticmethod
+    def run_phase(phase, func, *args):
+        """Runs one phase of step; enable_profiling swaps in a timed version."""
+        return func(*args)
+
+    def check_game_over(self):
+        """Returns (game_over, won) for the tick."""
         if self.goodies_in_goal:
-            game_over = True
-            won = True
-        elif self.times_up:  # or self.someones_dead:
-            game_over = True
-        else:
-            self.step_characters(dt)
-            self.check_visibilies()
-            self.goodie_cells = self.get_cell_dict(self.goodies)
-            self.baddie_cells = self.get_cell_dict(self.baddies)
+            return True, True
+        return self.times_up, False  # or self.someones_dead
+
+    def update_occupancy(self):
+        self.goodie_cells.update()
+        self.baddie_cells.update()
+
+    def update_flow_field(self):
+        self.flow_field.set_occupied(self.get_goodie_blocks())
+
+    def finish_step(self, game_over, won):
         if game_over:
             self.log["n_updates"] = self.n_updates
             self.log["total_time"] = self.time_elapsed
-        return Result(game_over, won, self.goodies, self.baddies)
+            self.log["won"] = won
+        self.result = Result(game_over, won, self.goodies, self.baddies)
+        return self.result
+
+    def advance_until(self, dt, characters=None, max_ticks=None, until=None):
+        """Steps by dt at least once, then until none of characters is active or the game is over.
+
+        until can replace the characters test with any callable that only
+        changes when a character arrives, stops or dies, and returns True to stop.
+        Runs of ticks where every moving character only slides towards its next
+        cell, with no cell change, arrival, death or timeout, are counted ahead
+        and applied as plain movement, so only ticks where something happens go
+        through step. The end state matches calling step(dt) in a loop.
+        """
+        if until is None:
+            characters = self.characters if characters is None else characters
+
+            def until():
+                return not any(character.is_active for character in characters)
+
+        n_ticks = 0
+        is_done = until()
+        while max_ticks is None or n_ticks < max_ticks:
+            if not is_done:
+                n_quiet = self.count_quiet_ticks(dt)
+                if max_ticks is not None:
+                    n_quiet = min(n_quiet, max_ticks - n_ticks - 1)
+                if n_quiet > 0:
+                    self.run_phase("skipped_ticks", self.skip_ticks, dt, n_quiet)
+                    n_ticks += n_quiet
+            self.step(dt)
+            n_ticks += 1
+            is_done = until()
+            if self.result.game_over or is_done:
+                break
+        return self.result
+
+    def count_quiet_ticks(self, dt):
+        """Returns how many of the coming ticks can be skipped with skip_ticks."""
+        if self.goodies_in_goal:
+            return 0
+        n_ticks = math.floor((self.time_limit - self.time_elapsed) / dt) - 2
+        damage = {}
+        for character in self.characters:
+            if character.is_active and character.is_alive:
+                surrounds = self.centre_surrounds(character)
+                n_ticks = min(n_ticks, character.count_glides(dt, surrounds))
+                if n_ticks <= 0:
+                    return 0
+                if isinstance(character, Shark):
+                    goodie = surrounds.goodies[character.cell]
+                    if goodie and goodie.is_alive:
+                        damage[goodie] = damage.get(goodie, 0.0) + character.damage * dt
+        for goodie, goodie_damage in damage.items():
+            n_ticks = min(n_ticks, math.floor(goodie.current_health / goodie_damage) - 2)
+        return max(0, n_ticks)
+
+    def skip_ticks(self, dt, n_ticks):
+        """Applies ticks in which count_quiet_ticks found nothing but movement.
+
+        Every mover glides all n_ticks at once and each bitten goodie takes
+        its sharks' bites in one go, as vectorised sums that round after
+        every tick like n_ticks steps would, so the end state is bit for bit
+        the same at a cost of one numpy pass per character.
+        """
+        bites = {}
+        for character in self.characters:
+            if character.is_active and character.is_alive:
+                character.glide_ticks(dt, self.level_surrounds, n_ticks)
+                if isinstance(character, Shark):
+                    goodie = self.goodie_cells[character.cell]
+                    if goodie and goodie.is_alive:
+                        bites.setdefault(goodie, []).append(-character.damage * dt)
+        for goodie, damage in bites.items():
+            goodie.current_health = add_repeatedly(goodie.current_health, damage, n_ticks)
+        self.n_updates += n_ticks
+        self.time_elapsed = add_repeatedly(self.time_elapsed, dt, n_ticks)
 
     def step_characters(self, dt):
         for character in self.characters:
             if character.is_active:
-                cells = get_surrounding_cells(
-                    character.cell, character.shape, self.shape
-                )
-                terrain = self.get_surrounding_objects(cells, self.terrain_cells)
-                goodies = self.get_surrounding_objects(cells, self.goodie_cells)
-                baddies = self.get_surrounding_objects(cells, self.baddie_cells)
-                character.step(dt, Surrounds(terrain, goodies, baddies))
-
-    def get_surrounding_objects(self, cells, cell_dict):
-        d = defaultdict(GameObject)
-        for cell in cells:
-            d[cell] = cell_dict[cell]
-        return d
+                character.step(dt, self.centre_character(character))
 
     def check_visibilies(self):
-        for goodie in self.goodies:
-            goodie.is_spotted(self.baddies)
-        for baddie in self.baddies:
-            baddie.is_spotted(self.goodies)
+        self.visibility.update()
+
+    def enable_profiling(self, stats=None):
+        """Times every phase of step into stats, a StepStats, and returns it.
+
+        The timed run_phase and centre_character shadow the plain ones on
+        this level only, so a level that was never profiled runs step
+        without timers.
+        """
+        self.stats = StepStats() if stats is None else stats
+        self.run_phase = self.run_timed_phase
+        self.centre_character = self.centre_timed_character
+        return self.stats
+
+    def disable_profiling(self):
+        """Restores the untimed phases and returns the stats gathered."""
+        self.__dict__.pop("run_phase", None)
+        self.__dict__.pop("centre_character", None)
+        stats, self.stats = self.stats, None
+        return stats
+
+    def run_timed_phase(self, phase, func, *args):
+        stats = self.stats
+        if phase == "checks":
+            stats.start_tick()
+        elif phase == "skipped_ticks":
+            stats.n_skipped += args[1]
+        return stats.time(phase, func, *args)
+
+    def centre_timed_character(self, character):
+        surrounds = self.stats.time("neighbourhood", self.centre_surrounds, character)
+        view = surrounds.terrain
+        self.stats.characters_stepped += 1
+        self.stats.cells_scanned += (view.x_max - view.x_min) * (view.y_max - view.y_min)
+        return surrounds
+
+    def snapshot(self):
+        """Returns the level's mutable state packed into a flat float64 array.
+
+        The clock, result, log counters and every character's position, goal,
+        next cell, health, visibility and shark history are stored, with the
+        number of logged events as the log cursor. Snapshots are plain arrays so
+        they pickle cheaply; restore them into any Level built from the same spec.
+        """
+        state = [
+            len(self.characters),
+            self.time_elapsed,
+            self.n_updates,
+            self.result.game_over,
+            self.result.won,
+            self.log["n_updates"],
+            self.log["total_time"],
+        ]
+        for character in self.characters:
+            character.get_state(state)
+        return Snapshot(np.array(state), len(self.log["events"]))
+
+    def get_digest(self):
+        """Returns a short hash of the snapshot state, to check a replay ends where it was recorded."""
+        state = np.ascontiguousarray(self.snapshot().state)
+        return hashlib.sha1(state.tobytes()).hexdigest()[:16]
+
+    def restore(self, snapshot):
+        """Puts the level back in the state snapshot was taken in."""
+        values = iter(snapshot.state.tolist())
+        if int(next(values)) != len(self.characters):
+            raise ValueError(f"snapshot isn't of a level with {len(self.characters)} characters")
+        del self.log["events"][snapshot.n_events :]
+        self.time_elapsed = next(values)
+        self.n_updates = int(next(values))
+        game_over = bool(next(values))
+        won = bool(next(values))
+        self.log["n_updates"] = int(next(values))
+        self.log["total_time"] = next(values)
+        if game_over:
+            self.log["won"] = won
+        else:
+            self.log.pop("won", None)
+        for character in self.characters:
+            character.set_state(values)
+        self.update_occupancy()
+        self.visibility.sync()
+        self.visibility.mark_dirty()
+        if self.flow_field is not None:
+            self.update_flow_field()
+        self.result = Result(game_over, won, self.goodies, self.baddies)
+
+    def fork(self):
+        """Returns a new Level in the same state, sharing terrain and neighbourhood tables."""
+        level = Level(
+            self.name,
+            self.shape,
+            self.time_limit,
+            self.terrain,
+            self.game_objects,
+            neighbourhood_tables=self.neighbourhood_tables,
+            flow_fields=self.flow_fields,
+            water_distances=self.water_distances,
+            pathfinding=self.pathfinding,
+        )
+        if not self.is_recording:
+            level.log["events"] = list(self.log["events"])
+        level.restore(self.snapshot())
+        return level
+
+    def record(self, writer):
+        """Streams the events into writer, a ReplayWriter, in place of the in-memory list."""
+        if writer.dt is not None:
+            self.log["dt"] = writer.dt
+        writer.extend(self.log["events"])
+        self.log["events"] = writer
+
+    def stop_recording(self):
+        """Closes the replay being recorded with the level's totals and returns its writer.
+
+        The events are read back into the log, so save_log still writes them.
+        """
+        writer = self.log["events"]
+        writer.close(self.n_updates, self.time_elapsed, self.log.get("won"), self.get_digest())
+        self.log["events"] = writer.read_events()
+        return writer
+
+    @property
+    def is_recording(self):
+        return not isinstance(self.log["events"], list)
 
     def save_log(self, path):
+        log = self.log
+        if self.is_recording:
+            log = dict(log, events=log["events"].read_events())
+        if self.result.game_over:
+            log = dict(log, digest=self.get_digest())
         with open(path, "w") as log_file:
-            json.dump(self.log, log_file)
+            json.dump(log, log_file)
+
+
+def load_log(path):
+    """Reads a log written by Level.save_log, with its events as Event tuples."""
+    with open(path, "r") as log_file:
+        log = json.load(log_file)
+    log["events"] = [Event(*args) for args in log["events"]]
+    return log
 
 
 Result = namedtuple("Result", "game_over won goodies baddies")
 Event = namedtuple("Event", "character_index time x y")
+Snapshot = namedtuple("Snapshot", "state n_events")
@@ -0,0 +1,84 @@
+from itertools import product
+from .base import Cell
+from .terrain import TerrainLookups
+
+
+def get_neighbourhood_bounds(cell, level_shape, shape=(1, 1), thickness=1):
+    """Returns the (x_min, x_max, y_min, y_max) block around an object, clamped to the level."""
+    cell_x, cell_y = cell
+    rows, cols = level_shape
+    x_min = max(0, cell_x - thickness)
+    x_max = min(cell_x + shape[1] + thickness, cols)
+    y_min = max(0, cell_y - thickness)
+    y_max = min(cell_y + shape[0] + thickness, rows)
+    return (x_min, x_max, y_min, y_max)
+
+
+class NeighbourhoodTable:
+    """Neighbourhood bounds of every cell of a level, computed once per level and object shape."""
+
+    def __init__(self, level_shape, shape=(1, 1), thickness=1):
+        self.level_shape = tuple(level_shape)
+        self.shape = tuple(shape)
+        self.thickness = thickness
+        self.rows, self.cols = self.level_shape
+        self.bounds = [
+            get_neighbourhood_bounds(Cell(x, y), self.level_shape, shape, thickness)
+            for y, x in product(range(self.rows), range(self.cols))
+        ]
+
+    def __getitem__(self, cell):
+        x, y = cell
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.bounds[y * self.cols + x]
+        return get_neighbourhood_bounds(cell, self.level_shape, self.shape, self.thickness)
+
+
+class Neighbourhood:
+    """Read through view of a level-wide cell index limited to the block around one cell.
+
+    Cells outside the block read as the default, as if the index had been copied
+    for just that block. Centring only swaps the bounds, so one view can serve
+    every character in turn without allocating.
+    """
+
+    def __init__(self, index, default):
+        self.index = index
+        self.default = default
+        self.x_min = self.x_max = self.y_min = self.y_max = 0
+
+    def __repr__(self):
+        cls = self.__class__.__name__
+        return f"{cls}(x: {self.x_min}-{self.x_max}, y: {self.y_min}-{self.y_max})"
+
+    def centre(self, bounds):
+        self.x_min, self.x_max, self.y_min, self.y_max = bounds
+
+    def __contains__(self, cell):
+        x, y = cell
+        return self.x_min <= x < self.x_max and self.y_min <= y < self.y_max
+
+    def __getitem__(self, cell):
+        x, y = cell
+        if self.x_min <= x < self.x_max and self.y_min <= y < self.y_max:
+            return self.index[cell]
+        return self.default
+
+    def keys(self):
+        return (
+            Cell(x, y)
+            for x, y in product(
+                range(self.x_min, self.x_max), range(self.y_min, self.y_max)
+            )
+        )
+
+
+class TerrainNeighbourhood(TerrainLookups, Neighbourhood):
+    """Neighbourhood of a TerrainMap that keeps its typed lookups.
+
+    flow is the level's goal FlowField, or None, for goodies to path by.
+    """
+
+    def __init__(self, index, default, flow=None):
+        super().__init__(index, default)
+        self.flow = flow
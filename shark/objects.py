@@ -4,6 +4,7 @@ import inspect
 import importlib
 from collections import deque, namedtuple
 from itertools import chain
+import numpy as np
 from .base import (
     Cell,
     get_cells_in_block,
@@ -19,31 +20,114 @@ from .base import (
 Surrounds = namedtuple("Surrounds", "terrain goodies baddies")
 
 
+def add_repeatedly(start, steps, n_times):
+    """Returns start plus the steps n_times over, rounded after every addition as a loop would.
+
+    np.add.accumulate adds left to right, so the result is bit for bit the
+    same as adding each step in turn, in one pass rather than a Python loop.
+    """
+    terms = np.concatenate(([start], np.tile(steps, n_times)))
+    return float(np.add.accumulate(terms)[-1])
+
+
+def pack_pair(pair):
+    return (math.nan, math.nan) if pair is None else pair
+
+
+def unpack_cell(values):
+    x, y = next(values), next(values)
+    return None if x != x else Cell(int(x), int(y))
+
+
+def unpack_code(values, code_class):
+    value = next(values)
+    return None if value != value else code_class(int(value))
+
+
 class GameObject:
-    """Base class for all game objects."""
+    """Base class for all game objects.
+
+    The rounded cell is cached and only rebuilt when moving x or y changes it.
+    index is the object's stable position in its level's character list.
+    """
+
+    __slots__ = (
+        "name",
+        "_x",
+        "_y",
+        "_cell",
+        "_cells",
+        "_shape",
+        "action",
+        "direction",
+        "visible",
+        "index",
+    )
 
     def __init__(self, name=None, x=0.0, y=0.0, shape=(1, 1)):
         self.name = name
-        self.x = x
-        self.y = y
-        self.shape = shape
+        self._x = x
+        self._y = y
+        self._cell = Cell(round(x), round(y))
+        self._cells = None
+        self._shape = shape
         self.action = None
         self.direction = Direction.south
         self.visible = True
+        self.index = None
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, x):
+        self._x = x
+        cell_x = round(x)
+        if cell_x != self._cell.x:
+            self._cell = Cell(cell_x, self._cell.y)
+            self._cells = None
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, y):
+        self._y = y
+        cell_y = round(y)
+        if cell_y != self._cell.y:
+            self._cell = Cell(self._cell.x, cell_y)
+            self._cells = None
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape):
+        self._shape = shape
+        self._cells = None
 
     @property
     def cell(self):
-        return Cell(round(self.x), round(self.y))
+        return self._cell
 
     @property
     def cells(self):
+        if self._cells is None:
+            self._cells = frozenset(self.cells_at(self._cell))
+        return self._cells
+
+    def cells_at(self, cell):
+        """Returns the cells the object would cover with its origin at cell."""
         if self.shape != (1, 1):
-            cell_x, cell_y = self.cell
+            cell_x, cell_y = cell
             max_x = cell_x + self.shape[1]
             max_y = cell_y + self.shape[0]
             return get_cells_in_block(cell_x, max_x, cell_y, max_y)
         else:
-            return set([self.cell])
+            return set([cell])
 
     def __contains__(self, cell):
         return cell in self.cells
@@ -55,35 +139,66 @@ class GameObject:
     def step(self, dt, surrounds):
         pass
 
+    def get_state(self, state):
+        """Appends the object's mutable state to the float list state, None as nan."""
+        direction = math.nan if self.direction is None else self.direction
+        action = math.nan if self.action is None else self.action
+        state.extend((self._x, self._y, direction, action, self.visible))
+
+    def set_state(self, values):
+        """Restores what get_state stored, reading from the iterator values."""
+        self.x = next(values)
+        self.y = next(values)
+        self.direction = unpack_code(values, Direction)
+        self.action = unpack_code(values, Action)
+        self.visible = bool(next(values))
+
     def __bool__(self):
-        if self.__class__.__name__ == "GameObject":
-            return False
-        return True
+        return self.__class__ is not GameObject
 
 
 class Terrain(GameObject):
     """Base class for regions of a level."""
 
+    __slots__ = ()
+
 
 class Water(Terrain):
     """A water region passable to all."""
 
+    __slots__ = ()
+
 
 class Land(Terrain):
     """A land region passable only to Goodies."""
 
+    __slots__ = ()
+
 
 class UnPassableTerrain(Land):
     """A region unpassable to all Characters."""
 
+    __slots__ = ()
+
 
 class Goal(GameObject):
     """A point that defines where the Hero must go!."""
 
+    __slots__ = ()
+
 
 class MoveableObject(GameObject):
     """Class that supports movement."""
 
+    __slots__ = (
+        "default_action",
+        "is_on_land",
+        "goal_cell",
+        "next_cell",
+        "dx_dy",
+        "step_size",
+    )
+
     water_speed = 1.5
     land_speed = 3
     displacement_prefs = displacement_preferences
@@ -96,7 +211,7 @@ class MoveableObject(GameObject):
 
     @property
     def is_active(self):
-        return bool(self.goal_cell)
+        return self.goal_cell is not None
 
     def clear(self):
         self.goal_cell = None
@@ -118,7 +233,7 @@ class MoveableObject(GameObject):
             self.move(distance, surrounds)
 
     def get_distance(self, dt, terrain):
-        self.is_on_land = isinstance(terrain[self.cell], Land)
+        self.is_on_land = terrain.is_land(self.cell)
         self.action = Action.walk if self.is_on_land else Action.swim
         current_speed = self.land_speed if self.is_on_land else self.water_speed
         return current_speed * dt
@@ -165,32 +280,102 @@ class MoveableObject(GameObject):
         """To be implemented by subclasses."""
         return True
 
+    def count_glides(self, dt, surrounds):
+        """Returns how many steps of dt can safely be taken with glide.
+
+        A glide step slides towards next_cell without arriving at it or changing
+        cell, so none of the checks in move can come out differently. Once the
+        object is in next_cell a blocked next_cell only re-centres it on the
+        cell it is already heading for, so that is still plain movement. The count
+        keeps a margin of two steps against float drift and is 0 when unsure.
+        """
+        if not self.next_cell or not self.dx_dy or (self.x, self.y) == self.next_cell:
+            return 0
+        if self.next_cell != self.cell and not self.is_free_cell(
+            self.next_cell, surrounds
+        ):
+            return 0
+        is_on_land = surrounds.terrain.is_land(self.cell)
+        distance = (self.land_speed if is_on_land else self.water_speed) * dt
+        if distance <= 0:
+            return 0
+        n_glides = math.inf
+        for position, target, sign in zip(
+            (self.x, self.y), self.next_cell, self.dx_dy
+        ):
+            if sign != 0:
+                if sign > 0:
+                    boundary = math.ceil(position - 0.5) + 0.5 - position
+                else:
+                    boundary = position - math.floor(position + 0.5) + 0.5
+                remaining = min(abs(target - position), boundary)
+                n_glides = min(n_glides, math.floor(remaining / distance) - 2)
+        return max(0, n_glides) if n_glides != math.inf else 0
+
+    def get_state(self, state):
+        super().get_state(state)
+        state.extend(pack_pair(self.goal_cell))
+        state.extend(pack_pair(self.next_cell))
+        state.extend(pack_pair(self.dx_dy))
+        state.extend((self.step_size, self.is_on_land))
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.goal_cell = unpack_cell(values)
+        self.next_cell = unpack_cell(values)
+        dx, dy = next(values), next(values)
+        self.dx_dy = None if dx != dx else (int(dx), int(dy))
+        self.step_size = next(values)
+        self.is_on_land = bool(next(values))
+
+    def glide(self, dt, surrounds):
+        """Takes a step that count_glides has shown to be plain movement."""
+        self.take_step(self.get_distance(dt, surrounds.terrain))
+
+    def glide_ticks(self, dt, surrounds, n_ticks):
+        """Takes n_ticks glides at once, ending where n_ticks calls to glide would."""
+        distance = self.get_distance(dt, surrounds.terrain)
+        (sx, sy), (next_x, next_y) = self.dx_dy, self.next_cell
+        if sx:
+            self.x = add_repeatedly(self.x, sx * distance, n_ticks)
+        elif self.x == next_x:
+            self.x = next_x
+        if sy:
+            self.y = add_repeatedly(self.y, sy * distance, n_ticks)
+        elif self.y == next_y:
+            self.y = next_y
+
     def take_step(self, displacement):
         sx, sy = self.dx_dy
         displacement -= self.update_position(sx * displacement, sy * displacement)
         return displacement
 
     def update_position(self, sx, sy):
-        dx = self.next_cell.x - self.x
-        dy = self.next_cell.y - self.y
+        next_x, next_y = self.next_cell
+        x = self.x
+        y = self.y
+        dx = next_x - x
+        dy = next_y - y
         if abs(sx) < abs(dx):
             dx_actual = sx
-            self.x += sx
+            self.x = x + sx
         else:
-            dx_actual = self.next_cell.x - self.x
-            self.x = self.next_cell.x
+            dx_actual = dx
+            self.x = next_x
         if abs(sy) < abs(dy):
             dy_actual = sy
-            self.y += sy
+            self.y = y + sy
         else:
-            dy_actual = self.next_cell.y - self.y
-            self.y = self.next_cell.y
+            dy_actual = dy
+            self.y = next_y
         return abs(dx_actual) + abs(dy_actual)
 
 
 class Character(MoveableObject):
     """Class that has health and supports movement."""
 
+    __slots__ = ("current_health", "is_visible")
+
     max_health = 100
     visible_distance = 4
 
@@ -207,6 +392,15 @@ class Character(MoveableObject):
         if self.is_alive:
             super().step(dt, surrounds)
 
+    def get_state(self, state):
+        super().get_state(state)
+        state.extend((self.current_health, self.is_visible))
+
+    def set_state(self, values):
+        super().set_state(values)
+        self.current_health = next(values)
+        self.is_visible = bool(next(values))
+
     def take_damage(self, damage):
         if self.is_alive:
             self.current_health -= damage
@@ -236,27 +430,49 @@ class Character(MoveableObject):
 
 
 class Goodie(Character):
-    """Character that needs to reach goal."""
+    """Character that needs to reach goal.
+
+    Sent to a goal cell while the level has a flow field, a goodie follows
+    the field to the nearest open goal cell instead of heading straight there.
+    The field is read from the terrain view's flow attribute.
+    """
+
+    __slots__ = ()
+
+    def choose_next_cell(self, surrounds):
+        flow = getattr(surrounds.terrain, "flow", None)
+        if flow is not None and self.goal_cell in flow.targets:
+            displacement_prefs = flow.get_moves(self.cell)
+            if displacement_prefs or self.cell in flow.targets:
+                self.next_cell = None
+                self.direction = None
+                self.dx_dy = None
+                self.set_best_cell(displacement_prefs, surrounds)
+                return
+        super().choose_next_cell(surrounds)
 
     def is_free_cell(self, cell, surrounds):
-        is_not_terrain = not isinstance(surrounds.terrain[cell], Terrain)
-        is_unpassable = isinstance(surrounds.terrain[cell], UnPassableTerrain)
+        is_passable = surrounds.terrain.is_passable(cell)
         is_occupied = (
             isinstance(surrounds.goodies[cell], Goodie)
             and surrounds.goodies[cell].is_alive
         )
-        return not any((is_not_terrain, is_unpassable, is_occupied))
+        return is_passable and not is_occupied
 
 
 class Hero(Goodie):
-    pass
+    __slots__ = ()
 
 
 class Baddie(Character):
     """Character that can do damage to Goodies."""
 
+    __slots__ = ()
+
 
 class Shark(Baddie):
+    __slots__ = ("previous_cells",)
+
     land_speed = 0
     water_speed = 3
     damage = 100
@@ -285,6 +501,38 @@ class Shark(Baddie):
                 if goodie_in_cell:
                     self.attack(goodie_in_cell, dt)
 
+    def get_state(self, state):
+        super().get_state(state)
+        previous_cells = self.previous_cells
+        state.append(len(previous_cells))
+        for cell in previous_cells:
+            state.extend(cell)
+        state.extend((math.nan,) * (2 * (previous_cells.maxlen - len(previous_cells))))
+
+    def set_state(self, values):
+        super().set_state(values)
+        previous_cells = self.previous_cells
+        previous_cells.clear()
+        n_cells = int(next(values))
+        for i in range(previous_cells.maxlen):
+            cell = unpack_cell(values)
+            if i < n_cells:
+                previous_cells.append(cell)
+
+    def glide(self, dt, surrounds):
+        super().glide(dt, surrounds)
+        self.current_health = self.max_health
+        goodie_in_cell = surrounds.goodies[self.cell]
+        if goodie_in_cell:
+            self.attack(goodie_in_cell, dt)
+
+    def glide_ticks(self, dt, surrounds, n_ticks):
+        """Glides n_ticks; the level applies the bites, as they interleave with other sharks'."""
+        super().glide_ticks(dt, surrounds, n_ticks)
+        self.current_health = self.max_health
+        if surrounds.goodies[self.cell]:
+            self.action = Action.attack
+
     def attack(self, goodie, dt):
         # print("goodie is", goodie)
         damage = self.damage * dt
@@ -292,11 +540,10 @@ class Shark(Baddie):
         goodie.take_damage(damage)
 
     def is_free_cell(self, cell, surrounds):
-        is_not_terrain = not isinstance(surrounds.terrain[cell], Terrain)
-        is_land = isinstance(surrounds.terrain[cell], Land)
+        is_water = surrounds.terrain.is_water(cell)
         have_visited = cell in self.previous_cells
         is_occupied = isinstance(surrounds.baddies[cell], Baddie)
-        return not any((is_land, have_visited, is_occupied, is_not_terrain))
+        return is_water and not (have_visited or is_occupied)
 
 
 all_classes = inspect.getmembers(importlib.import_module(__name__), inspect.isclass)
@@ -0,0 +1,96 @@
+from bisect import insort
+from .objects import GameObject
+
+empty_cell = GameObject()
+
+
+class Occupancy:
+    """Maps cells to the characters of one group that occupy them.
+
+    A character is only re-indexed when its rounded cell changes. Where several
+    characters share a cell the one latest in the group wins. The number of
+    characters in the goal and the number dead are kept as running counters.
+    """
+
+    def __init__(self, characters, goal=()):
+        self.characters = characters
+        self.goal = goal
+        self.rebuild()
+
+    def __repr__(self):
+        return f"Occupancy(characters: {len(self.characters)}, cells: {len(self.cell_map)})"
+
+    def __getitem__(self, cell):
+        indices = self.cell_map.get(cell)
+        if indices:
+            return self.characters[indices[-1]]
+        return empty_cell
+
+    def __contains__(self, cell):
+        return cell in self.cell_map
+
+    def keys(self):
+        return self.cell_map.keys()
+
+    def rebuild(self):
+        """Indexes every character from scratch."""
+        self.cell_map = {}
+        self.character_cells = []
+        self.in_goal = []
+        self.alive = []
+        self.n_in_goal = 0
+        self.n_dead = 0
+        for idx, character in enumerate(self.characters):
+            cell = character.cell
+            self.character_cells.append(cell)
+            self.add(idx, character.cells)
+            in_goal = cell in self.goal
+            self.in_goal.append(in_goal)
+            self.n_in_goal += in_goal
+            is_alive = character.is_alive
+            self.alive.append(is_alive)
+            self.n_dead += not is_alive
+
+    def update(self):
+        """Moves characters that changed cell and refreshes the counters."""
+        for idx, character in enumerate(self.characters):
+            cell = character.cell
+            if cell != self.character_cells[idx]:
+                self.move(idx, character, cell)
+            is_alive = character.is_alive
+            if is_alive != self.alive[idx]:
+                self.alive[idx] = is_alive
+                self.n_dead += -1 if is_alive else 1
+
+    def move(self, idx, character, cell):
+        old_cell = self.character_cells[idx]
+        self.remove(idx, character.cells_at(old_cell))
+        self.add(idx, character.cells)
+        self.character_cells[idx] = cell
+        in_goal = cell in self.goal
+        if in_goal != self.in_goal[idx]:
+            self.in_goal[idx] = in_goal
+            self.n_in_goal += 1 if in_goal else -1
+
+    def add(self, idx, cells):
+        for cell in cells:
+            indices = self.cell_map.get(cell)
+            if indices is None:
+                self.cell_map[cell] = [idx]
+            else:
+                insort(indices, idx)
+
+    def remove(self, idx, cells):
+        for cell in cells:
+            indices = self.cell_map[cell]
+            indices.remove(idx)
+            if not indices:
+                del self.cell_map[cell]
+
+    @property
+    def all_in_goal(self):
+        return self.n_in_goal == len(self.characters)
+
+    @property
+    def any_dead(self):
+        return self.n_dead > 0
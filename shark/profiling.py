@@ -0,0 +1,91 @@
+import time
+
+phases = (
+    "checks",
+    "neighbourhood",
+    "character_step",
+    "visibility",
+    "occupancy",
+    "flow_field",
+    "skipped_ticks",
+)
+
+
+class StepStats:
+    """Time spent in each phase of Level.step, in total and in the last tick.
+
+    Filled in by a Level with profiling enabled: checks are the win and loss
+    tests, neighbourhood and character_step split step_characters, and
+    skipped_ticks times the glides advance_until applies without stepping.
+    Phases run inside another phase are only counted in the inner one.
+    Counters record the characters stepped and the neighbourhood cells
+    centred for them.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.totals = dict.fromkeys(phases, 0.0)
+        self.last = dict.fromkeys(phases, 0.0)
+        self.n_ticks = 0
+        self.n_skipped = 0
+        self.characters_stepped = 0
+        self.cells_scanned = 0
+        self.nested = 0.0
+
+    def __repr__(self):
+        return f"StepStats(ticks: {self.n_ticks}, skipped: {self.n_skipped}, time: {self.total_time:.4f}s)"
+
+    @property
+    def total_time(self):
+        return sum(self.totals.values())
+
+    def start_tick(self):
+        self.n_ticks += 1
+        for phase in phases:
+            self.last[phase] = 0.0
+
+    def add(self, phase, seconds):
+        self.totals[phase] += seconds
+        self.last[phase] += seconds
+
+    def time(self, phase, func, *args):
+        """Calls func(*args), adding the time it took, less any nested phases, to phase."""
+        outer, self.nested = self.nested, 0.0
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        self.add(phase, elapsed - self.nested)
+        self.nested = outer + elapsed
+        return result
+
+    def per_tick(self):
+        """Mean seconds per stepped tick of each phase."""
+        n_ticks = max(self.n_ticks, 1)
+        return {phase: total / n_ticks for phase, total in self.totals.items()}
+
+    def as_dict(self):
+        return {
+            "n_ticks": self.n_ticks,
+            "n_skipped": self.n_skipped,
+            "characters_stepped": self.characters_stepped,
+            "cells_scanned": self.cells_scanned,
+            "totals": dict(self.totals),
+            "per_tick": self.per_tick(),
+        }
+
+    def summary(self):
+        """Returns a table of the phases, slowest first."""
+        total = self.total_time or 1.0
+        per_tick = self.per_tick()
+        lines = [repr(self)]
+        for phase in sorted(phases, key=lambda phase: -self.totals[phase]):
+            lines.append(
+                f"{phase:<16} {self.totals[phase]:10.4f}s {100 * self.totals[phase] / total:6.1f}%"
+                f" {per_tick[phase] * 1e6:10.2f}us/tick"
+            )
+        lines.append(
+            f"characters stepped: {self.characters_stepped}, cells scanned: {self.cells_scanned}"
+        )
+        return "\n".join(lines)
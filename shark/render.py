@@ -1,18 +1,35 @@
 import pyglet
 import json
 from pathlib import Path
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from .base import Direction, Action
 from .objects import Character
+from .terrain import terrain_names
+from .background import TerrainBaker
+from .atlas import load_atlas, ATLAS_FOLDER
 import random
 
 
+ImageEntry = namedtuple("ImageEntry", "specs kind index")
+
+
 class ImageLoader:
+    """Images of the game objects by key, like Orange_walk_south, loaded on first use.
+
+    Only the JSON specs are read up front, to know which keys exist. The
+    first image asked for packs every sheet into a TextureAtlas, cached in
+    graphics/atlas until a sheet changes, and each animation or frame is cut
+    from its sheet's atlas region the first time its key is asked for.
+    """
+
     def __init__(self, app_path):
         self.folder = app_path / "shark" / "graphics"
         img_spec_paths = self.get_file_paths(".json")
-        img_paths = self.get_file_paths(".png")
-        self.imgs = self.create_imgs(img_spec_paths, img_paths)
+        self.img_paths = self.get_file_paths(".png")
+        self.entries = self.index_imgs(img_spec_paths, self.img_paths)
+        self.imgs = {}
+        self.grids = {}
+        self._atlas = None
 
     def get_file_paths(self, file_type):
         paths = [
@@ -20,42 +37,58 @@ class ImageLoader:
             for file_path in self.folder.iterdir()
             if file_path.suffix == file_type
         ]
-        return paths
+        return sorted(paths)
 
-    def create_imgs(self, img_spec_paths, img_paths):
-        imgs = {}
+    def index_imgs(self, img_spec_paths, img_paths):
+        entries = {}
         img_names = [path.name for path in img_paths]
         for img_spec_path in img_spec_paths:
             specs = self.load_specs(img_spec_path)
-            img_filename = specs["filename"]
-            if img_filename in img_names:
-                self.create_img(imgs, specs, img_filename)
-        return imgs
+            if specs["filename"] in img_names:
+                self.index_img(entries, specs)
+        return entries
 
     def load_specs(self, spec_path):
         with open(spec_path, "r") as spec_file:
             specs = json.load(spec_file)
         return specs
 
-    def create_img(self, imgs, specs, img_name):
-        img = pyglet.image.load(self.folder / img_name)
+    def index_img(self, entries, specs):
         object_name = specs["obj_name"]
-        frames = specs["frames"]
-        animations = specs["animations"]
-        n_rows = int(specs["n_rows"])
-        n_cols = int(specs["n_cols"])
-        if animations:
-            img_grid = pyglet.image.ImageGrid(img, n_rows, n_cols)
-            for i, animation in enumerate(animations):
+        if specs["animations"]:
+            for i, animation in enumerate(specs["animations"]):
                 key = object_name + "_" + animation["name"]
-                imgs[key] = self.extract_animation(img_grid, i, animation)
-        elif frames:
-            img_grid = pyglet.image.ImageGrid(img, n_rows, n_cols)
-            for i, frame in enumerate(frames):
+                entries[key] = ImageEntry(specs, "animation", i)
+        elif specs["frames"]:
+            for i, frame in enumerate(specs["frames"]):
                 key = object_name + "_" + frame["name"]
-                imgs[key] = img_grid[i]
+                entries[key] = ImageEntry(specs, "frame", i)
         else:
-            imgs[object_name] = img
+            entries[object_name] = ImageEntry(specs, "image", 0)
+
+    @property
+    def atlas(self):
+        if self._atlas is None:
+            self._atlas = load_atlas(self.folder / ATLAS_FOLDER, self.img_paths)
+        return self._atlas
+
+    def get_grid(self, specs):
+        filename = specs["filename"]
+        if filename not in self.grids:
+            region = self.atlas.get_region(filename)
+            n_rows = int(specs["n_rows"])
+            n_cols = int(specs["n_cols"])
+            self.grids[filename] = pyglet.image.ImageGrid(region, n_rows, n_cols)
+        return self.grids[filename]
+
+    def create_img(self, entry):
+        if entry.kind == "animation":
+            return self.extract_animation(
+                self.get_grid(entry.specs), entry.index, entry.specs["animations"][entry.index]
+            )
+        if entry.kind == "frame":
+            return self.get_grid(entry.specs)[entry.index]
+        return self.atlas.get_region(entry.specs["filename"])
 
     def extract_animation(self, img_grid, row, animation):
         length = int(animation["length"])
@@ -67,72 +100,172 @@ class ImageLoader:
             img_grid[start:stop], dt, loop
         )
 
+    def get_pixels(self, key):
+        """Returns the RGBA pixels of an image, or an animation's first frame, bottom row first."""
+        specs, kind, index = self.entries[key]
+        if kind == "image":
+            return self.atlas.get_pixels(specs["filename"])
+        n_rows = int(specs["n_rows"])
+        n_cols = int(specs["n_cols"])
+        if kind == "animation":
+            index *= n_cols
+        _, _, _, width, height = self.atlas.table[specs["filename"]]
+        item_width, item_height = width // n_cols, height // n_rows
+        row, col = divmod(index, n_cols)
+        return self.atlas.get_pixels(
+            specs["filename"], col * item_width, row * item_height, item_width, item_height
+        )
+
     def __len__(self):
-        return len(self.imgs)
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
 
-    def __getitem__(self, index):
-        return self.imgs[index]
+    def keys(self):
+        return self.entries.keys()
+
+    def __getitem__(self, key):
+        img = self.imgs.get(key)
+        if img is None:
+            img = self.create_img(self.entries[key])
+            self.imgs[key] = img
+        return img
+
+
+def get_key(name, action=None, direction=None):
+    """Returns the ImageLoader key of an object's image, like Orange_walk_south."""
+    key = str(name)
+    if action:
+        key += "_" + str(action.name)
+    if direction:
+        key += "_" + str(direction.name)
+    return key
 
 
 class Renderer:
-    def __init__(self, app_path, hud_height, hud_width, hud_cols, cell_size=24):
+    """Draws the terrain, the characters and the HUD of a level.
+
+    Every character gets one sprite for the whole level, kept in a single
+    batch under a group per map row, so lower rows draw in front. Frames
+    only swap a sprite's image when its action or direction changes, move
+    it when its position does and hide it while it's off the draw list.
+    Image keys are worked out by (name, action, direction) for the level's
+    characters when it starts, and each image is fetched from the loader
+    into the same table the first time a character shows it.
+    """
+
+    def __init__(self, app_path, hud_height, hud_width, hud_cols, cell_size=24, bake_terrain=True):
         self.cell_size = cell_size
         self.offset = cell_size // 2
         self.imgs = ImageLoader(app_path)
         self.hud = HUD(self.imgs, hud_height, hud_width, n_cols=hud_cols)
+        self.img_keys = {}
+        self.img_table = {}
+        self.bake_terrain = bake_terrain
+        self.terrain_baker = TerrainBaker(self.imgs, cell_size) if bake_terrain else None
 
     def start_level(self, level):
-        terrain_objects = level.terrain
-        self.previous_imgs = {}
-        self.sprites = {}
         self.bg = pyglet.graphics.Batch()
-        if terrain_objects:
-            for terrain_object in terrain_objects:
-                x, y = self.convert_coords(terrain_object)
-                img = self.get_img(terrain_object)
-                self.sprites[terrain_object] = pyglet.sprite.Sprite(
-                    img=img, x=x, y=y, batch=self.bg
-                )
+        if self.bake_terrain:
+            self.build_background(level)
+        else:
+            self.build_terrain_sprites(level)
+        self.build_img_table(level.characters)
+        self.build_character_sprites(level)
         self.hud.reset(level)
 
+    def build_background(self, level):
+        """Draws the terrain as a single sprite of the baked background."""
+        img = self.terrain_baker.get_image(level)
+        x = self.convert_terrain_coord_x(0)
+        y = self.convert_terrain_coord_y(0)
+        self.bg_sprites = [pyglet.sprite.Sprite(img=img, x=x, y=y, batch=self.bg)]
+
+    def build_terrain_sprites(self, level):
+        """Draws the terrain as a sprite per cell, for debugging the baked background."""
+        self.bg_sprites = []
+        for cell, code in level.terrain.items():
+            if code in terrain_names:
+                x = self.convert_terrain_coord_x(cell.x)
+                y = self.convert_terrain_coord_y(cell.y)
+                img = self.imgs[self.get_key(terrain_names[code], Direction.south)]
+                self.bg_sprites.append(
+                    pyglet.sprite.Sprite(img=img, x=x, y=y, batch=self.bg)
+                )
+
+    def build_img_table(self, characters):
+        for name in {character.name for character in characters}:
+            for action in (None,) + tuple(Action):
+                for direction in (None,) + tuple(Direction):
+                    key = get_key(name, action, direction)
+                    if key in self.imgs:
+                        self.img_keys[(name, action, direction)] = key
+
+    def build_character_sprites(self, level):
+        rows, cols = level.shape
+        self.batch = pyglet.graphics.Batch()
+        self.row_groups = [pyglet.graphics.Group(order=rows - row) for row in range(rows)]
+        self.sprites = {}
+        self.sprite_states = {}
+        self.shown = set()
+        for character in level.characters:
+            img = self.get_img(character)
+            group = self.get_row_group(character)
+            x, y = self.convert_coords(character)
+            sprite = pyglet.sprite.Sprite(img=img, x=x, y=y, batch=self.batch, group=group)
+            sprite.visible = False
+            self.sprites[character] = sprite
+            self.sprite_states[character] = [img, (x, y), group]
+
+    def get_row_group(self, game_object):
+        row = min(max(game_object.cell.y, 0), len(self.row_groups) - 1)
+        return self.row_groups[row]
+
     def get_img(self, game_object):
-        key = self.get_key(game_object.name, game_object.direction, game_object.action)
-        return self.imgs[key]
+        key = (game_object.name, game_object.action, game_object.direction)
+        img = self.img_table.get(key)
+        if img is None:
+            img = self.imgs[self.img_keys.get(key) or get_key(*key)]
+            self.img_table[key] = img
+        return img
 
     def get_key(self, name, direction=None, action=None):
-        key = str(name)
-        if action:
-            key += "_" + str(action.name)
-        if direction:
-            key += "_" + str(direction.name)
-        return key
+        return get_key(name, action, direction)
 
     def draw(self, game_objects, time_remaining):
+        self.prepare_frame(game_objects, time_remaining)
         self.bg.draw()
-        for game_object in game_objects:  # sort
-            sprite = self.get_sprite(game_object)
-            sprite.draw()
-        self.hud.draw(game_objects, time_remaining)
+        self.batch.draw()
+        self.hud.draw_batches()
 
-    def get_sprite(self, game_object):
-        img = self.get_img(game_object)
-        x, y = self.convert_coords(game_object)
-        if game_object in self.previous_imgs and img == self.previous_imgs[game_object]:
-            sprite = self.move_sprite(game_object, x, y)
-        else:
-            sprite = self.create_new_sprite(game_object, img, x, y)
-        return sprite
-
-    def create_new_sprite(self, game_object, img, x, y):
-        sprite = pyglet.sprite.Sprite(img=img, x=x, y=y)
-        self.sprites[game_object] = sprite
-        self.previous_imgs[game_object] = img
-        return sprite
+    def prepare_frame(self, game_objects, time_remaining):
+        """Updates the sprites and HUD for a frame without drawing, returning the sprites."""
+        sprites = [self.get_sprite(game_object) for game_object in game_objects]
+        shown = set(game_objects)
+        for game_object in self.shown - shown:
+            self.sprites[game_object].visible = False
+        self.shown = shown
+        self.hud.update(time_remaining)
+        return sprites
 
-    def move_sprite(self, game_object, x, y):
+    def get_sprite(self, game_object):
         sprite = self.sprites[game_object]
-        sprite.x = x
-        sprite.y = y
+        state = self.sprite_states[game_object]
+        img = self.get_img(game_object)
+        if img is not state[0]:
+            sprite.image = img
+            state[0] = img
+        position = self.convert_coords(game_object)
+        if position != state[1]:
+            sprite.position = position + (0,)
+            state[1] = position
+        group = self.get_row_group(game_object)
+        if group is not state[2]:
+            sprite.group = group
+            state[2] = group
+        if not sprite.visible:
+            sprite.visible = True
         return sprite
 
     def convert_coords(self, game_object):
@@ -218,9 +351,15 @@ class HUD:
             self.selected_box.x = idx * self.dx
 
     def draw(self, game_objects, time_remaining):
+        self.update(time_remaining)
+        self.draw_batches()
+
+    def update(self, time_remaining):
         self.time.text = str(time_remaining)
         for i, character in enumerate(self.characters):
             width = int(112 * character.current_health / character.max_health)
             self.health_bars[i].width = width
+
+    def draw_batches(self):
         for batch in self.batches:
             batch.draw()
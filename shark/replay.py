@@ -1,66 +1,102 @@
 import pyglet
-import json
-from collections import deque
-from shark.level import LevelLoader, Event
+from shark.level import LevelLoader
+from shark.replaylog import open_replay, REPLAY_SUFFIX
 from shark.render import Renderer
-from shark.base import Cell
+from shark.timeline import ReplayTimeline
 from pathlib import Path
 
 
 class Replayer(pyglet.window.Window):
-    def __init__(self, app_path, log_file, speed=2, H=896, W=768):
+    """Plays a replay back, with seeking through the keyframes of a ReplayTimeline.
+
+    Space pauses, left and right jump back or forward seek_seconds, comma
+    and period step one tick back or forward, home and end go to the start
+    and end, and dragging the mouse across the window scrubs the match.
+    Every keyframe is built when the replay loads, so no seek re-simulates
+    more than one keyframe interval.
+    """
+
+    def __init__(self, app_path, log_file, speed=2, H=896, W=768, seek_seconds=10):
         super().__init__(W, H, fullscreen=False)
         self.app_path = app_path
         self.speed = speed
+        self.seek_seconds = seek_seconds
         self.level_loader = LevelLoader(app_path)
         self.renderer = Renderer(app_path, 128, W, 6)
         self.log = self.load_log(log_file)
         self.objects_to_draw = []
+        self.paused = False
         self.start_level()
 
     def load_log(self, log_path):
-        log_path = self.app_path / log_path
-        with open(log_path, "r") as log_file:
-            log = json.load(log_file)
-        return log
+        return open_replay(self.app_path / log_path)
 
     def start_level(self):
-        self.level = self.level_loader[self.log["name"]]
-        self.events = deque(Event(*args) for args in self.log["events"])
-        self.current_time = 0.0
-        self.next_event = self.events.popleft()
+        template = self.level_loader.get_template(self.log.name)
+        self.timeline = ReplayTimeline(template, self.log)
+        self.timeline.build_keyframes()
+        self.level = self.timeline.level
         self.renderer.start_level(self.level)
-        dt = self.log["total_time"] / self.log["n_updates"]
-        pyglet.clock.schedule_interval(self.update, dt)
+        self.show_frame()
+        pyglet.clock.schedule_interval(self.update, self.timeline.dt)
 
     def update(self, dt):
-        for i in range(self.speed):
-            self.current_time += dt
-            if self.next_event and self.current_time >= self.next_event.time:
-                self.run_event()
-                if self.events:
-                    self.next_event = self.events.popleft()
-            game_status = self.level.step(dt)
-            if game_status.game_over:
-                self.close()
-        self.objects_to_draw = game_status.goodies + game_status.baddies
-
-    def run_event(self):
-        cell = Cell(self.next_event.x, self.next_event.y)
-        character = self.level.characters[self.next_event.character_index]
-        self.level.update(character, cell)
+        if not self.paused:
+            timeline = self.timeline
+            timeline.advance(min(timeline.tick + self.speed, timeline.last_tick))
+            self.paused = timeline.is_over or timeline.tick >= timeline.last_tick
+        self.show_frame()
+
+    def show_frame(self):
+        self.objects_to_draw = self.level.goodies + self.level.baddies
+
+    def seek(self, tick):
+        self.timeline.seek(tick)
+        self.show_frame()
+
+    def on_key_press(self, symbol, modifiers):
+        key = pyglet.window.key
+        ticks = round(self.seek_seconds / self.timeline.dt)
+        if symbol == key.SPACE:
+            self.paused = not self.paused
+        elif symbol == key.RIGHT:
+            self.seek(self.timeline.tick + ticks)
+        elif symbol == key.LEFT:
+            self.seek(self.timeline.tick - ticks)
+        elif symbol == key.PERIOD:
+            self.paused = True
+            self.seek(self.timeline.tick + 1)
+        elif symbol == key.COMMA:
+            self.paused = True
+            self.seek(self.timeline.tick - 1)
+        elif symbol == key.HOME:
+            self.seek(0)
+        elif symbol == key.END:
+            self.seek(self.timeline.last_tick)
+        else:
+            super().on_key_press(symbol, modifiers)
+
+    def on_mouse_press(self, x, y, button, modifiers):
+        self.scrub(x)
+
+    def on_mouse_drag(self, x, y, dx, dy, buttons, modifiers):
+        self.scrub(x)
+
+    def scrub(self, x):
+        fraction = min(max(x / self.width, 0.0), 1.0)
+        self.seek(round(fraction * self.timeline.last_tick))
 
     def on_draw(self):
         self.clear()
         self.renderer.draw(
-            self.objects_to_draw, int(self.level.time_limit - self.current_time)
+            self.objects_to_draw, int(self.level.time_limit - self.level.time_elapsed)
         )
 
 
 if __name__ == "__main__":
     cwd = Path.cwd()
     replay_files = [
-        file_path for file_path in cwd.iterdir() if file_path.suffix == ".json"
+        file_path for file_path in cwd.iterdir() if file_path.suffix in (".json", REPLAY_SUFFIX)
     ]
     replay = Replayer(cwd, replay_files[0])
     pyglet.app.run()
@@ -0,0 +1,260 @@
+"""Append-only binary replay logs, written while a level runs and read back lazily.
+
+Convert a JSON log with python -m shark.replaylog replay.json [replay.replay].
+"""
+import json
+import struct
+import sys
+import zlib
+from pathlib import Path
+import numpy as np
+from .level import Event, load_log
+
+MAGIC = b"SHARKREP"
+VERSION = 1
+PREFIX = struct.Struct("<8sII")
+BLOCK = struct.Struct("<BII")
+REPLAY_SUFFIX = ".replay"
+
+EVENTS = 1
+COMPRESSED_EVENTS = 2
+END = 3
+
+record_dtype = np.dtype([("character_index", "<u2"), ("time", "<f8"), ("x", "<i2"), ("y", "<i2")])
+
+
+class ReplayFormatError(ValueError):
+    """Raised when a replay file can't be read."""
+
+
+class ReplayWriter:
+    """Streams the events of one level into a replay file as they happen.
+
+    The file is a fixed prefix (magic, version, header length) and a JSON
+    header with the level name, pathfinding flag and the fixed tick length
+    dt the level is stepped by, if it has one, then blocks of up to
+    block_size fixed-width records, each behind a (kind, records, bytes)
+    block header and zlib-compressed if compress is set. Closing adds an end
+    block with n_updates, total_time, won and the final state digest. Every
+    block is flushed as soon as it fills, so a crash loses at most the events
+    still buffered.
+
+    Levels append to the writer as their event list: len counts every event
+    written, and deleting the events from some index on rewinds the buffer,
+    which can't reach back into blocks already flushed.
+    """
+
+    def __init__(self, path, name, pathfinding=False, dt=None, block_size=256, compress=True):
+        self.path = Path(path)
+        self.dt = dt
+        self.block_size = block_size
+        self.compress = compress
+        self.buffer = []
+        self.n_flushed = 0
+        self.file = open(self.path, "wb")
+        header = {"name": name, "pathfinding": pathfinding, "dt": dt}
+        header = json.dumps(header).encode("utf8")
+        self.file.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        self.file.write(header)
+        self.file.flush()
+
+    def __repr__(self):
+        return f"ReplayWriter(path: {self.path}, events: {len(self)})"
+
+    def __len__(self):
+        return self.n_flushed + len(self.buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def closed(self):
+        return self.file.closed
+
+    def append(self, event):
+        self.buffer.append(tuple(event))
+        if len(self.buffer) >= self.block_size:
+            self.flush()
+
+    def extend(self, events):
+        for event in events:
+            self.append(event)
+
+    def __delitem__(self, index):
+        if not isinstance(index, slice) or index.stop is not None or index.step is not None:
+            raise TypeError("only trailing events can be deleted from a replay")
+        start = len(self) if index.start is None else index.start
+        if start < self.n_flushed:
+            raise ValueError("can't rewind a replay past events already written")
+        del self.buffer[start - self.n_flushed :]
+
+    def read_events(self):
+        """Returns every event written so far, reading the flushed blocks back from the file."""
+        return list(ReplayReader(self.path)) + [Event(*event) for event in self.buffer]
+
+    def write_block(self, kind, n_records, payload):
+        self.file.write(BLOCK.pack(kind, n_records, len(payload)))
+        self.file.write(payload)
+        self.file.flush()
+
+    def flush(self):
+        """Writes the buffered events as one block."""
+        if not self.buffer:
+            return
+        payload = np.array(self.buffer, dtype=record_dtype).tobytes()
+        kind = EVENTS
+        if self.compress:
+            payload = zlib.compress(payload)
+            kind = COMPRESSED_EVENTS
+        self.write_block(kind, len(self.buffer), payload)
+        self.n_flushed += len(self.buffer)
+        self.buffer = []
+
+    def close(self, n_updates=None, total_time=None, won=None, digest=None):
+        """Flushes the buffer and, given the level's totals, marks the replay complete."""
+        if self.closed:
+            return
+        self.flush()
+        if n_updates is not None:
+            end = {"n_updates": n_updates, "total_time": total_time, "won": won, "digest": digest}
+            end = json.dumps(end).encode("utf8")
+            self.write_block(END, 0, end)
+        self.file.close()
+
+
+class ReplayReader:
+    """Reads a replay file lazily, one block of events at a time.
+
+    Only the header is read up front; iterating decodes the blocks as it
+    goes, and the end block is found by skipping over the payloads. A file
+    cut short by a crash reads up to its last whole block and has no end.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as replay_file:
+            prefix = replay_file.read(PREFIX.size)
+            if len(prefix) != PREFIX.size:
+                raise ReplayFormatError(f"{self.path} is too short")
+            magic, version, header_length = PREFIX.unpack(prefix)
+            if magic != MAGIC or version != VERSION:
+                raise ReplayFormatError(f"{self.path} isn't a version {VERSION} replay")
+            header = json.loads(replay_file.read(header_length).decode("utf8"))
+        self.offset = PREFIX.size + header_length
+        self.name = header["name"]
+        self.pathfinding = header["pathfinding"]
+        self.dt = header.get("dt")
+        self._end = None
+
+    def __repr__(self):
+        return f"ReplayReader(path: {self.path}, name: {self.name})"
+
+    def iter_blocks(self, read_events=True):
+        """Yields (kind, n_records, payload) for every whole block, payloads only if read_events."""
+        with open(self.path, "rb") as replay_file:
+            replay_file.seek(self.offset)
+            while True:
+                block = replay_file.read(BLOCK.size)
+                if len(block) < BLOCK.size:
+                    return
+                kind, n_records, n_bytes = BLOCK.unpack(block)
+                if kind == END or read_events:
+                    payload = replay_file.read(n_bytes)
+                    if len(payload) < n_bytes:
+                        return
+                else:
+                    replay_file.seek(n_bytes, 1)
+                    payload = None
+                yield kind, n_records, payload
+
+    def iter_records(self):
+        """Yields each block's events as a structured record array."""
+        for kind, n_records, payload in self.iter_blocks():
+            if kind == COMPRESSED_EVENTS:
+                payload = zlib.decompress(payload)
+            if kind in (EVENTS, COMPRESSED_EVENTS):
+                yield np.frombuffer(payload, dtype=record_dtype, count=n_records)
+
+    def __iter__(self):
+        for records in self.iter_records():
+            for idx, time, x, y in records.tolist():
+                yield Event(idx, time, x, y)
+
+    @property
+    def end(self):
+        """The end block's n_updates and total_time, None for an unfinished replay."""
+        if self._end is None:
+            for kind, n_records, payload in self.iter_blocks(read_events=False):
+                if kind == END:
+                    self._end = json.loads(payload.decode("utf8"))
+        return self._end
+
+    @property
+    def is_complete(self):
+        return self.end is not None
+
+    @property
+    def n_updates(self):
+        return self.end["n_updates"] if self.end else None
+
+    @property
+    def total_time(self):
+        return self.end["total_time"] if self.end else None
+
+    @property
+    def won(self):
+        """Whether the goodies won, None if it wasn't recorded."""
+        return self.end.get("won") if self.end else None
+
+    @property
+    def digest(self):
+        """Level.get_digest at the end of the replay, None if it wasn't recorded."""
+        return self.end.get("digest") if self.end else None
+
+
+class JSONReplay:
+    """A JSON log from Level.save_log with the interface of a ReplayReader."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        log = load_log(self.path)
+        self.name = log["name"]
+        self.pathfinding = log.get("pathfinding", False)
+        self.dt = log.get("dt")
+        self.events = log["events"]
+        self.n_updates = log["n_updates"]
+        self.total_time = log["total_time"]
+        self.won = log.get("won")
+        self.digest = log.get("digest")
+        self.is_complete = True
+
+    def __repr__(self):
+        return f"JSONReplay(path: {self.path}, name: {self.name})"
+
+    def __iter__(self):
+        return iter(self.events)
+
+
+def open_replay(path):
+    """Returns a reader for a binary replay, or for a JSON log."""
+    if Path(path).suffix == ".json":
+        return JSONReplay(path)
+    return ReplayReader(path)
+
+
+def convert_log(json_path, replay_path=None, **kwargs):
+    """Imports a JSON log as a binary replay, returning its path."""
+    json_path = Path(json_path)
+    replay_path = json_path.with_suffix(REPLAY_SUFFIX) if replay_path is None else Path(replay_path)
+    log = JSONReplay(json_path)
+    with ReplayWriter(replay_path, log.name, log.pathfinding, log.dt, **kwargs) as writer:
+        writer.extend(log)
+        writer.close(log.n_updates, log.total_time, log.won, log.digest)
+    return replay_path
+
+
+if __name__ == "__main__":
+    print(convert_log(*sys.argv[1:3]))
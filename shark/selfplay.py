@@ -0,0 +1,201 @@
+"""Headless self-play: many matches of goodie and shark policies played side by side.
+
+Run with python -m shark.selfplay to measure decisions per second per core.
+"""
+import argparse
+import time
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
+from .level import LevelLoader
+from .env import SharkEnvPlay, HumanEnvPlay, is_waiting, update_goodie_targets, get_final_rewards
+from .ai import BatchSharkBaseline, BatchGoodieBaseline
+
+Decision = namedtuple("Decision", "time layout info action")
+Trajectory = namedtuple(
+    "Trajectory",
+    "match_id level_name won time_elapsed n_updates goodie_decisions shark_decisions goodie_reward shark_reward",
+)
+
+
+class Match:
+    """One level being played, with the observation envs of both sides and its decisions so far."""
+
+    def __init__(self, match_id, level):
+        self.match_id = match_id
+        self.level = level
+        self.human_env = HumanEnvPlay(views=True)
+        self.shark_env = SharkEnvPlay(views=True)
+        self.human_env.reset(level)
+        self.shark_env.reset(level)
+        self.goodie_decisions = []
+        self.shark_decisions = []
+
+    def __repr__(self):
+        return f"Match(id: {self.match_id}, level: {self.level})"
+
+    @property
+    def goodies_waiting(self):
+        return is_waiting(self.level.goodies)
+
+    @property
+    def sharks_waiting(self):
+        return is_waiting(self.level.baddies)
+
+    def is_waiting(self):
+        return self.goodies_waiting or self.sharks_waiting
+
+    def get_trajectory(self):
+        level = self.level
+        goodie_reward, shark_reward = get_final_rewards(level, level.result.won)
+        return Trajectory(
+            self.match_id,
+            level.name,
+            level.result.won,
+            level.time_elapsed,
+            level.n_updates,
+            self.goodie_decisions,
+            self.shark_decisions,
+            goodie_reward,
+            shark_reward,
+        )
+
+
+class SelfPlayRunner:
+    """Plays n_matches concurrent matches, batching each side's policy calls across them.
+
+    Both sides decide only when all their living characters have stopped, as
+    in TrainingEnv; in between each level advances with advance_until. Every
+    waiting side's observations are stacked and passed to its policy in one
+    call, with the match slots as envs. Goodie policies return (x, y) target
+    cells per goodie, shark policies Movements codes per shark. Finished
+    matches are streamed out as Trajectory tuples and their slot restarts.
+    """
+
+    def __init__(
+        self,
+        app_path,
+        n_matches,
+        goodie_policy=None,
+        shark_policy=None,
+        level_idx=0,
+        dt=0.01,
+        seed=None,
+        pathfinding=True,
+    ):
+        self.n_matches = n_matches
+        self.dt = dt
+        self.pathfinding = pathfinding
+        self.template = LevelLoader(Path(app_path)).get_template(level_idx)
+        seeds = np.random.SeedSequence(seed).spawn(2)
+        if goodie_policy is None:
+            goodie_policy = BatchGoodieBaseline(self.template.build().goal, seed=seeds[0])
+        if shark_policy is None:
+            shark_policy = BatchSharkBaseline(seed=seeds[1])
+        self.goodie_policy = goodie_policy
+        self.shark_policy = shark_policy
+        self.n_started = 0
+        self.n_decisions = 0
+        self.n_games = 0
+        self.elapsed = 0.0
+        self.matches = [self.start_match() for i in range(n_matches)]
+        slots = np.arange(n_matches)
+        self.goodie_policy.reset(self.get_human_state(slots))
+        self.shark_policy.reset(self.get_shark_state(slots))
+
+    def __repr__(self):
+        return f"SelfPlayRunner(matches: {self.n_matches}, games: {self.n_games})"
+
+    @property
+    def decisions_per_second(self):
+        return self.n_decisions / self.elapsed if self.elapsed else 0.0
+
+    def start_match(self):
+        match = Match(self.n_started, self.template.build(pathfinding=self.pathfinding))
+        self.n_started += 1
+        return match
+
+    def get_human_state(self, slots):
+        states = [self.matches[slot].human_env.format_state() for slot in slots]
+        return [np.stack([s[0] for s in states]), np.stack([s[1] for s in states])]
+
+    def get_shark_state(self, slots):
+        states = [self.matches[slot].shark_env.format_state() for slot in slots]
+        return [np.stack([s[0] for s in states]), np.stack([s[1] for s in states])]
+
+    def decide(self):
+        """Asks each side's policy for the actions of every match where that side is waiting.
+
+        Returns the number of decisions taken.
+        """
+        n_decisions = 0
+        slots = [slot for slot, match in enumerate(self.matches) if match.goodies_waiting]
+        n_decisions += len(slots)
+        if slots:
+            state = self.get_human_state(slots)
+            actions = self.goodie_policy.step(state, np.array(slots))
+            for row, slot in enumerate(slots):
+                match = self.matches[slot]
+                update_goodie_targets(match.level, actions[row])
+                match.goodie_decisions.append(
+                    Decision(match.level.time_elapsed, state[0][row], state[1][row], actions[row])
+                )
+        slots = [slot for slot, match in enumerate(self.matches) if match.sharks_waiting]
+        n_decisions += len(slots)
+        if slots:
+            state = self.get_shark_state(slots)
+            actions = self.shark_policy.step(state, np.array(slots))
+            for row, slot in enumerate(slots):
+                match = self.matches[slot]
+                match.shark_env.step(actions[row])
+                match.shark_decisions.append(
+                    Decision(match.level.time_elapsed, state[0][row], state[1][row], actions[row])
+                )
+        return n_decisions
+
+    def run(self, n_games):
+        """Plays until n_games matches have finished, yielding each Trajectory as it completes."""
+        n_finished = 0
+        while n_finished < n_games:
+            start = time.perf_counter()
+            self.n_decisions += self.decide()
+            finished = []
+            for slot, match in enumerate(self.matches):
+                result = match.level.advance_until(self.dt, until=match.is_waiting)
+                if result.game_over:
+                    finished.append(slot)
+            trajectories = []
+            for slot in finished:
+                trajectories.append(self.matches[slot].get_trajectory())
+                self.matches[slot] = self.start_match()
+            if finished:
+                slots = np.array(finished)
+                self.goodie_policy.reset(self.get_human_state(slots), slots)
+                self.shark_policy.reset(self.get_shark_state(slots), slots)
+            self.elapsed += time.perf_counter() - start
+            for trajectory in trajectories:
+                if n_finished < n_games:
+                    n_finished += 1
+                    self.n_games += 1
+                    yield trajectory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays baseline goodies against baseline sharks.")
+    parser.add_argument("--matches", type=int, default=32, help="matches played side by side")
+    parser.add_argument("--games", type=int, default=64, help="games to finish")
+    parser.add_argument("--level", type=int, default=0, help="level index")
+    parser.add_argument("--dt", type=float, default=0.01, help="tick length in seconds")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the policies")
+    args = parser.parse_args()
+    runner = SelfPlayRunner(
+        Path.cwd(), args.matches, level_idx=args.level, dt=args.dt, seed=args.seed
+    )
+    n_won = sum(trajectory.won for trajectory in runner.run(args.games))
+    print(f"games: {runner.n_games}, goodies won: {n_won}")
+    print(f"decisions: {runner.n_decisions} in {runner.elapsed:.2f}s")
+    print(f"decisions per second per core: {runner.decisions_per_second:.0f}")
+
+
+if __name__ == "__main__":
+    main()
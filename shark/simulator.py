@@ -1,28 +1,185 @@
+"""Headless Monte Carlo simulation of levels, with Lemming goodies against SharkBaseline sharks.
+
+Run with python -m shark.simulator to play many games per level over a
+process pool and watch win rates, times to goal and deaths as they come in.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import random
+from collections import namedtuple
+from pathlib import Path
+import numpy as np
 from .level import LevelLoader
-from .ai import SharkAI, Lemming
+from .env import SharkEnvPlay, is_waiting
+from .ai import SharkBaseline, Lemming
+
+GameResult = namedtuple("GameResult", "level_name game_idx seed won time_elapsed n_deaths")
+
+worker_loader = None
+
+
+def get_game_seed(entropy, level_idx, game_idx):
+    """Seed of one game, drawn from its own SeedSequence stream of the run's entropy."""
+    sequence = np.random.SeedSequence(entropy, spawn_key=(level_idx, game_idx))
+    return int(sequence.generate_state(1, dtype="uint64")[0])
+
+
+def play_game(template, game_idx, seed, dt=0.01, pathfinding=True):
+    """Plays one game of a level to the end and returns its GameResult."""
+    rng = random.Random(seed)
+    level = template.build(pathfinding=pathfinding)
+    env = SharkEnvPlay()
+    shark_ai = SharkBaseline(rng)
+    shark_ai.reset(env.reset(level), level.water_distances)
+    lemming = Lemming(level, rng)
+
+    def until():
+        return lemming.is_waiting(level) or is_waiting(level.baddies)
+
+    result = level.advance_until(dt, until=until)
+    while not result.game_over:
+        lemming.update(level)
+        if is_waiting(level.baddies):
+            env.step(shark_ai.step(env.format_state()))
+        result = level.advance_until(dt, until=until)
+    n_deaths = sum(not goodie.is_alive for goodie in level.goodies)
+    return GameResult(level.name, game_idx, seed, result.won, level.time_elapsed, n_deaths)
+
+
+def init_worker(app_path):
+    global worker_loader
+    worker_loader = LevelLoader(Path(app_path))
+
+
+def play_games(task):
+    """Plays a chunk of games of one level in a pool worker."""
+    level_idx, games, dt, pathfinding = task
+    template = worker_loader.get_template(level_idx)
+    return [play_game(template, game_idx, seed, dt, pathfinding) for game_idx, seed in games]
+
+
+class LevelStats:
+    """Running totals of the games played on one level."""
+
+    def __init__(self, level_name):
+        self.level_name = level_name
+        self.n_games = 0
+        self.n_won = 0
+        self.n_deaths = 0
+        self.time_to_goal = 0.0
+
+    def __repr__(self):
+        return (
+            f"LevelStats(level: {self.level_name}, games: {self.n_games}, "
+            f"win rate: {self.win_rate:.3f}, time to goal: {self.mean_time_to_goal:.2f}, "
+            f"deaths: {self.mean_deaths:.3f})"
+        )
+
+    def add(self, game_result):
+        self.n_games += 1
+        self.n_deaths += game_result.n_deaths
+        if game_result.won:
+            self.n_won += 1
+            self.time_to_goal += game_result.time_elapsed
+
+    @property
+    def win_rate(self):
+        return self.n_won / self.n_games if self.n_games else 0.0
+
+    @property
+    def mean_time_to_goal(self):
+        """Mean time taken by the games the goodies won, nan if none were won."""
+        return self.time_to_goal / self.n_won if self.n_won else float("nan")
+
+    @property
+    def mean_deaths(self):
+        return self.n_deaths / self.n_games if self.n_games else 0.0
 
 
 class Simulator:
-    def __init__(self, app_path):
-        self.app_path = app_path
-        self.level_loader = LevelLoader(app_path)
-        self.dt = 0.01
-
-    def run(self, n_times=1):
-        results = []
-        for i in range(n_times):
-            game_status = self.start_level()
-            while game_status.game_over != True:
-                self.lemming.update(self.level)
-                self.sharkai.update(self.level)
-                game_status = self.level.step(self.dt)
-            print(game_status)
-            results.append(game_status.won)
-        print(sum(results) / len(results))
-
-    def start_level(self):
-        self.level = self.level_loader[0]
-        self.sharkai = SharkAI(self.level)
-        self.lemming = Lemming(self.level)
-        game_status = self.level.step(self.dt)
-        return game_status
+    """Plays n_games of each level, fanned out in chunks over a process pool.
+
+    Every game draws from its own random stream, keyed by the run's seed,
+    level and game index, so results don't depend on the number of workers
+    or the order chunks finish in. With one worker games are played in this
+    process.
+    """
+
+    def __init__(self, app_path, n_workers=None, seed=None, dt=0.01, chunk_size=16, pathfinding=True):
+        self.app_path = Path(app_path)
+        self.level_loader = LevelLoader(self.app_path)
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.entropy = np.random.SeedSequence(seed).entropy
+        self.dt = dt
+        self.chunk_size = chunk_size
+        self.pathfinding = pathfinding
+        self.stats = {}
+
+    def __repr__(self):
+        return f"Simulator(levels: {len(self.level_loader)}, workers: {self.n_workers})"
+
+    def get_tasks(self, n_games, level_indices):
+        tasks = []
+        for level_idx in level_indices:
+            for start in range(0, n_games, self.chunk_size):
+                games = [
+                    (game_idx, get_game_seed(self.entropy, level_idx, game_idx))
+                    for game_idx in range(start, min(start + self.chunk_size, n_games))
+                ]
+                tasks.append((level_idx, games, self.dt, self.pathfinding))
+        return tasks
+
+    def iter_results(self, n_games, level_indices=None):
+        """Plays n_games of each level, yielding GameResults chunk by chunk as they finish."""
+        if level_indices is None:
+            level_indices = range(len(self.level_loader))
+        tasks = self.get_tasks(n_games, level_indices)
+        if self.n_workers == 1:
+            for level_idx, games, dt, pathfinding in tasks:
+                template = self.level_loader.get_template(level_idx)
+                for game_idx, seed in games:
+                    yield play_game(template, game_idx, seed, dt, pathfinding)
+            return
+        with mp.Pool(self.n_workers, initializer=init_worker, initargs=(self.app_path,)) as pool:
+            for results in pool.imap_unordered(play_games, tasks):
+                yield from results
+
+    def run(self, n_games=1, level_indices=None, report_every=None):
+        """Plays n_games of each level and returns the LevelStats by level name.
+
+        Given report_every, the stats of a level are printed every time that
+        many more of its games have finished.
+        """
+        self.stats = {}
+        for game_result in self.iter_results(n_games, level_indices):
+            if game_result.level_name not in self.stats:
+                self.stats[game_result.level_name] = LevelStats(game_result.level_name)
+            stats = self.stats[game_result.level_name]
+            stats.add(game_result)
+            if report_every and stats.n_games % report_every == 0:
+                print(stats, flush=True)
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plays many headless games of each level.")
+    parser.add_argument("--games", type=int, default=100, help="games per level")
+    parser.add_argument("--levels", type=int, nargs="*", default=None, help="level indices")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--seed", type=int, default=None, help="seed of the run")
+    parser.add_argument("--dt", type=float, default=0.01, help="tick length in seconds")
+    parser.add_argument("--chunk", type=int, default=16, help="games per pool task")
+    parser.add_argument("--every", type=int, default=100, help="games between progress reports")
+    args = parser.parse_args()
+    simulator = Simulator(
+        Path.cwd(), n_workers=args.workers, seed=args.seed, dt=args.dt, chunk_size=args.chunk
+    )
+    print(f"seed: {simulator.entropy}")
+    stats = simulator.run(args.games, args.levels, report_every=args.every)
+    for level_stats in stats.values():
+        print(level_stats)
+
+
+if __name__ == "__main__":
+    main()
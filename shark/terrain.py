@@ -0,0 +1,126 @@
+import numpy as np
+from .base import Cell
+from .objects import all_objects, Terrain, Land, UnPassableTerrain
+
+NO_TERRAIN = 0
+WATER = 1
+LAND = 2
+UNPASSABLE = 3
+
+terrain_names = {WATER: "Water", LAND: "Land", UNPASSABLE: "UnPassableTerrain"}
+
+
+def get_terrain_code(object_name):
+    """Returns the integer code of a terrain class name, or None if it isn't terrain."""
+    object_class = all_objects.get(object_name)
+    if object_class is None or not issubclass(object_class, Terrain):
+        return None
+    if issubclass(object_class, UnPassableTerrain):
+        return UNPASSABLE
+    if issubclass(object_class, Land):
+        return LAND
+    return WATER
+
+
+class TerrainLookups:
+    """Typed lookups for anything that maps a cell to a terrain code."""
+
+    def is_terrain(self, cell):
+        return self[cell] != NO_TERRAIN
+
+    def is_water(self, cell):
+        return self[cell] == WATER
+
+    def is_land(self, cell):
+        """True for Land and UnPassableTerrain, as UnPassableTerrain is a Land."""
+        return self[cell] >= LAND
+
+    def is_unpassable(self, cell):
+        return self[cell] == UNPASSABLE
+
+    def is_passable(self, cell):
+        """True for terrain a Goodie can move onto."""
+        return WATER <= self[cell] <= LAND
+
+
+class TerrainMap(TerrainLookups):
+    """Integer coded terrain layer of a level.
+
+    Codes are held in a (rows, cols) uint8 array indexed [y, x], which may be a
+    read-only memory map, and read through a flat memoryview of the same buffer
+    so single cell lookups stay cheap. Cells off the map are NO_TERRAIN.
+    """
+
+    def __init__(self, shape, codes=None):
+        self.shape = tuple(shape)
+        self.rows, self.cols = self.shape
+        if codes is None:
+            codes = np.full(self.shape, WATER, dtype="uint8")
+        self.codes = np.ascontiguousarray(codes, dtype="uint8")
+        self.flat = memoryview(self.codes).cast("B")
+
+    @classmethod
+    def from_spec(cls, shape, terrain):
+        """Builds the map from a level spec's terrain list, filling the rest with Water."""
+        terrain_map = cls(shape)
+        for object_name, kwargs in terrain:
+            code = get_terrain_code(object_name)
+            if code is not None:
+                cell = Cell(round(kwargs.get("x", 0.0)), round(kwargs.get("y", 0.0)))
+                if terrain_map.is_on_map(cell):
+                    terrain_map.set(cell, code)
+        return terrain_map
+
+    def __repr__(self):
+        return f"TerrainMap(shape: {self.shape})"
+
+    def __len__(self):
+        return self.rows * self.cols
+
+    def __iter__(self):
+        return self.keys()
+
+    def __contains__(self, cell):
+        return self.is_on_map(cell)
+
+    def __getitem__(self, cell):
+        x, y = cell
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return self.flat[y * self.cols + x]
+        return NO_TERRAIN
+
+    def keys(self):
+        return (Cell(x, y) for y in range(self.rows) for x in range(self.cols))
+
+    def items(self):
+        return ((cell, self[cell]) for cell in self.keys())
+
+    def is_on_map(self, cell):
+        x, y = cell
+        return 0 <= x < self.cols and 0 <= y < self.rows
+
+    def freeze(self):
+        """Makes the map read-only so levels can share it, returning it."""
+        self.codes.setflags(write=False)
+        self.flat = memoryview(self.codes).cast("B")
+        return self
+
+    @property
+    def is_frozen(self):
+        return not self.codes.flags.writeable
+
+    def copy(self):
+        """Returns a writeable copy of the map."""
+        return TerrainMap(self.shape, self.codes.copy())
+
+    def set(self, cell, code):
+        x, y = cell
+        self.codes[y, x] = code
+
+    def mask(self, code):
+        """Returns a (rows, cols) bool array of cells holding the given code."""
+        return self.codes == code
+
+    def cells_of(self, code):
+        rows, cols = np.nonzero(self.codes == code)
+        return [Cell(int(x), int(y)) for y, x in zip(rows, cols)]
@@ -0,0 +1,144 @@
+import bisect
+from collections import namedtuple
+from .base import Cell, TICK_LENGTH
+
+Keyframe = namedtuple("Keyframe", "tick snapshot n_events")
+
+DEFAULT_TICK_LENGTH = TICK_LENGTH
+
+
+def never():
+    return False
+
+
+def get_tick_length(replay, default=DEFAULT_TICK_LENGTH):
+    """The tick length of a replay played at a fixed dt: the one it recorded, or one from its totals.
+
+    Summing ticks drifts total_time a little off n_updates * dt, so the
+    quotient is rounded to 9 significant digits. An unfinished replay with
+    no recorded dt has no totals either and gets default, the game's tick.
+    """
+    if replay.dt is not None:
+        return replay.dt
+    if not replay.n_updates:
+        return default
+    return float(f"{replay.total_time / replay.n_updates:.9g}")
+
+
+class ReplayTimeline:
+    """Plays a replay through a Level, seeking to any tick through periodic keyframes.
+
+    Each event is applied at the first tick boundary its time falls on,
+    which is the point of the game it was recorded at, and the ticks in
+    between are run with advance_until. Every keyframe_interval ticks the
+    level is snapshotted the first time playback gets there, so seeking
+    restores the nearest keyframe before the target and re-simulates at
+    most keyframe_interval ticks, however long the match. Events are pulled
+    from the replay only as playback reaches them.
+    """
+
+    def __init__(self, template, replay, keyframe_interval=250, dt=None):
+        self.replay = replay
+        self.level = template.build(pathfinding=replay.pathfinding)
+        self.dt = get_tick_length(replay) if dt is None else dt
+        self.keyframe_interval = keyframe_interval
+        self.event_iter = iter(replay)
+        self.events = []
+        self.n_events = 0
+        self.keyframes = []
+        self.keyframe_ticks = []
+        self._last_tick = None
+        self.add_keyframe()
+
+    def __repr__(self):
+        return f"ReplayTimeline(level: {self.level.name}, tick: {self.tick}, keyframes: {len(self.keyframes)})"
+
+    @property
+    def tick(self):
+        return self.level.n_updates
+
+    @property
+    def time(self):
+        return self.level.time_elapsed
+
+    @property
+    def is_over(self):
+        return self.level.result.game_over
+
+    @property
+    def last_tick(self):
+        """The last tick the replay reached: n_updates, or the tick of an unfinished one's last event."""
+        if self._last_tick is None:
+            if self.replay.n_updates is not None:
+                self._last_tick = self.replay.n_updates
+            else:
+                self.events.extend(self.event_iter)
+                self._last_tick = round(self.events[-1].time / self.dt) if self.events else 0
+        return self._last_tick
+
+    def peek_event(self):
+        if self.n_events == len(self.events):
+            event = next(self.event_iter, None)
+            if event is None:
+                return None
+            self.events.append(event)
+        return self.events[self.n_events]
+
+    def apply_events(self):
+        """Applies every event due at the current tick boundary."""
+        level = self.level
+        due = level.time_elapsed + self.dt / 2
+        event = self.peek_event()
+        while event is not None and event.time <= due:
+            level.update(level.characters[event.character_index], Cell(event.x, event.y))
+            self.n_events += 1
+            event = self.peek_event()
+
+    def add_keyframe(self):
+        if self.tick % self.keyframe_interval == 0 and self.tick > self.last_keyframe_tick:
+            self.keyframes.append(Keyframe(self.tick, self.level.snapshot(), self.n_events))
+            self.keyframe_ticks.append(self.tick)
+
+    @property
+    def last_keyframe_tick(self):
+        return self.keyframe_ticks[-1] if self.keyframe_ticks else -1
+
+    def advance(self, target):
+        """Plays forward until tick target or the end of the game, returning the level's result."""
+        level = self.level
+        while self.tick < target and not self.is_over:
+            self.apply_events()
+            next_keyframe = (self.tick // self.keyframe_interval + 1) * self.keyframe_interval
+            n_ticks = min(target, next_keyframe) - self.tick
+            event = self.peek_event()
+            if event is not None:
+                n_ticks = min(n_ticks, max(1, int((event.time - level.time_elapsed) / self.dt)))
+            level.advance_until(self.dt, max_ticks=n_ticks, until=never)
+            self.add_keyframe()
+        return level.result
+
+    def seek(self, tick):
+        """Moves to tick, from the current state if it's close ahead, else from the nearest keyframe.
+
+        The tick is clamped to the ones the replay covers.
+        """
+        tick = min(max(0, tick), self.last_tick)
+        if tick < self.tick or tick - self.tick > self.keyframe_interval:
+            idx = bisect.bisect_right(self.keyframe_ticks, tick) - 1
+            keyframe = self.keyframes[idx]
+            if keyframe.tick > self.tick or tick < self.tick:
+                self.level.restore(keyframe.snapshot)
+                self.n_events = keyframe.n_events
+        return self.advance(tick)
+
+    def seek_time(self, seconds):
+        return self.seek(round(seconds / self.dt))
+
+    def step_back(self, n_ticks=1):
+        return self.seek(self.tick - n_ticks)
+
+    def build_keyframes(self):
+        """Plays to the end so every keyframe exists, then returns to the current tick."""
+        tick = self.tick
+        self.advance(self.last_tick)
+        return self.seek(tick)
@@ -0,0 +1,200 @@
+import ctypes
+import os
+import traceback
+import multiprocessing as mp
+from pathlib import Path
+import numpy as np
+from .env import SharkEnvTrain
+
+
+def get_shared_array(raw, shape, dtype):
+    return np.frombuffer(raw, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+
+
+class SharedArrays:
+    """The observation, reward, done and action arrays of a SharkVecEnv in shared memory.
+
+    Only the raw buffers and shapes are handed to workers, which map the same
+    memory as numpy arrays; nothing but short commands crosses the pipes.
+    """
+
+    def __init__(self, ctx, n_envs, layout_shape, info_size, n_sharks):
+        self.specs = {
+            "layouts": ((n_envs,) + tuple(layout_shape), "bool"),
+            "infos": ((n_envs, info_size), "float32"),
+            "rewards": ((n_envs,), "float64"),
+            "dones": ((n_envs,), "bool"),
+            "actions": ((n_envs, n_sharks), "int64"),
+        }
+        self.raw = {
+            name: ctx.RawArray(ctypes.c_uint8, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            for name, (shape, dtype) in self.specs.items()
+        }
+        self.map()
+
+    def map(self):
+        for name, (shape, dtype) in self.specs.items():
+            setattr(self, name, get_shared_array(self.raw[name], shape, dtype))
+
+    def __getstate__(self):
+        return {"specs": self.specs, "raw": self.raw}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.map()
+
+
+def run_worker(conn, arrays, app_path, level_idx, dt, start, stop):
+    """Steps the envs start to stop, writing straight into the shared arrays."""
+    try:
+        envs = [
+            SharkEnvTrain(
+                app_path,
+                level_idx,
+                dt,
+                views=True,
+                buffers=(arrays.layouts[i], arrays.infos[i]),
+            )
+            for i in range(start, stop)
+        ]
+        conn.send(("ready", None))
+        while True:
+            command = conn.recv()
+            if command == "step":
+                infos = []
+                for i, env in enumerate(envs, start):
+                    _, reward, game_over, info = env.step(arrays.actions[i])
+                    if game_over:
+                        env.reset()
+                    arrays.rewards[i] = reward
+                    arrays.dones[i] = game_over
+                    infos.append(info)
+                conn.send(("ok", infos))
+            elif command == "reset":
+                for i, env in enumerate(envs, start):
+                    env.reset()
+                    arrays.rewards[i] = 0
+                    arrays.dones[i] = False
+                conn.send(("ok", None))
+            elif command == "close":
+                conn.send(("ok", None))
+                break
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class SharkVecEnv:
+    """Many SharkEnvTrain instances sharded over worker processes.
+
+    Observations are the SharkEnvPlay (layout, shark_info) pair stacked over
+    envs, (n_envs, 3, rows, cols) and (n_envs, 3 * n_sharks + 1), and actions
+    are (n_envs, n_sharks) Movements codes. Workers write observations,
+    rewards and dones into shared memory, so the arrays returned are views of
+    it that the next step or reset overwrites. An env whose game is over is
+    reset straight away and its next observation is the new game's first.
+    """
+
+    def __init__(self, app_path, n_envs, n_workers=None, level_idx=0, dt=0.01, start_method=None):
+        self.app_path = Path(app_path)
+        self.n_envs = n_envs
+        self.n_workers = min(n_envs, n_workers or os.cpu_count() or 1)
+        probe = SharkEnvTrain(self.app_path, level_idx, dt)
+        layout, info = probe.reset()
+        self.n_sharks = probe.n_sharks
+        ctx = mp.get_context(start_method)
+        self.arrays = SharedArrays(ctx, n_envs, layout.shape, info.shape[0], self.n_sharks)
+        self.connections = []
+        self.workers = []
+        bounds = np.linspace(0, n_envs, self.n_workers + 1).astype("int64")
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            parent_conn, child_conn = ctx.Pipe()
+            worker = ctx.Process(
+                target=run_worker,
+                args=(child_conn, self.arrays, self.app_path, level_idx, dt, start, stop),
+                daemon=True,
+            )
+            worker.start()
+            child_conn.close()
+            self.connections.append(parent_conn)
+            self.workers.append(worker)
+        self.waiting = False
+        self.closed = False
+        self.receive()
+
+    def __repr__(self):
+        return f"SharkVecEnv(n_envs: {self.n_envs}, n_workers: {self.n_workers})"
+
+    def __len__(self):
+        return self.n_envs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def send(self, command):
+        if self.waiting:
+            raise RuntimeError("the previous step or reset hasn't been waited for")
+        for conn in self.connections:
+            conn.send(command)
+        self.waiting = True
+
+    def receive(self):
+        results = []
+        for conn in self.connections:
+            status, result = conn.recv()
+            if status == "error":
+                self.waiting = False
+                raise RuntimeError(f"SharkVecEnv worker failed:\n{result}")
+            results.append(result)
+        self.waiting = False
+        return results
+
+    def get_obs(self):
+        return [self.arrays.layouts, self.arrays.infos]
+
+    def reset_async(self):
+        self.send("reset")
+
+    def reset_wait(self):
+        self.receive()
+        return self.get_obs()
+
+    def reset(self):
+        self.reset_async()
+        return self.reset_wait()
+
+    def step_async(self, actions):
+        """Starts stepping every env with actions, (n_envs, n_sharks) Movements codes."""
+        if self.waiting:
+            raise RuntimeError("the previous step or reset hasn't been waited for")
+        self.arrays.actions[...] = actions
+        self.send("step")
+
+    def step_wait(self):
+        """Returns (observation, rewards, dones, infos) once every worker has stepped."""
+        infos = [info for worker_infos in self.receive() for info in worker_infos]
+        return self.get_obs(), self.arrays.rewards, self.arrays.dones, infos
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self.receive()
+        for conn in self.connections:
+            conn.send("close")
+        for conn, worker in zip(self.connections, self.workers):
+            try:
+                conn.recv()
+            except EOFError:
+                pass
+            worker.join()
+            conn.close()
+        self.closed = True
@@ -0,0 +1,143 @@
+"""Headless replay verification: re-simulate saved logs and check they end as recorded.
+
+Run with python -m shark.verify [logs or folders] as a regression gate after
+changing simulation code; it exits with status 1 if any replay diverges.
+Logs that record neither an outcome nor a state digest, like those saved
+before either was logged, are reported as unverifiable rather than passed.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+from .level import LevelLoader
+from .replaylog import open_replay, REPLAY_SUFFIX
+from .timeline import ReplayTimeline
+
+VerifyResult = namedtuple(
+    "VerifyResult",
+    "path name passed n_updates expected_n_updates total_time expected_total_time won expected_won"
+    " digest expected_digest message",
+)
+
+log_suffixes = (".json", REPLAY_SUFFIX)
+
+worker_loader = None
+
+
+def verify_replay(level_loader, path, time_tolerance=1e-6):
+    """Plays the replay at path to the end and compares its result with the recorded one.
+
+    A game quit before it was over has no outcome, so it's only played to
+    the tick it was quit on. The result's passed is None when the replay
+    plays through but records nothing to check the end state against.
+    """
+    try:
+        replay = open_replay(path)
+        if not replay.is_complete:
+            return failed_result(path, replay.name, "the replay has no end")
+        template = level_loader.get_template(replay.name)
+        timeline = ReplayTimeline(template, replay, keyframe_interval=replay.n_updates + 1)
+        result = timeline.advance(float("inf") if replay.won is not None else replay.n_updates)
+        if not timeline.is_over:
+            timeline.apply_events()
+        digest = timeline.level.get_digest()
+    except Exception as error:
+        return failed_result(path, None, f"{type(error).__name__}: {error}")
+    problems = []
+    if timeline.tick != replay.n_updates:
+        problems.append(f"n_updates {timeline.tick} != {replay.n_updates}")
+    if abs(timeline.time - replay.total_time) > time_tolerance * max(1.0, abs(replay.total_time)):
+        problems.append(f"total_time {timeline.time} != {replay.total_time}")
+    if replay.won is not None and result.won != replay.won:
+        problems.append(f"won {result.won} != {replay.won}")
+    if replay.digest is not None and digest != replay.digest:
+        problems.append(f"state digest {digest} != {replay.digest}")
+    if timeline.peek_event() is not None:
+        problems.append(f"only {timeline.n_events} events applied")
+    passed = not problems
+    if passed and replay.won is None and replay.digest is None:
+        passed = None
+        problems.append("the log records no outcome or state digest")
+    return VerifyResult(
+        str(path),
+        replay.name,
+        passed,
+        timeline.tick,
+        replay.n_updates,
+        timeline.time,
+        replay.total_time,
+        result.won,
+        replay.won,
+        digest,
+        replay.digest,
+        "; ".join(problems),
+    )
+
+
+def failed_result(path, name, message):
+    return VerifyResult(str(path), name, False, None, None, None, None, None, None, None, None, message)
+
+
+def init_worker(app_path):
+    global worker_loader
+    worker_loader = LevelLoader(Path(app_path))
+
+
+def verify_in_worker(path):
+    return verify_replay(worker_loader, path)
+
+
+def find_logs(paths):
+    """Expands folders into the JSON logs and binary replays inside them."""
+    logs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            logs += sorted(p for p in path.rglob("*") if p.suffix in log_suffixes)
+        else:
+            logs.append(path)
+    return logs
+
+
+def verify_replays(app_path, paths, n_workers=None, chunk_size=8):
+    """Verifies every log, over a process pool, yielding VerifyResults as they come in."""
+    paths = [str(path) for path in paths]
+    n_workers = min(n_workers or os.cpu_count() or 1, max(len(paths), 1))
+    if n_workers == 1:
+        level_loader = LevelLoader(Path(app_path))
+        for path in paths:
+            yield verify_replay(level_loader, path)
+        return
+    with mp.Pool(n_workers, initializer=init_worker, initargs=(str(app_path),)) as pool:
+        yield from pool.imap_unordered(verify_in_worker, paths, chunksize=chunk_size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-simulates replays and checks their outcomes.")
+    parser.add_argument("paths", nargs="*", default=["."], help="logs, replays or folders of them")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes")
+    parser.add_argument("--chunk", type=int, default=8, help="replays per pool task")
+    args = parser.parse_args()
+    logs = find_logs(args.paths)
+    start = time.perf_counter()
+    n_failed = n_unverifiable = 0
+    for result in verify_replays(Path.cwd(), logs, args.workers, args.chunk):
+        if result.passed is None:
+            n_unverifiable += 1
+            print(f"UNVERIFIABLE {result.path}: {result.message}", flush=True)
+        elif not result.passed:
+            n_failed += 1
+            print(f"FAILED {result.path}: {result.message}", flush=True)
+    elapsed = time.perf_counter() - start
+    print(
+        f"verified {len(logs)} replays in {elapsed:.2f}s,"
+        f" {n_failed} failed, {n_unverifiable} unverifiable"
+    )
+    if n_failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+from collections import defaultdict
+import numpy as np
+
+GOODIES = 0
+BADDIES = 1
+
+
+class Visibility:
+    """Tracks which characters can be seen by the other side.
+
+    Each side keeps a coverage grid counting how many of its living characters
+    can see every cell, and a spatial index bucketing its characters by cell.
+    Only characters that changed cell or died since the last update move their
+    coverage, and only targets in the buckets that coverage touched, or that
+    moved themselves, have is_visible recomputed.
+    """
+
+    def __init__(self, goodies, baddies, shape, bucket_size=8):
+        self.shape = tuple(shape)
+        self.rows, self.cols = self.shape
+        self.bucket_size = bucket_size
+        self.groups = (goodies, baddies)
+        self.rebuild()
+
+    def __repr__(self):
+        return f"Visibility(shape: {self.shape}, bucket_size: {self.bucket_size})"
+
+    def rebuild(self):
+        """Indexes every character from scratch, marking them all to be recomputed."""
+        self.coverage = [np.zeros(self.shape, dtype="int16") for _ in self.groups]
+        self.buckets = [defaultdict(set) for _ in self.groups]
+        self.cells = [[] for _ in self.groups]
+        self.alive = [[] for _ in self.groups]
+        self.dirty = [set(range(len(group))) for group in self.groups]
+        for side, group in enumerate(self.groups):
+            for idx, character in enumerate(group):
+                cell = character.cell
+                is_alive = character.is_alive
+                self.cells[side].append(cell)
+                self.alive[side].append(is_alive)
+                self.buckets[side][self.get_bucket(cell)].add(idx)
+                if is_alive:
+                    self.cover(side, cell, character.visible_distance, 1)
+
+    @property
+    def seen_by_goodies(self):
+        """(rows, cols) bool array of the cells at least one living goodie can see."""
+        return self.coverage[GOODIES] > 0
+
+    @property
+    def seen_by_baddies(self):
+        """(rows, cols) bool array of the cells at least one living baddie can see."""
+        return self.coverage[BADDIES] > 0
+
+    def get_bucket(self, cell):
+        return (cell[0] // self.bucket_size, cell[1] // self.bucket_size)
+
+    def update(self):
+        """Moves changed spotters then sets is_visible on every target that could be affected."""
+        self.sync()
+        for side, group in enumerate(self.groups):
+            coverage = self.coverage[1 - side]
+            for idx in self.dirty[side]:
+                x, y = self.cells[side][idx]
+                is_on_map = 0 <= x < self.cols and 0 <= y < self.rows
+                group[idx].is_visible = bool(is_on_map and coverage[y, x] > 0)
+            self.dirty[side].clear()
+
+    def sync(self):
+        """Moves the coverage of characters that changed cell or died since the last sync."""
+        for side, group in enumerate(self.groups):
+            for idx, character in enumerate(group):
+                cell = character.cell
+                is_alive = character.is_alive
+                if cell != self.cells[side][idx] or is_alive != self.alive[side][idx]:
+                    self.move(side, idx, character, cell, is_alive)
+
+    def mark_dirty(self):
+        """Has the next update recompute is_visible for every character."""
+        for side, group in enumerate(self.groups):
+            self.dirty[side].update(range(len(group)))
+
+    def move(self, side, idx, character, cell, is_alive):
+        old_cell = self.cells[side][idx]
+        distance = character.visible_distance
+        if self.alive[side][idx]:
+            self.cover(side, old_cell, distance, -1)
+        if is_alive:
+            self.cover(side, cell, distance, 1)
+        if cell != old_cell:
+            self.buckets[side][self.get_bucket(old_cell)].discard(idx)
+            self.buckets[side][self.get_bucket(cell)].add(idx)
+            self.dirty[side].add(idx)
+        self.cells[side][idx] = cell
+        self.alive[side][idx] = is_alive
+
+    def cover(self, side, cell, distance, change):
+        """Adds change to the coverage square around cell and dirties the other side's targets in it."""
+        x, y = cell
+        x_min = max(0, x - distance)
+        x_max = min(self.cols, x + distance + 1)
+        y_min = max(0, y - distance)
+        y_max = min(self.rows, y + distance + 1)
+        if x_min >= x_max or y_min >= y_max:
+            return
+        self.coverage[side][y_min:y_max, x_min:x_max] += change
+        buckets = self.buckets[1 - side]
+        dirty = self.dirty[1 - side]
+        for bucket_x in range(x_min // self.bucket_size, (x_max - 1) // self.bucket_size + 1):
+            for bucket_y in range(y_min // self.bucket_size, (y_max - 1) // self.bucket_size + 1):
+                targets = buckets.get((bucket_x, bucket_y))
+                if targets:
+                    dirty.update(targets)
@@ -0,0 +1,181 @@
+from collections import OrderedDict
+import numpy as np
+from .terrain import WATER
+
+UNREACHABLE = -1
+
+
+def dilate(mask):
+    """Grows the True cells of the last two axes of mask into their 8 neighbours."""
+    grown = mask.copy()
+    grown[..., 1:, :] |= mask[..., :-1, :]
+    grown[..., :-1, :] |= mask[..., 1:, :]
+    rows_grown = grown.copy()
+    grown[..., :, 1:] |= rows_grown[..., :, :-1]
+    grown[..., :, :-1] |= rows_grown[..., :, 1:]
+    return grown
+
+
+def get_bfs_distances(passable, sources):
+    """Returns (len(sources), rows, cols) int16 step counts over the 8-connected passable cells.
+
+    All sources are searched together a ring at a time; cells a source can't
+    reach, and sources that aren't passable, read UNREACHABLE.
+    """
+    shape = (len(sources),) + passable.shape
+    distances = np.full(shape, UNREACHABLE, dtype="int16")
+    frontier = np.zeros(shape, dtype="bool")
+    for i, (x, y) in enumerate(sources):
+        frontier[i, y, x] = passable[y, x]
+    reached = frontier.copy()
+    distance = 0
+    while frontier.any():
+        distances[frontier] = distance
+        distance += 1
+        frontier = dilate(frontier) & passable & ~reached
+        reached |= frontier
+    return distances
+
+
+class WaterDistances:
+    """Shortest swimming distances between the water cells of a level.
+
+    Components label every water cell with the pool it belongs to, so
+    is_reachable is a pair of lookups. Distance fields count the 8-connected
+    steps a shark takes. Maps with up to all_pairs_limit water cells search
+    every source at once on first use; bigger ones search each source on
+    demand, over just the bounding box of its pool, and keep the cache_size
+    most recent fields. That cache only pays off while sources stay put: a
+    shark that changes cell every step misses it and pays one search of its
+    pool. Everything is built lazily, so levels can share one instance cheaply.
+    """
+
+    def __init__(self, terrain, all_pairs_limit=1024, cache_size=256):
+        self.water = terrain.mask(WATER)
+        self.rows, self.cols = self.water.shape
+        self.n_water = int(self.water.sum())
+        self.all_pairs_limit = all_pairs_limit
+        self.cache_size = cache_size
+        self._components = None
+        self.n_components = None
+        self.bounds = None
+        self.water_index = None
+        self.all_pairs = None
+        self.fields = OrderedDict()
+
+    def __repr__(self):
+        return f"WaterDistances(shape: {(self.rows, self.cols)}, water: {self.n_water})"
+
+    @property
+    def uses_all_pairs(self):
+        return self.n_water <= self.all_pairs_limit
+
+    @property
+    def components(self):
+        """(rows, cols) int32 component label of every water cell, UNREACHABLE elsewhere."""
+        if self._components is None:
+            self._components = self.label_components()
+        return self._components
+
+    def label_components(self):
+        """Labels the 8-connected pools of water, numbered in row-major order of their first cell.
+
+        Every pair of neighbouring water cells links the roots of its two
+        cells to the lower one, then pointers are jumped until each cell
+        points at its root, the pool's lowest flat index. Each round is one
+        vectorised pass over the pairs and a few rounds settle any map.
+        """
+        water = self.water
+        index = np.arange(water.size).reshape(water.shape)
+        pairs = [
+            (np.s_[:, :-1], np.s_[:, 1:]),
+            (np.s_[:-1, :], np.s_[1:, :]),
+            (np.s_[:-1, :-1], np.s_[1:, 1:]),
+            (np.s_[:-1, 1:], np.s_[1:, :-1]),
+        ]
+        links = [water[first] & water[second] for first, second in pairs]
+        starts = np.concatenate([index[first][link] for (first, _), link in zip(pairs, links)])
+        ends = np.concatenate([index[second][link] for (_, second), link in zip(pairs, links)])
+        parent = index.ravel().copy()
+        while True:
+            start_roots, end_roots = parent[starts], parent[ends]
+            differ = start_roots != end_roots
+            if not differ.any():
+                break
+            start_roots, end_roots = start_roots[differ], end_roots[differ]
+            np.minimum.at(
+                parent,
+                np.maximum(start_roots, end_roots),
+                np.minimum(start_roots, end_roots),
+            )
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+        roots, labels = np.unique(parent.reshape(water.shape)[water], return_inverse=True)
+        components = np.full(water.shape, UNREACHABLE, dtype="int32")
+        components[water] = labels
+        self.n_components = len(roots)
+        ys, xs = np.nonzero(water)
+        self.bounds = np.zeros((len(roots), 4), dtype="int64")
+        self.bounds[:, :2] = max(self.rows, self.cols)
+        np.minimum.at(self.bounds[:, 0], labels, ys)
+        np.minimum.at(self.bounds[:, 1], labels, xs)
+        np.maximum.at(self.bounds[:, 2], labels, ys + 1)
+        np.maximum.at(self.bounds[:, 3], labels, xs + 1)
+        return components
+
+    def component(self, cell):
+        x, y = cell
+        if 0 <= x < self.cols and 0 <= y < self.rows:
+            return int(self.components[y, x])
+        return UNREACHABLE
+
+    def is_reachable(self, start, end):
+        """True if a shark in start can swim to end."""
+        label = self.component(start)
+        return label != UNREACHABLE and label == self.component(end)
+
+    def field(self, cell):
+        """(rows, cols) int16 swimming distances from cell, UNREACHABLE where it can't reach."""
+        x, y = cell
+        if not (0 <= x < self.cols and 0 <= y < self.rows and self.water[y, x]):
+            return np.full(self.water.shape, UNREACHABLE, dtype="int16")
+        if self.uses_all_pairs:
+            if self.all_pairs is None:
+                self.build_all_pairs()
+            return self.all_pairs[self.water_index[y, x]]
+        key = (int(x), int(y))
+        if key in self.fields:
+            self.fields.move_to_end(key)
+        else:
+            field = self.search_pool(*key)
+            field.setflags(write=False)
+            self.fields[key] = field
+            if len(self.fields) > self.cache_size:
+                self.fields.popitem(last=False)
+        return self.fields[key]
+
+    def search_pool(self, x, y):
+        """Searches from (x, y) over only the bounding box of its pool."""
+        label = self.components[y, x]
+        y_min, x_min, y_max, x_max = self.bounds[label]
+        pool = self.components[y_min:y_max, x_min:x_max] == label
+        field = np.full(self.water.shape, UNREACHABLE, dtype="int16")
+        field[y_min:y_max, x_min:x_max] = get_bfs_distances(pool, [(x - x_min, y - y_min)])[0]
+        return field
+
+    def build_all_pairs(self):
+        ys, xs = np.nonzero(self.water)
+        self.water_index = np.full(self.water.shape, UNREACHABLE, dtype="int32")
+        self.water_index[ys, xs] = np.arange(len(xs))
+        self.all_pairs = get_bfs_distances(self.water, list(zip(xs, ys)))
+        self.all_pairs.setflags(write=False)
+
+    def distance(self, start, end):
+        """Swimming steps from start to end, UNREACHABLE if there's no way through."""
+        if not self.is_reachable(start, end):
+            return UNREACHABLE
+        x, y = end
+        return int(self.field(start)[y, x])
@@ -1,6 +1,9 @@
 from pathlib import Path
 from shark.simulator import Simulator
 
-cwd = Path.cwd()
-sim = Simulator(cwd)
-sim.run(20)
+
+if __name__ == "__main__":
+    cwd = Path.cwd()
+    sim = Simulator(cwd, seed=0)
+    for stats in sim.run(20).values():
+        print(stats)
@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import numpy as np
+
+from shark.ai import SharkBaseline, BatchSharkBaseline
+from shark.batch import BatchLevel
+from shark.level import LevelLoader
+
+
+def get_state(shark_cells, goodie_cells, shape=(8, 8)):
+    rows, cols = shape
+    layout = np.zeros((3, rows, cols), dtype="bool")
+    layout[0] = True
+    layout[0, 0, 3:] = False
+    info = np.zeros(3 * len(shark_cells) + 1, dtype="float32")
+    for x, y in goodie_cells:
+        layout[1, x, y] = True
+    for i, (x, y) in enumerate(shark_cells):
+        layout[2, x, y] = True
+        info[3 * i + 1] = x / cols
+        info[3 * i + 2] = y / rows
+    return [layout, info]
+
+
+def stack(states):
+    return [np.stack([state[0] for state in states]), np.stack([state[1] for state in states])]
+
+
+def test_batch_baseline_matches_baseline_when_chasing():
+    states = [
+        get_state([(1, 1), (5, 6)], [(3, 3)]),
+        get_state([(0, 2), (6, 6)], [(0, 7), (7, 0)]),
+        get_state([(2, 1), (4, 4)], [(5, 0)]),
+    ]
+    batch = BatchSharkBaseline(seed=0)
+    batch.reset(stack(states))
+    actions = batch.step(stack(states))
+    for state, batch_actions in zip(states, actions):
+        baseline = SharkBaseline()
+        baseline.reset(state)
+        assert baseline.step(state) == list(batch_actions)
+
+
+def test_batch_baseline_is_seeded():
+    level = LevelLoader(Path.cwd())[0]
+    state = BatchLevel(level, 16).format_shark_state()
+    first, second = BatchSharkBaseline(seed=3), BatchSharkBaseline(seed=3)
+    first.reset(state)
+    second.reset(state)
+    for i in range(5):
+        assert np.array_equal(first.step(state), second.step(state))
+
+
+def test_batch_baseline_does_not_revisit():
+    batch = BatchSharkBaseline(seed=0)
+    state = stack([get_state([(2, 2)], [(2, 6)])])
+    batch.reset(state)
+    assert batch.step(state)[0, 0] == 0  # north, towards the goodie
+    moved = stack([get_state([(2, 3)], [(2, 0)])])
+    assert batch.step(moved)[0, 0] != 1  # south would go back to (2, 2)
@@ -0,0 +1,51 @@
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from shark.atlas import pack_shelves, load_atlas, get_atlas_key
+from shark.render import ImageLoader
+
+
+def test_pack_shelves_places_without_overlap():
+    sizes = [(30, 10), (50, 40), (20, 40), (60, 25), (64, 64)]
+    places, n_pages = pack_shelves(sizes, max_size=64, padding=1)
+    assert n_pages == 4 and places[4] == (0, 0, 0)
+    for i, ((page, x, y), (w, h)) in enumerate(zip(places, sizes)):
+        assert x + w <= 64 and y + h <= 64
+        for (other_page, ox, oy), (ow, oh) in zip(places[i + 1 :], sizes[i + 1 :]):
+            if other_page == page:
+                assert x + w <= ox or ox + ow <= x or y + h <= oy or oy + oh <= y
+
+
+def test_atlas_is_cached_until_a_sheet_changes(tmp_path):
+    graphics = Path.cwd() / "shark" / "graphics"
+    for name in ["Land.png", "Shark.png", "OrangeBig.png"]:
+        shutil.copy(graphics / name, tmp_path / name)
+    paths = sorted(tmp_path.glob("*.png"))
+    atlas = load_atlas(tmp_path / "atlas", paths)
+    key = get_atlas_key(paths)
+    assert (tmp_path / "atlas" / (key + ".json")).exists()
+    assert not list((tmp_path / "atlas").glob("*.tmp"))
+    cached = load_atlas(tmp_path / "atlas", paths)
+    assert cached.table == atlas.table
+    assert np.array_equal(cached.get_pixels("Shark.png"), atlas.get_pixels("Shark.png"))
+    (tmp_path / "Land.png").write_bytes((graphics / "Water.png").read_bytes())
+    assert get_atlas_key(paths) != key
+
+
+def test_atlas_is_packed_without_a_writable_cache(tmp_path):
+    graphics = Path.cwd() / "shark" / "graphics"
+    (tmp_path / "read_only").write_text("not a folder")
+    atlas = load_atlas(tmp_path / "read_only" / "atlas", [graphics / "Shark.png"])
+    assert "Shark.png" in atlas
+
+
+def test_image_loader_loads_lazily():
+    loader = ImageLoader(Path.cwd())
+    assert len(loader) > 0 and "Shark_swim_west" in loader
+    assert loader._atlas is None and not loader.imgs
+    animation = loader["Shark_swim_west"]
+    assert len(animation.frames) == 2 and list(loader.imgs) == ["Shark_swim_west"]
+    assert loader.get_pixels("Land_south").shape == (24, 24, 4)
+    assert len(loader.atlas.pages) == 1
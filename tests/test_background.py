@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import numpy as np
+
+from shark.background import composite_terrain, TerrainBaker
+from shark.level import LevelLoader
+from shark.render import ImageLoader
+
+
+def test_composite_terrain_lays_out_tiles():
+    codes = np.array([[1, 2], [0, 1]], dtype="uint8")
+    tiles = {1: np.full((2, 2, 4), 10, dtype="uint8"), 2: np.full((2, 2, 4), 20, dtype="uint8")}
+    pixels = composite_terrain(codes, tiles, 2)
+    assert pixels.shape == (4, 4, 4)
+    assert (pixels[:2, :2] == 10).all() and (pixels[:2, 2:] == 20).all()
+    assert (pixels[2:, :2] == 0).all() and (pixels[2:, 2:] == 10).all()
+
+
+def test_baked_terrain_is_cached_per_level(tmp_path):
+    baker = TerrainBaker(ImageLoader(Path.cwd()), 24)
+    baker.folder = tmp_path
+    level = LevelLoader(Path.cwd())[0]
+    pixels = baker.get_pixels(level)
+    assert pixels.shape == (32 * 24, 32 * 24, 4)
+    path = baker.get_cache_path(level)
+    assert path.exists() and np.array_equal(np.load(path), pixels)
+    assert list(tmp_path.iterdir()) == [path]
+    level.terrain = level.terrain.copy()
+    level.terrain.set((0, 0), 2 if level.terrain[(0, 0)] != 2 else 1)
+    assert baker.get_cache_path(level) != path
+
+
+def test_terrain_is_baked_without_a_writable_cache(tmp_path):
+    baker = TerrainBaker(ImageLoader(Path.cwd()), 24)
+    (tmp_path / "read_only").write_text("not a folder")
+    baker.folder = tmp_path / "read_only" / "baked"
+    level = LevelLoader(Path.cwd())[0]
+    assert baker.get_pixels(level).shape == (32 * 24, 32 * 24, 4)
@@ -9,6 +9,7 @@ from shark.base import (
     Compass_eight,
     Compass_four,
     Timer,
+    FixedTimestep,
 )
 
 
@@ -109,3 +110,9 @@ def test_timer():
     for i in range(n_iter):
         total += int(timer(dt))
     assert int((dt * n_iter) / interval) == total
+
+
+def test_fixed_timestep_carries_leftover_time():
+    timestep = FixedTimestep(0.25, max_ticks=3)
+    assert [timestep(dt) for dt in (0.2, 0.2, 0.2, 0.5, 0.1)] == [0, 1, 1, 2, 0]
+    assert timestep(5.0) == 3 and timestep.leftover == 0.0
@@ -0,0 +1,53 @@
+from pathlib import Path
+import numpy as np
+
+from shark.level import LevelLoader
+from shark.batch import BatchLevel
+from shark.base import Cell
+from shark.env import SharkEnvPlay
+
+
+def get_level():
+    return LevelLoader(Path.cwd())[0]
+
+
+def test_batch_level_shapes():
+    batch = BatchLevel(get_level(), 3)
+    assert batch.x.shape == (3, len(get_level().characters))
+    assert not batch.game_over.any()
+
+
+def test_batch_level_matches_level():
+    level = get_level()
+    batch = BatchLevel(get_level(), 2)
+    goals = [Cell(5, 5), Cell(1, 6), Cell(20, 20), Cell(0, 2), Cell(16, 18)]
+    for idx, cell in enumerate(goals):
+        level.update(level.characters[idx], cell)
+        batch.move_to(idx, cell.x, cell.y)
+    for i in range(300):
+        level.step(0.01)
+        batch.step(0.01)
+    for idx, character in enumerate(level.characters):
+        assert np.all(batch.x[:, idx] == character.x)
+        assert np.all(batch.y[:, idx] == character.y)
+        assert np.all(batch.health[:, idx] == character.current_health)
+        assert np.all(batch.visible[:, idx] == character.is_visible)
+
+
+def test_batch_level_shark_state():
+    level = get_level()
+    batch = BatchLevel(get_level(), 2)
+    layout, shark_info = SharkEnvPlay().reset(level)
+    batch_layout, batch_shark_info = batch.format_shark_state()
+    assert np.array_equal(batch_layout[1], layout)
+    assert np.array_equal(batch_shark_info[0], shark_info)
+
+
+def test_batch_level_reset_single_game():
+    batch = BatchLevel(get_level(), 2)
+    batch.move_to(0, 5, 5)
+    for i in range(50):
+        batch.step(0.01)
+    batch.reset(np.array([True, False]))
+    assert batch.x[0, 0] == 1 and batch.x[1, 0] != 1
+    assert batch.time_elapsed[0] == 0
@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from shark.benchmark import BenchmarkContext, run_benchmarks, compare, get_stats
+
+
+def test_benchmarks_report_percentiles():
+    context = BenchmarkContext(Path.cwd())
+    results = run_benchmarks(context, ["level_step", "replay_parse"], repeats=2, warmup=1)
+    assert "level_step[goodies=8,sharks=4]" in results and "replay_parse" in results
+    for stats in results.values():
+        assert stats["repeats"] == 2
+        assert 0 < stats["min"] <= stats["median"] <= stats["p90"] <= stats["p99"]
+
+
+def test_benchmark_templates_have_the_character_counts():
+    level = BenchmarkContext(Path.cwd()).get_template(8, 4).build()
+    assert len(level.goodies) == 8 and len(level.baddies) == 4
+    assert len({character.cell for character in level.characters}) == 12
+
+
+def test_compare_flags_slowdowns():
+    baseline = {"a": get_stats([1.0, 1.0]), "b": get_stats([1.0]), "c": get_stats([1.0])}
+    results = {"a": get_stats([1.1]), "b": get_stats([2.0]), "d": get_stats([5.0])}
+    assert [name for name, *_ in compare(results, baseline, tolerance=0.2)] == ["b"]
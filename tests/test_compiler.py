@@ -0,0 +1,71 @@
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from shark.compiler import compile_level, get_compiled_path, is_stale, load_level
+from shark.terrain import TerrainMap
+
+level_folder = Path(__file__).parent.parent / "shark" / "levels"
+
+
+def copy_level(tmp_path):
+    source_path = tmp_path / "level.json"
+    source_path.write_text((level_folder / "levelone.json").read_text())
+    return source_path
+
+
+def test_compiled_level_matches_json(tmp_path):
+    source_path = copy_level(tmp_path)
+    level_spec = json.loads(source_path.read_text())
+    compiled_spec = load_level(source_path)
+    expected = TerrainMap.from_spec(level_spec["shape"], level_spec["terrain"])
+    assert isinstance(compiled_spec["terrain"].codes.base, np.memmap)
+    assert np.array_equal(compiled_spec["terrain"].codes, expected.codes)
+    assert compiled_spec["game_objects"] == level_spec["game_objects"]
+    assert compiled_spec["name"] == level_spec["name"]
+
+
+def test_compiled_level_is_rebuilt_when_json_changes(tmp_path):
+    source_path = copy_level(tmp_path)
+    compiled_path = compile_level(source_path)
+    assert compiled_path == get_compiled_path(source_path)
+    assert not is_stale(source_path, compiled_path)
+    level_spec = json.loads(source_path.read_text())
+    level_spec["time_limit"] += 1
+    source_path.write_text(json.dumps(level_spec))
+    os.utime(source_path, ns=(0, 0))
+    assert is_stale(source_path, compiled_path)
+    assert load_level(source_path)["time_limit"] == level_spec["time_limit"]
+
+
+def test_corrupt_compiled_level_is_stale(tmp_path):
+    source_path = copy_level(tmp_path)
+    compiled_path = compile_level(source_path)
+    compiled_path.write_bytes(b"garbage")
+    assert is_stale(source_path, compiled_path)
+
+
+def test_torn_compiled_level_falls_back_to_json(tmp_path):
+    source_path = copy_level(tmp_path)
+    compiled_path = compile_level(source_path)
+    assert [path.name for path in compiled_path.parent.iterdir()] == [compiled_path.name]
+    compiled_path.write_bytes(compiled_path.read_bytes()[:-10])
+    level_spec = json.loads(source_path.read_text())
+    assert not is_stale(source_path, compiled_path)
+    assert load_level(source_path) == level_spec
+
+
+def test_failed_compile_leaves_no_temp_file(tmp_path, monkeypatch):
+    source_path = copy_level(tmp_path)
+    compiled_path = get_compiled_path(source_path)
+
+    def fail(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail)
+    with pytest.raises(OSError):
+        compile_level(source_path, compiled_path)
+    assert list(compiled_path.parent.iterdir()) == []
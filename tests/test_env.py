@@ -1,4 +1,7 @@
-from shark.env import SharkEnvPlay
+from shark.env import SharkEnvPlay, HumanEnvPlay
+from shark.terrain import WATER
+from shark.base import Cell
+import numpy as np
 from shark.level import LevelLoader
 from shark.ai import SharkBaseline
 from pathlib import Path
@@ -16,3 +19,46 @@ print(action)
 # plt.imshow(obs[2])
 # plt.show()
 
+
+def fresh_shark_state(level):
+    """SharkEnvPlay.format_state as built from scratch before buffers were kept."""
+    rows, cols = level.shape
+    layout = np.zeros((3, rows, cols), dtype="bool")
+    layout[0] = level.terrain.mask(WATER)
+    for goodie in level.goodies:
+        if level.terrain.is_water(goodie.cell) and goodie.is_alive:
+            layout[1][tuple(goodie.cell)] = True
+    for baddie in level.baddies:
+        layout[2][tuple(baddie.cell)] = True
+    return layout
+
+
+def test_shark_env_buffers_follow_moves():
+    level = levels[0]
+    env = SharkEnvPlay()
+    env.reset(level)
+    level.update(level.goodies[0], Cell(4, 6))
+    for i in range(300):
+        level.step(0.01)
+        if not env.get_obs():
+            env.step(shark.step(env.format_state()))
+        assert np.array_equal(env.format_state()[0], fresh_shark_state(level))
+
+
+def test_env_views_are_read_only():
+    level = levels[0]
+    copying, viewing = SharkEnvPlay(), SharkEnvPlay(views=True)
+    first, second = copying.reset(level), copying.format_state()
+    assert first[0] is not second[0]
+    layout, info = viewing.reset(level)
+    assert not layout.flags.writeable and not info.flags.writeable
+    assert viewing.format_state()[0].base is layout.base
+
+
+def test_human_env_play():
+    level = levels[0]
+    env = HumanEnvPlay()
+    layout, goodie_info = env.reset(level)
+    assert layout.shape == (4,) + tuple(level.shape)
+    assert layout[2].sum() == len({goodie.cell for goodie in level.goodies})
+    assert goodie_info[0] == 1.0
@@ -0,0 +1,64 @@
+import random
+
+from shark.base import Cell
+from shark.flowfield import FlowField, UNREACHABLE
+from shark.level import Level
+from shark.terrain import TerrainMap, UNPASSABLE, WATER
+
+
+def get_wall(x=3, height=5):
+    return [["UnPassableTerrain", {"name": "UnPassableTerrain", "x": x, "y": y}] for y in range(height)]
+
+
+def test_flow_field_goes_around_walls():
+    terrain = TerrainMap.from_spec((7, 7), get_wall())
+    field = FlowField(terrain, {Cell(5, 1)})
+    assert field[Cell(5, 1)] == 0
+    assert field[Cell(3, 1)] == UNREACHABLE
+    assert field[Cell(1, 1)] == 8
+    assert field.get_moves(Cell(2, 4)) == [(1, 1)]
+    assert field.get_moves(Cell(5, 1)) == []
+
+
+def test_flow_field_repairs_match_rebuild():
+    rng = random.Random(0)
+    terrain = TerrainMap((12, 10))
+    field = FlowField(terrain, {Cell(0, 0), Cell(9, 11)})
+    for i in range(200):
+        if i % 4 == 0:
+            cell = Cell(rng.randrange(10), rng.randrange(12))
+            terrain.set(cell, rng.choice((WATER, UNPASSABLE)))
+            field.update_cell(cell)
+        else:
+            field.set_occupied({Cell(rng.randrange(10), rng.randrange(12)) for i in range(4)})
+        rebuilt = FlowField(terrain, field.targets)
+        rebuilt.set_occupied(field.occupied)
+        rebuilt.build()
+        assert field.distances == rebuilt.distances
+
+
+def play_to_goal(pathfinding):
+    game_objects = [
+        ["Goal", {"name": "Goal", "x": 5, "y": 1}],
+        ["Hero", {"name": "Hero", "x": 1, "y": 1}],
+    ]
+    level = Level("walled", (7, 7), 60, get_wall(), game_objects, pathfinding=pathfinding)
+    level.update(level.goodies[0], Cell(5, 1))
+    for i in range(1000):
+        if level.step(0.05).game_over:
+            break
+    return level
+
+
+def test_goodies_follow_flow_field_to_goal():
+    assert play_to_goal(pathfinding=True).result.won
+    stuck = play_to_goal(pathfinding=False)
+    assert not stuck.result.won and stuck.goodies[0].cell == Cell(2, 1)
+
+
+def test_flow_field_is_read_from_the_terrain_view():
+    level = play_to_goal(pathfinding=True)
+    terrain, goodies, baddies = level.centre_surrounds(level.goodies[0])
+    assert terrain.flow is level.flow_field
+    terrain, goodies, baddies = play_to_goal(pathfinding=False).surrounds
+    assert terrain.flow is None
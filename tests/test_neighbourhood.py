@@ -0,0 +1,37 @@
+from shark.neighbourhood import Neighbourhood, NeighbourhoodTable, TerrainNeighbourhood
+from shark.terrain import TerrainMap, NO_TERRAIN
+from shark.base import Cell, get_surrounding_cells
+
+
+def test_table_matches_surrounding_cells():
+    table = NeighbourhoodTable((20, 20))
+    view = Neighbourhood({}, None)
+    for cell in (Cell(0, 0), Cell(5, 7), Cell(19, 19)):
+        view.centre(table[cell])
+        assert set(view.keys()) == get_surrounding_cells(cell, bounds=(20, 20))
+
+
+def test_view_reads_through_index():
+    index = {Cell(1, 1): "a", Cell(5, 5): "b"}
+    view = Neighbourhood(index, None)
+    view.centre(NeighbourhoodTable((10, 10))[Cell(1, 2)])
+    assert view[Cell(1, 1)] == "a"
+    assert view[Cell(5, 5)] is None
+
+
+def test_view_recentres():
+    table = NeighbourhoodTable((10, 10))
+    index = {Cell(5, 5): "b"}
+    view = Neighbourhood(index, None)
+    view.centre(table[Cell(1, 1)])
+    assert Cell(5, 5) not in view
+    view.centre(table[Cell(4, 4)])
+    assert view[Cell(5, 5)] == "b"
+
+
+def test_terrain_view_keeps_lookups():
+    terrain = TerrainMap((10, 10))
+    view = TerrainNeighbourhood(terrain, NO_TERRAIN)
+    view.centre(NeighbourhoodTable((10, 10))[Cell(0, 0)])
+    assert view.is_water(Cell(1, 1))
+    assert not view.is_terrain(Cell(2, 2))
@@ -40,3 +40,23 @@ def test_moveableobject_default_direction():
 def test_moveableobject_is_initially_dirty():
     obj = MoveableObject()
     assert obj.dirty == True
+
+
+def test_object_cell_follows_position():
+    obj = MoveableObject(x=1, y=1)
+    cell = obj.cell
+    obj.x = 1.3
+    assert obj.cell is cell
+    obj.x = 1.7
+    assert obj.cell == (2, 1)
+    assert obj.cells == {(2, 1)}
+
+
+def test_object_has_no_dict():
+    obj = MoveableObject()
+    assert not hasattr(obj, "__dict__")
+
+
+def test_codes_are_ints():
+    assert Action.walk == 2 and Direction.north == 0
+    assert Direction.north and Action.stand
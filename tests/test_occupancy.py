@@ -0,0 +1,51 @@
+from shark.objects import Goodie
+from shark.occupancy import Occupancy
+from shark.base import Cell
+
+
+def get_goodies():
+    return [Goodie(name="Red", x=0, y=0), Goodie(name="Yellow", x=2, y=2)]
+
+
+def test_occupancy_lookup():
+    goodies = get_goodies()
+    occupancy = Occupancy(goodies)
+    assert occupancy[Cell(2, 2)] is goodies[1]
+    assert not occupancy[Cell(1, 1)]
+
+
+def test_occupancy_moves_character():
+    goodies = get_goodies()
+    occupancy = Occupancy(goodies)
+    goodies[0].x = 1
+    occupancy.update()
+    assert occupancy[Cell(1, 0)] is goodies[0]
+    assert Cell(0, 0) not in occupancy
+
+
+def test_occupancy_shared_cell_prefers_last():
+    goodies = get_goodies()
+    occupancy = Occupancy(goodies)
+    goodies[0].x, goodies[0].y = 2, 2
+    occupancy.update()
+    assert occupancy[Cell(2, 2)] is goodies[1]
+    goodies[1].x = 3
+    occupancy.update()
+    assert occupancy[Cell(2, 2)] is goodies[0]
+
+
+def test_occupancy_goal_counter():
+    goodies = get_goodies()
+    occupancy = Occupancy(goodies, goal={Cell(2, 2), Cell(3, 3)})
+    assert occupancy.n_in_goal == 1 and not occupancy.all_in_goal
+    goodies[0].x, goodies[0].y = 3, 3
+    occupancy.update()
+    assert occupancy.all_in_goal
+
+
+def test_occupancy_dead_counter():
+    goodies = get_goodies()
+    occupancy = Occupancy(goodies)
+    goodies[1].take_damage(goodies[1].max_health)
+    occupancy.update()
+    assert occupancy.any_dead and occupancy.n_dead == 1
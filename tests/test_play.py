@@ -1,10 +1,13 @@
 from pathlib import Path
+import pickle
+import random
 import time
 from collections import defaultdict
 
-from shark.objects import Hero, Goal, GameObject, MoveableObject
+from shark.objects import Hero, Goal, GameObject, MoveableObject, add_repeatedly
 from shark.level import LevelLoader, Level
 from shark.base import Cell, get_cells_in_block
+from shark.terrain import WATER
 
 
 def test_loader_loads_specs():
@@ -41,3 +44,121 @@ def test_level_is_filled():
     all_cells = get_cells_in_block(0, n_cols, 0, n_rows)
     terrain_cells = set(level.terrain_cells.keys())
     assert all_cells == terrain_cells
+
+
+def get_character_states(level):
+    return [
+        (c.x, c.y, c.current_health, c.action, c.goal_cell, c.is_visible)
+        for c in level.characters
+    ]
+
+
+def test_advance_until_matches_step():
+    stepped = get_level()
+    advanced = get_level()
+    for level in (stepped, advanced):
+        level.update(level.goodies[0], Cell(6, 1))
+        level.update(level.baddies[0], Cell(20, 14))
+    while True:
+        result = stepped.step(0.01)
+        if result.game_over or not stepped.baddies[0].is_active:
+            break
+    advanced.advance_until(0.01, advanced.baddies)
+    assert advanced.n_updates == stepped.n_updates
+    assert advanced.time_elapsed == stepped.time_elapsed
+    assert get_character_states(advanced) == get_character_states(stepped)
+
+
+def test_advance_until_matches_step_with_bites():
+    stepped = get_level()
+    advanced = get_level()
+    water = [Cell(int(x), int(y)) for x, y in stepped.terrain.cells_of(WATER)]
+    rng = random.Random(0)
+    for i in range(20):
+        character_idx = rng.randrange(len(stepped.characters))
+        cell = rng.choice(water)
+        if character_idx >= len(stepped.goodies):
+            cell = rng.choice(stepped.goodies).cell
+        for level in (stepped, advanced):
+            level.update(level.characters[character_idx], cell)
+        while True:
+            result = stepped.step(0.01)
+            if result.game_over or not any(c.is_active for c in stepped.characters):
+                break
+        advanced.advance_until(0.01)
+        assert advanced.time_elapsed == stepped.time_elapsed
+        assert get_character_states(advanced) == get_character_states(stepped)
+        if result.game_over:
+            break
+    assert any(goodie.current_health < goodie.max_health for goodie in stepped.goodies)
+
+
+def test_add_repeatedly_rounds_like_a_loop():
+    total = 0.3
+    for i in range(1000):
+        total += 0.01
+    assert add_repeatedly(0.3, 0.01, 1000) == total
+    assert add_repeatedly(100, [-1.5, -0.25], 3) == 100 - 5.25
+
+
+def test_advance_until_steps_at_least_once():
+    level = get_level()
+    level.advance_until(0.01)
+    assert level.n_updates == 1
+
+
+def test_level_indexes_characters():
+    level = get_level()
+    for idx, character in enumerate(level.characters):
+        assert character.index == idx
+    level.update(level.characters[2], Cell(3, 3))
+    assert level.log["events"][-1].character_index == 2
+
+
+def test_template_levels_share_terrain():
+    loader = LevelLoader(Path.cwd())
+    template = loader.get_template(0)
+    first, second = template.build(), template.build()
+    assert first.terrain is second.terrain
+    assert first.terrain.is_frozen
+    assert first.characters[0] is not second.characters[0]
+
+
+def test_level_reset():
+    level = get_level()
+    start = [(c.x, c.y) for c in level.characters]
+    level.update(level.goodies[0], Cell(5, 1))
+    for i in range(100):
+        level.step(0.01)
+    level.reset()
+    assert [(c.x, c.y) for c in level.characters] == start
+    assert level.n_updates == 0 and not level.log["events"]
+
+
+def play_moves(level, n_ticks):
+    level.update(level.goodies[0], Cell(6, 1))
+    level.update(level.baddies[0], Cell(20, 14))
+    for i in range(n_ticks):
+        level.step(0.01)
+    return get_character_states(level), level.n_updates, len(level.log["events"])
+
+
+def test_level_restore_replays_the_same_game():
+    level = get_level()
+    for i in range(50):
+        level.step(0.01)
+    snapshot = pickle.loads(pickle.dumps(level.snapshot()))
+    first = play_moves(level, 200)
+    level.restore(snapshot)
+    assert play_moves(level, 200) == first
+
+
+def test_level_fork_is_independent():
+    level = get_level()
+    level.update(level.goodies[0], Cell(5, 1))
+    fork = level.fork()
+    assert fork.characters[0] is not level.characters[0]
+    assert get_character_states(fork) == get_character_states(level)
+    assert play_moves(fork, 100) == play_moves(level, 100)
+    fork.step(0.01)
+    assert fork.n_updates == level.n_updates + 1
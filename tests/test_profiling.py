@@ -0,0 +1,39 @@
+from pathlib import Path
+
+from shark.level import LevelLoader, Level
+from shark.base import Cell
+from shark.profiling import StepStats, phases
+
+
+def play(level):
+    for goodie in level.goodies:
+        level.update(goodie, Cell(30, 30))
+    level.update(level.baddies[0], Cell(10, 10))
+    for i in range(300):
+        level.step(0.01)
+    level.advance_until(0.01)
+    return [(c.cell, c.x, c.y, c.current_health) for c in level.characters], level.n_updates
+
+
+def test_profiling_matches_plain_step():
+    template = LevelLoader(Path.cwd()).get_template(0)
+    profiled = template.build(pathfinding=True)
+    stats = profiled.enable_profiling()
+    plain = template.build(pathfinding=True)
+    assert play(profiled) == play(plain)
+    assert profiled.log == plain.log
+    assert stats.n_ticks > 300 and stats.n_skipped > 0
+    assert stats.characters_stepped > 0 and stats.cells_scanned >= 4 * stats.characters_stepped
+    assert all(stats.totals[phase] > 0 for phase in phases)
+    assert set(stats.as_dict()["per_tick"]) == set(phases)
+
+
+def test_profiling_can_be_disabled():
+    level = LevelLoader(Path.cwd())[0]
+    stats = level.enable_profiling(StepStats())
+    level.step(0.01)
+    assert level.disable_profiling() is stats and level.stats is None
+    assert level.step.__func__ is Level.step
+    assert "run_phase" not in vars(level) and "centre_character" not in vars(level)
+    level.step(0.01)
+    assert stats.n_ticks == 1
@@ -1,7 +1,7 @@
 from shark.render import ImageLoader, get_key
-from shark.base import Action, Direction
+from shark.base import Direction
 from pathlib import Path
-from pyglet.image import Animation, ImageData
+from pyglet.image import Animation, AbstractImage
 
 
 def get_image_loader():
@@ -16,7 +16,8 @@ def test_image_loader_size():
 
 def test_image_loader_return_type():
     loader = get_image_loader()
-    key = get_key("Water", Action.stand, Direction.south)
+    key = get_key("Water", None, Direction.south)
     img = loader[key]
-    assert isinstance(img, ImageData) or isinstance(img, Animation)
+    assert isinstance(img, AbstractImage) or isinstance(img, Animation)
+    assert isinstance(loader["Shark_swim_west"], Animation)
 
@@ -0,0 +1,85 @@
+from pathlib import Path
+
+import pytest
+
+from shark.level import LevelLoader, load_log
+from shark.base import Cell
+from shark.replaylog import (
+    ReplayWriter,
+    ReplayReader,
+    JSONReplay,
+    open_replay,
+    convert_log,
+    ReplayFormatError,
+)
+
+json_path = Path.cwd() / "replay_first_win.json"
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_json_logs_convert_to_replays(tmp_path, compress):
+    replay_path = convert_log(json_path, tmp_path / "first.replay", block_size=50, compress=compress)
+    replay = open_replay(replay_path)
+    log = load_log(json_path)
+    assert isinstance(replay, ReplayReader) and isinstance(open_replay(json_path), JSONReplay)
+    assert replay.name == log["name"] and replay.pathfinding == log.get("pathfinding", False)
+    assert list(replay) == log["events"]
+    assert replay.n_updates == log["n_updates"] and replay.total_time == log["total_time"]
+
+
+def test_unfinished_replays_read_whole_blocks(tmp_path):
+    path = tmp_path / "crash.replay"
+    writer = ReplayWriter(path, "level", block_size=2)
+    writer.extend([(0, 0.5, 1, 2), (1, 1.0, -1, 3), (0, 1.5, 4, 4)])
+    assert len(writer) == 3
+    replay = ReplayReader(path)
+    assert [event.time for event in replay] == [0.5, 1.0]
+    assert not replay.is_complete and replay.n_updates is None
+    with open(path, "ab") as replay_file:
+        replay_file.write(b"\x02\x05")
+    assert len(list(ReplayReader(path))) == 2
+    writer.file.close()
+
+
+def test_replay_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.replay"
+    path.write_bytes(b"not a replay at all")
+    with pytest.raises(ReplayFormatError):
+        ReplayReader(path)
+
+
+def test_level_records_events_as_it_runs(tmp_path):
+    level = LevelLoader(Path.cwd())[0]
+    level.update(level.goodies[0], Cell(3, 3))
+    writer = ReplayWriter(tmp_path / "level.replay", level.name, block_size=3)
+    level.record(writer)
+    snapshot = level.snapshot()
+    level.update(level.goodies[1], Cell(4, 4))
+    level.restore(snapshot)
+    for i in range(10):
+        level.update(level.goodies[i % 4], Cell(i, i))
+        level.step(0.01)
+    assert level.is_recording and not level.fork().is_recording
+    with pytest.raises(ValueError):
+        level.restore(snapshot)
+    level.stop_recording()
+    replay = ReplayReader(writer.path)
+    events = list(replay)
+    assert len(events) == 11 and (events[0].x, events[1].x) == (3, 0)
+    assert replay.n_updates == level.n_updates == 10
+    assert not level.is_recording
+
+
+def test_level_logs_keep_recorded_events(tmp_path):
+    level = LevelLoader(Path.cwd())[0]
+    level.record(ReplayWriter(tmp_path / "level.replay", level.name, block_size=3))
+    for i in range(8):
+        level.update(level.goodies[i % 4], Cell(i, i))
+        level.step(0.01)
+    level.save_log(tmp_path / "recording.json")
+    level.stop_recording()
+    level.save_log(tmp_path / "stopped.json")
+    for name in ["recording.json", "stopped.json"]:
+        events = load_log(tmp_path / name)["events"]
+        assert events == list(ReplayReader(tmp_path / "level.replay"))
+        assert [event.x for event in events] == list(range(8))
@@ -0,0 +1,35 @@
+import subprocess
+import sys
+from pathlib import Path
+
+from shark.selfplay import SelfPlayRunner
+
+
+def test_selfplay_does_not_import_pyglet():
+    code = "import sys, shark.selfplay; assert 'pyglet' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def get_results(seed):
+    runner = SelfPlayRunner(Path.cwd(), 3, dt=0.5, seed=seed)
+    trajectories = list(runner.run(4))
+    assert runner.n_games == 4 and runner.decisions_per_second > 0
+    return runner, trajectories
+
+
+def test_selfplay_streams_trajectories():
+    runner, trajectories = get_results(0)
+    assert len({trajectory.match_id for trajectory in trajectories}) == 4
+    for trajectory in trajectories:
+        assert trajectory.goodie_decisions and trajectory.shark_decisions
+        layout, info = trajectory.shark_decisions[0].layout, trajectory.shark_decisions[0].info
+        assert layout.shape == (3, 32, 32) and info.shape == (4,)
+    assert runner.n_decisions >= sum(
+        len(t.goodie_decisions) + len(t.shark_decisions) for t in trajectories
+    )
+
+
+def test_selfplay_is_seeded():
+    first = [(t.won, t.n_updates) for t in get_results(1)[1]]
+    second = [(t.won, t.n_updates) for t in get_results(1)[1]]
+    assert first == second
@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from shark.simulator import Simulator
+
+
+def get_results(n_workers, seed):
+    simulator = Simulator(Path.cwd(), n_workers=n_workers, seed=seed, dt=0.5, chunk_size=2)
+    results = sorted(simulator.iter_results(3), key=lambda result: result.game_idx)
+    return [result._replace(time_elapsed=round(result.time_elapsed, 6)) for result in results]
+
+
+def test_simulator_is_reproducible_across_workers():
+    results = get_results(1, 7)
+    assert [result.game_idx for result in results] == [0, 1, 2]
+    assert len({result.seed for result in results}) == 3
+    assert results == get_results(2, 7)
+    assert [r.seed for r in results] != [r.seed for r in get_results(1, 8)]
+
+
+def test_simulator_collects_level_stats():
+    simulator = Simulator(Path.cwd(), n_workers=1, seed=0, dt=0.5)
+    stats = simulator.run(2)
+    (level_stats,) = stats.values()
+    assert level_stats.n_games == 2
+    assert 0 <= level_stats.win_rate <= 1
+    assert level_stats.n_deaths >= 0
@@ -0,0 +1,53 @@
+from shark.terrain import TerrainMap, WATER, LAND, UNPASSABLE, NO_TERRAIN
+from shark.base import Cell
+
+
+def get_terrain_map():
+    terrain = [
+        ["Land", {"name": "Land", "x": 0, "y": 0}],
+        ["UnPassableTerrain", {"name": "UnPassableTerrain", "x": 1, "y": 0}],
+    ]
+    return TerrainMap.from_spec((3, 4), terrain)
+
+
+def test_terrain_map_codes():
+    terrain = get_terrain_map()
+    assert terrain[Cell(0, 0)] == LAND
+    assert terrain[Cell(1, 0)] == UNPASSABLE
+    assert terrain[Cell(3, 2)] == WATER
+
+
+def test_terrain_map_off_map():
+    terrain = get_terrain_map()
+    assert terrain[Cell(-1, 0)] == NO_TERRAIN
+    assert terrain[Cell(4, 0)] == NO_TERRAIN
+    assert not terrain.is_terrain(Cell(0, 3))
+
+
+def test_terrain_map_typed_lookups():
+    terrain = get_terrain_map()
+    assert terrain.is_land(Cell(1, 0)) and not terrain.is_passable(Cell(1, 0))
+    assert terrain.is_passable(Cell(0, 0)) and not terrain.is_water(Cell(0, 0))
+    assert terrain.is_water(Cell(2, 2))
+
+
+def test_terrain_map_mask_is_row_major():
+    terrain = get_terrain_map()
+    mask = terrain.mask(LAND)
+    assert mask.shape == (3, 4)
+    assert mask[0, 0] and mask.sum() == 1
+
+
+def test_terrain_map_set():
+    terrain = get_terrain_map()
+    terrain.set(Cell(2, 1), UNPASSABLE)
+    assert terrain.is_unpassable(Cell(2, 1))
+    assert terrain.codes[1, 2] == UNPASSABLE
+
+
+def test_terrain_map_freeze_and_copy():
+    terrain = get_terrain_map().freeze()
+    assert terrain.is_frozen
+    copy = terrain.copy()
+    copy.set(Cell(0, 0), WATER)
+    assert terrain[Cell(0, 0)] == LAND and copy[Cell(0, 0)] == WATER
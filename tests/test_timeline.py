@@ -0,0 +1,74 @@
+import random
+from pathlib import Path
+
+import numpy as np
+
+from shark.level import LevelLoader
+from shark.base import Cell
+from shark.replaylog import JSONReplay, ReplayWriter, ReplayReader
+from shark.timeline import ReplayTimeline, DEFAULT_TICK_LENGTH
+
+
+def play(level, dt=0.1, max_ticks=None):
+    rng = random.Random(1)
+    states = [level.snapshot().state]
+    while not level.result.game_over and len(states) != max_ticks:
+        if rng.random() < 0.05:
+            character = rng.choice(level.characters)
+            level.update(character, Cell(rng.randrange(32), rng.randrange(32)))
+        level.step(dt)
+        states.append(level.snapshot().state)
+    return states
+
+
+def record_game(tmp_path, dt=0.1):
+    template = LevelLoader(Path.cwd()).get_template(0)
+    level = template.build(pathfinding=True)
+    states = play(level, dt)
+    level.save_log(tmp_path / "game.json")
+    return template, JSONReplay(tmp_path / "game.json"), states
+
+
+def is_at(timeline, states, tick):
+    state = timeline.level.snapshot().state
+    return timeline.tick == tick and np.array_equal(state, states[tick], equal_nan=True)
+
+
+def test_timeline_replays_the_game(tmp_path):
+    template, replay, states = record_game(tmp_path)
+    timeline = ReplayTimeline(template, replay, keyframe_interval=100)
+    assert timeline.dt == 0.1
+    timeline.advance(len(states))
+    assert timeline.is_over and is_at(timeline, states, replay.n_updates)
+    assert [keyframe.tick for keyframe in timeline.keyframes] == list(range(0, replay.n_updates + 1, 100))
+
+
+def test_timeline_seeks_both_ways(tmp_path):
+    template, replay, states = record_game(tmp_path)
+    timeline = ReplayTimeline(template, replay, keyframe_interval=100)
+    for tick in [350, 120, 3600, 0, 3599, 1, 2000, 1999]:
+        timeline.seek(tick)
+        assert is_at(timeline, states, tick)
+    timeline.step_back(5)
+    assert is_at(timeline, states, 1994)
+
+
+def test_timeline_plays_unfinished_replays(tmp_path):
+    template = LevelLoader(Path.cwd()).get_template(0)
+    level = template.build(pathfinding=True)
+    writer = ReplayWriter(tmp_path / "crash.replay", level.name, pathfinding=True, block_size=4)
+    level.record(writer)
+    states = play(level, max_ticks=1000)
+    writer.flush()
+    replay = ReplayReader(writer.path)
+    assert replay.n_updates is None
+    assert ReplayTimeline(template, replay).dt == DEFAULT_TICK_LENGTH
+    timeline = ReplayTimeline(template, replay, keyframe_interval=100, dt=0.1)
+    last_tick = round(list(replay)[-1].time / 0.1)
+    assert 900 < timeline.last_tick == last_tick < 1000
+    timeline.build_keyframes()
+    assert timeline.tick == 0 and timeline.keyframe_ticks[-1] == 900
+    for tick in [10 ** 6, 450, -5]:
+        timeline.seek(tick)
+        assert is_at(timeline, states, min(max(tick, 0), last_tick))
+    writer.file.close()
@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import numpy as np
+
+from shark.env import SharkEnvTrain
+from shark.vecenv import SharkVecEnv
+
+
+def test_vec_env_matches_single_envs():
+    n_envs = 3
+    singles = [SharkEnvTrain(Path.cwd(), dt=3.0) for i in range(n_envs)]
+    expected = [env.reset() for env in singles]
+    rng = np.random.default_rng(0)
+    with SharkVecEnv(Path.cwd(), n_envs, n_workers=2, dt=3.0) as vec_env:
+        layouts, infos = vec_env.reset()
+        n_done = 0
+        for step in range(150):
+            assert np.array_equal(layouts, np.stack([obs[0] for obs in expected]))
+            assert np.array_equal(infos, np.stack([obs[1] for obs in expected]))
+            actions = rng.integers(8, size=(n_envs, vec_env.n_sharks))
+            (layouts, infos), rewards, dones, _ = vec_env.step(actions)
+            for i, env in enumerate(singles):
+                obs, reward, game_over, _ = env.step(actions[i])
+                expected[i] = env.reset() if game_over else obs
+                assert rewards[i] == reward and dones[i] == game_over
+                n_done += game_over
+        assert n_done > 0
+
+
+def test_vec_env_async_step():
+    with SharkVecEnv(Path.cwd(), 2, n_workers=2) as vec_env:
+        vec_env.reset()
+        vec_env.step_async(np.zeros((2, vec_env.n_sharks), dtype="int64"))
+        (layouts, infos), rewards, dones, step_infos = vec_env.step_wait()
+        assert layouts.shape[0] == 2 and len(step_infos) == 2
+        assert not dones.any()
@@ -0,0 +1,111 @@
+import json
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+from shark.level import LevelLoader
+from shark.base import Cell, FixedTimestep, TICK_LENGTH
+from shark.replaylog import ReplayWriter
+from shark.verify import verify_replays, find_logs
+
+
+def test_verify_does_not_import_graphics():
+    code = "import sys, shark.verify; assert 'pyglet' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def record_games(folder, n_games, dt=0.5, max_ticks=None):
+    template = LevelLoader(Path.cwd()).get_template(0)
+    for game in range(n_games):
+        level = template.build(pathfinding=True)
+        level.record(ReplayWriter(folder / f"game{game}.replay", level.name, True, block_size=4))
+        rng = random.Random(game)
+        while not level.result.game_over and level.n_updates != max_ticks:
+            if rng.random() < 0.1:
+                character = rng.choice(level.characters)
+                level.update(character, Cell(rng.randrange(32), rng.randrange(32)))
+            level.step(dt)
+        if game == n_games - 1:
+            level.save_log(folder / "last.json")
+        level.stop_recording()
+    return level
+
+
+def test_verify_passes_faithful_replays(tmp_path):
+    level = record_games(tmp_path, 3)
+    with open(tmp_path / "last.json") as log_file:
+        assert len(json.load(log_file)["events"]) == len(level.log["events"]) > 0
+    logs = find_logs([tmp_path])
+    assert len(logs) == 4
+    results = list(verify_replays(Path.cwd(), logs, n_workers=2, chunk_size=1))
+    assert len(results) == 4 and all(result.passed for result in results)
+    assert all(result.won == result.expected_won for result in results)
+    assert all(result.digest == result.expected_digest is not None for result in results)
+
+
+def test_verify_passes_quit_games(tmp_path):
+    record_games(tmp_path, 1, max_ticks=50)
+    result = next(verify_replays(Path.cwd(), [tmp_path / "game0.replay"], 1))
+    assert result.passed and result.n_updates == 50 and result.expected_won is None
+
+
+def test_verify_flags_divergent_replays(tmp_path):
+    record_games(tmp_path, 1)
+    with open(tmp_path / "last.json") as log_file:
+        log = json.load(log_file)
+    log["n_updates"] += 1
+    log["won"] = not log["won"]
+    with open(tmp_path / "last.json", "w") as log_file:
+        json.dump(log, log_file)
+    ReplayWriter(tmp_path / "crashed.replay", log["name"]).close()
+    results = {Path(r.path).name: r for r in verify_replays(Path.cwd(), find_logs([tmp_path]), 1)}
+    assert results["game0.replay"].passed
+    assert "n_updates" in results["last.json"].message and "won" in results["last.json"].message
+    assert not results["crashed.replay"].passed
+
+
+def test_verify_flags_moved_characters(tmp_path):
+    record_games(tmp_path, 1)
+    with open(tmp_path / "last.json") as log_file:
+        log = json.load(log_file)
+    for event in log["events"]:
+        event[2] = (event[2] + 1) % 32
+    with open(tmp_path / "last.json", "w") as log_file:
+        json.dump(log, log_file)
+    result = next(verify_replays(Path.cwd(), [tmp_path / "last.json"], 1))
+    assert not result.passed and "digest" in result.message
+
+
+def record_frames(path, fixed_timestep, n_frames=600):
+    """Plays frames of uneven length, like the app's, stepping by whole ticks or by the frame."""
+    level = LevelLoader(Path.cwd()).get_template(0).build(pathfinding=True)
+    dt = TICK_LENGTH if fixed_timestep else None
+    level.record(ReplayWriter(path, level.name, True, dt=dt))
+    timestep = FixedTimestep(TICK_LENGTH)
+    rng = random.Random(0)
+    for frame in range(n_frames):
+        if rng.random() < 0.05:
+            character = rng.choice(level.characters)
+            level.update(character, Cell(rng.randrange(32), rng.randrange(32)))
+        frame_dt = TICK_LENGTH + rng.uniform(-0.002, 0.002)
+        if fixed_timestep:
+            for i in range(timestep(frame_dt)):
+                level.step(TICK_LENGTH)
+        else:
+            level.step(frame_dt)
+    level.stop_recording()
+
+
+def test_verify_passes_games_played_at_uneven_frame_rates(tmp_path):
+    record_frames(tmp_path / "fixed.replay", fixed_timestep=True)
+    record_frames(tmp_path / "uneven.replay", fixed_timestep=False)
+    results = {Path(r.path).name: r for r in verify_replays(Path.cwd(), find_logs([tmp_path]), 1)}
+    assert results["fixed.replay"].passed, results["fixed.replay"].message
+    assert results["fixed.replay"].n_updates > 500
+    assert results["uneven.replay"].passed is False
+
+
+def test_verify_reports_legacy_logs_as_unverifiable():
+    result = next(verify_replays(Path.cwd(), [Path.cwd() / "replay_first_win.json"], 1))
+    assert result.passed is None and "no outcome" in result.message
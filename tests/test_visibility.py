@@ -0,0 +1,52 @@
+import random
+
+from shark.objects import Goodie, Shark
+from shark.visibility import Visibility
+
+
+def get_characters(seed, n_goodies=6, n_sharks=3, size=20):
+    rng = random.Random(seed)
+    goodies = [
+        Goodie(x=rng.randrange(size), y=rng.randrange(size)) for i in range(n_goodies)
+    ]
+    sharks = [Shark(x=rng.randrange(size), y=rng.randrange(size)) for i in range(n_sharks)]
+    return goodies, sharks
+
+
+def get_expected(goodies, sharks):
+    goodies_seen = [any(s.can_see(g.cell) for s in sharks) for g in goodies]
+    sharks_seen = [any(g.can_see(s.cell) for g in goodies) for s in sharks]
+    return goodies_seen, sharks_seen
+
+
+def get_visible(goodies, sharks):
+    return [g.is_visible for g in goodies], [s.is_visible for s in sharks]
+
+
+def test_visibility_matches_can_see():
+    goodies, sharks = get_characters(0)
+    visibility = Visibility(goodies, sharks, (20, 20))
+    visibility.update()
+    assert get_visible(goodies, sharks) == get_expected(goodies, sharks)
+
+
+def test_visibility_follows_moves_and_deaths():
+    rng = random.Random(1)
+    goodies, sharks = get_characters(1)
+    visibility = Visibility(goodies, sharks, (20, 20))
+    for i in range(200):
+        character = rng.choice(goodies + sharks)
+        character.x = min(19, max(0, character.x + rng.choice((-1, 0, 1))))
+        character.y = min(19, max(0, character.y + rng.choice((-1, 0, 1))))
+        if i % 50 == 49:
+            rng.choice(goodies).take_damage(100)
+        visibility.update()
+        assert get_visible(goodies, sharks) == get_expected(goodies, sharks)
+
+
+def test_visibility_bitmap():
+    goodie = Goodie(x=0, y=0)
+    shark = Shark(x=10, y=10)
+    visibility = Visibility([goodie], [shark], (20, 20))
+    assert visibility.seen_by_goodies[4, 4] and not visibility.seen_by_goodies[5, 0]
+    assert visibility.seen_by_baddies.sum() == 81
@@ -0,0 +1,63 @@
+import numpy as np
+
+from shark.ai import SharkBaseline
+from shark.base import Cell
+from shark.terrain import TerrainMap, WATER, LAND
+from shark.waterdistance import WaterDistances, UNREACHABLE, get_bfs_distances
+
+
+def get_two_pools():
+    """7 x 7 water split by a land wall at x = 3."""
+    terrain = [["Land", {"name": "Land", "x": 3, "y": y}] for y in range(7)]
+    return TerrainMap.from_spec((7, 7), terrain)
+
+
+def test_water_components():
+    distances = WaterDistances(get_two_pools())
+    assert distances.is_reachable(Cell(0, 0), Cell(2, 6))
+    assert not distances.is_reachable(Cell(0, 0), Cell(4, 0))
+    assert not distances.is_reachable(Cell(3, 0), Cell(3, 1))
+    assert distances.n_components == 2
+
+
+def test_components_join_diagonals_and_winding_pools():
+    codes = np.full((7, 9), LAND, dtype="uint8")
+    codes[1:6, 1] = codes[5, 1:8] = codes[1:6, 7] = codes[1, 3:7] = WATER  # one winding pool
+    codes[3, 4] = WATER  # alone in the middle
+    codes[0, 0] = WATER  # diagonal to (1, 1)
+    distances = WaterDistances(TerrainMap((7, 9), codes), all_pairs_limit=0)
+    assert distances.component(Cell(0, 0)) == distances.component(Cell(3, 1)) == 0
+    assert distances.component(Cell(4, 3)) == 1 and distances.n_components == 2
+    field = distances.field(Cell(3, 1))
+    assert np.array_equal(field, get_bfs_distances(distances.water, [(3, 1)])[0])
+    assert field[3, 4] == UNREACHABLE and field[1, 1] == 15
+
+
+def test_water_distances():
+    distances = WaterDistances(get_two_pools())
+    assert distances.distance(Cell(0, 0), Cell(2, 6)) == 6
+    assert distances.distance(Cell(0, 0), Cell(4, 0)) == UNREACHABLE
+    assert distances.field(Cell(3, 3)).max() == UNREACHABLE
+
+
+def test_single_source_fields_match_all_pairs():
+    terrain = get_two_pools()
+    all_pairs = WaterDistances(terrain)
+    single_source = WaterDistances(terrain, all_pairs_limit=0, cache_size=4)
+    for cell in (Cell(0, 0), Cell(6, 6), Cell(2, 3), Cell(5, 1), Cell(0, 0)):
+        assert np.array_equal(all_pairs.field(cell), single_source.field(cell))
+    assert all_pairs.uses_all_pairs and len(single_source.fields) == 4
+
+
+def test_shark_baseline_ignores_unreachable_goodies():
+    rows, cols = 7, 7
+    layout = np.zeros((3, rows, cols), dtype="bool")
+    layout[0] = True
+    layout[0, :, 3] = False
+    layout[1, 4, 2] = True  # goodie at (4, 2) across the wall
+    layout[1, 0, 4] = True  # goodie at (0, 4) in the shark's pool
+    layout[2, 2, 2] = True  # shark at (2, 2)
+    state = [layout, np.zeros(4, dtype="float32")]
+    ai = SharkBaseline()
+    ai.reset(state, WaterDistances(get_two_pools()))
+    assert ai.step(state) == [ai.actions[(-1, 1)]]